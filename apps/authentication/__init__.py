@@ -8,9 +8,11 @@ Siege. All rights reserved
 
 from django.apps import AppConfig
 
-default_app_config = "apps.authentication.AuthenticationConfig"
-
 
 class AuthenticationConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.authentication"
+
+    def ready(self) -> None:
+        # Connect the signal receivers of this app.
+        from apps.authentication import signals  # noqa: F401
@@ -0,0 +1,135 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from collections import OrderedDict
+from copy import copy
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+
+from apps.users.models import User
+from core.metrics import token_cache_evictions, token_cache_lookups
+
+
+class TokenCache:
+    """A bounded, thread-safe LRU cache that maps tokens to the users
+    they belong to, so that authenticated requests don't need to hit
+    the database to resolve the user of a token they already sent.
+
+    Entries expire after `ttl` seconds and the least recently used
+    entries are evicted once the cache holds `max_size` tokens. Entries
+    of a user are also dropped whenever the user is saved or deleted,
+    see :mod:`apps.authentication.signals`.
+
+    Each lookup returns its own copy of the cached user, so a request
+    can change the user it got without affecting the other ones.
+
+    Parameters
+    ----------
+    max_size: :class:`int`
+        The maximum number of tokens to keep. A non-positive value
+        disables the cache.
+    ttl: :class:`float`
+        For how many seconds an entry can be used.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.entries: OrderedDict[str, tuple[float, User]] = OrderedDict()
+        # Reverse index used to invalidate the tokens of a user without
+        # scanning the whole cache.
+        self.tokens: dict[int, set[str]] = {}
+        self.lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> User | None:
+        """Return the user of the given token, or `None` if the token
+        is not cached or its entry has expired.
+        """
+        with self.lock:
+            entry = self.entries.get(token)
+
+            if entry is None or entry[0] <= monotonic():
+                self.misses += 1
+                self.discard(token)
+                token_cache_lookups.labels(outcome="miss").inc()
+                return None
+
+            self.entries.move_to_end(token)
+            self.hits += 1
+
+        token_cache_lookups.labels(outcome="hit").inc()
+        return copy(entry[1])
+
+    def set(self, token: str, user: User) -> None:
+        """Cache the user of the given token, evicting the least
+        recently used entries if the cache is full.
+        """
+        if self.max_size <= 0:
+            return
+
+        with self.lock:
+            self.discard(token)
+            self.entries[token] = (monotonic() + self.ttl, copy(user))
+            self.tokens.setdefault(user.id, set()).add(token)
+
+            while len(self.entries) > self.max_size:
+                self.discard(next(iter(self.entries)))
+                self.evictions += 1
+                token_cache_evictions.inc()
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop every cached token of the given user."""
+        with self.lock:
+            for token in self.tokens.pop(user_id, set()):
+                self.entries.pop(token, None)
+
+    def clear(self) -> None:
+        """Drop every entry of the cache and reset its counters."""
+        with self.lock:
+            self.entries.clear()
+            self.tokens.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def discard(self, token: str) -> None:
+        """Drop the entry of the given token, if any. The lock must be
+        held by the caller.
+        """
+        entry = self.entries.pop(token, None)
+
+        if entry is None:
+            return
+
+        tokens = self.tokens.get(entry[1].id, set())
+        tokens.discard(token)
+
+        if not tokens:
+            self.tokens.pop(entry[1].id, None)
+
+    def stats(self) -> dict[str, int]:
+        """Return the counters of the cache, which are useful to size
+        it.
+        """
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+token_cache = TokenCache(
+    max_size=settings.TOKEN_CACHE_MAX_SIZE, ttl=settings.TOKEN_CACHE_TTL
+)
@@ -0,0 +1,97 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+import json
+from argparse import ArgumentParser
+from typing import Any, Callable, Container
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.users.models import User
+from core.benchmarks import benchmark_database, environment, measure
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the per-request overhead of each middleware profile "
+        "(see `MIDDLEWARE_PROFILES`) on token-authenticated requests. "
+        "The report is written as JSON."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=2_000,
+            help="Number of requests measured per profile and operation.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        results: list[dict[str, Any]] = []
+
+        with benchmark_database():
+            user = User.objects.create_user(
+                username="user",
+                email="user@benchmark.local",
+                password="password",
+            )
+
+            for profile, middleware in settings.MIDDLEWARE_PROFILES.items():
+                with override_settings(MIDDLEWARE=middleware):
+                    results.extend(self.run(profile, user, options))
+
+            report = {
+                "benchmark": "middleware",
+                "environment": environment(),
+                "profiles": settings.MIDDLEWARE_PROFILES,
+                "results": results,
+            }
+
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run(
+        self, profile: str, user: User, options: dict[str, Any]
+    ) -> list[dict[str, Any]]:
+        """Measure every operation with the current middleware stack."""
+        # The client loads the middleware stack on its first request,
+        # so each profile needs its own client.
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {user.token}")
+
+        me = reverse("users:users-detail", kwargs={"pk": "me"})
+        unknown = reverse("users:users-detail", kwargs={"pk": 0})
+        # Each operation with the statuses it should respond with.
+        operations: dict[str, tuple[Callable[[], Any], Container[int]]] = {
+            # The token is cached after the first request, so this is
+            # mostly the cost of the request cycle itself.
+            "UsersView.retrieve": (lambda: client.get(me), (201,)),
+            "UsersView.retrieve (404)": (lambda: client.get(unknown), (404,)),
+        }
+        results: list[dict[str, Any]] = []
+
+        for name, (operation, statuses) in operations.items():
+            # Loading the middleware stack and filling the caches isn't
+            # part of the per-request cost.
+            operation()
+
+            result = measure(operation, options["iterations"], statuses)
+            results.append({"profile": profile, "operation": name, **result})
+            self.stderr.write(f"{name} with the {profile} profile: {result}")
+
+            if result["failures"]:
+                self.stderr.write(
+                    self.style.WARNING(
+                        f"{result['failures']} calls to {name} failed."
+                    )
+                )
+
+        return results
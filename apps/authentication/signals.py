@@ -0,0 +1,35 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from functools import partial
+from typing import Any
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from apps.authentication.logic.cache import token_cache
+from apps.users.models import User
+
+
+def invalidate_user_tokens(
+    sender: type[User], instance: User, **kwargs: Any
+) -> None:
+    """Drop the cached tokens of a user when it changes, so that the
+    next request resolves the user again. This also covers users being
+    deactivated, since that is done by saving them.
+
+    The tokens are dropped again once the transaction commits, in case a
+    concurrent request cached the previous version of the user in the
+    meantime.
+    """
+    token_cache.invalidate(instance.id)
+    transaction.on_commit(partial(token_cache.invalidate, instance.id))
+
+
+post_save.connect(invalidate_user_tokens, sender=User)
+post_delete.connect(invalidate_user_tokens, sender=User)
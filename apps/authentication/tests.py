@@ -7,18 +7,26 @@ Siege. All rights reserved
 """
 
 from typing import Any
+from unittest.mock import patch
 
 from django.urls import reverse
+from prometheus_client import REGISTRY
 from rest_framework.exceptions import ValidationError
 from rest_framework.status import (
     HTTP_200_OK,
     HTTP_400_BAD_REQUEST,
     HTTP_401_UNAUTHORIZED,
+    HTTP_503_SERVICE_UNAVAILABLE,
 )
 from rest_framework.test import APIRequestFactory, APITestCase
 
 from apps.authentication.logic.backend import TokenAuthentication
+from apps.authentication.logic.cache import TokenCache, token_cache
 from apps.users.models import User
+from core.exceptions import ServiceUnavailable
+from core.hashing import hashing_pool
+
+OUTCOMES = ["valid", "cached", "invalid"]
 
 
 class LoginTestCase(APITestCase):
@@ -41,6 +49,44 @@ class LoginTestCase(APITestCase):
         self.assertEqual(res.status_code, HTTP_200_OK)
         self.assertDictEqual(res.data, expected)
 
+    async def test_login_user_with_asgi(self) -> None:
+        res = await self.async_client.post(
+            self.url, self.example, content_type="application/json"
+        )
+        expected = {"token": self.user.token}
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertDictEqual(res.json(), expected)
+
+    def test_login_user_when_hashing_pool_is_full(self) -> None:
+        with patch.object(
+            hashing_pool, "run", side_effect=ServiceUnavailable()
+        ):
+            res = self.client.post(self.url, self.example)
+
+        expected = {
+            "status": HTTP_503_SERVICE_UNAVAILABLE,
+            "errors": {
+                "detail": "Service temporarily unavailable, try again later"
+            },
+        }
+
+        self.assertEqual(res.status_code, HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res["Retry-After"], "1")
+        self.assertDictEqual(res.data, expected)
+
+    async def test_login_user_with_asgi_when_hashing_pool_is_full(
+        self,
+    ) -> None:
+        with patch.object(
+            hashing_pool, "run", side_effect=ServiceUnavailable()
+        ):
+            res = await self.async_client.post(
+                self.url, self.example, content_type="application/json"
+            )
+
+        self.assertEqual(res.status_code, HTTP_503_SERVICE_UNAVAILABLE)
+
     def test_login_user_with_invalid_email(self) -> None:
         self.example["email"] = "invalid_email"
 
@@ -154,6 +200,8 @@ class TokenAuthenticationTestCase(APITestCase):
     """Test case for the token authentication."""
 
     def setUp(self) -> None:
+        token_cache.clear()
+
         self.auth = TokenAuthentication()
         self.user = User.objects.create_user(
             email="user@email.com",
@@ -186,6 +234,24 @@ class TokenAuthenticationTestCase(APITestCase):
             ValidationError, self.auth.validate_token, user.token
         )
 
+    def test_count_token_validations(self) -> None:
+        def count(outcome: str) -> float:
+            labels = {"outcome": outcome}
+            name = "siege_token_validations_total"
+
+            return REGISTRY.get_sample_value(name, labels) or 0
+
+        before = {outcome: count(outcome) for outcome in OUTCOMES}
+
+        self.auth.validate_token(self.user.token)
+        self.auth.validate_token(self.user.token)
+
+        with self.assertRaises(ValidationError):
+            self.auth.validate_token("invalid_token")
+
+        for outcome in OUTCOMES:
+            self.assertEqual(count(outcome), before[outcome] + 1)
+
     def test_authenticate_with_no_header(self) -> None:
         req = self.factory.get(self.url, self.payload)
         self.assertIsNone(self.auth.authenticate(req))
@@ -220,3 +286,115 @@ class TokenAuthenticationTestCase(APITestCase):
 
         assert res is not None
         self.assertTupleEqual(res, expected)
+
+
+class TokenCacheTestCase(APITestCase):
+    """Test case for the cache of validated tokens."""
+
+    def setUp(self) -> None:
+        token_cache.clear()
+
+        self.auth = TokenAuthentication()
+        self.user = User.objects.create_user(
+            email="user@email.com",
+            username="username",
+            password="password",
+        )
+
+    def test_validate_cached_token_without_queries(self) -> None:
+        self.auth.validate_token(self.user.token)
+
+        with self.assertNumQueries(0):
+            res = self.auth.validate_token(self.user.token)
+
+        self.assertTupleEqual(res, (self.user, self.user.token))
+        self.assertEqual(token_cache.stats()["hits"], 1)
+        self.assertEqual(token_cache.stats()["misses"], 1)
+
+    def test_invalidate_token_when_user_is_saved(self) -> None:
+        self.auth.validate_token(self.user.token)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertIsNone(token_cache.get(self.user.token))
+
+    def test_invalidate_token_when_user_is_deleted(self) -> None:
+        token = self.user.token
+        self.auth.validate_token(token)
+
+        self.user.delete()
+
+        self.assertRaises(ValidationError, self.auth.validate_token, token)
+
+    def test_expire_token(self) -> None:
+        cache = TokenCache(max_size=10, ttl=60)
+        cache.set(self.user.token, self.user)
+
+        with patch(
+            "apps.authentication.logic.cache.monotonic", return_value=1e12
+        ):
+            self.assertIsNone(cache.get(self.user.token))
+
+    def test_evict_least_recently_used_token(self) -> None:
+        cache = TokenCache(max_size=1, ttl=60)
+        other = User.objects.create_user(
+            email="other@email.com",
+            username="other",
+            password="password",
+        )
+
+        cache.set(self.user.token, self.user)
+        cache.set(other.token, other)
+
+        self.assertIsNone(cache.get(self.user.token))
+        self.assertEqual(cache.get(other.token), other)
+        self.assertDictEqual(
+            cache.stats(), {"size": 1, "hits": 1, "misses": 1, "evictions": 1}
+        )
+
+    def test_return_copy_of_cached_user(self) -> None:
+        self.auth.validate_token(self.user.token)
+
+        user, _token = self.auth.validate_token(self.user.token)
+        user.username = "changed"
+
+        cached = token_cache.get(self.user.token)
+
+        self.assertIsNot(cached, user)
+        self.assertEqual(getattr(cached, "username", None), "username")
+
+    def test_invalidate_token_again_on_commit(self) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+            # A concurrent request caches the user before the commit.
+            token_cache.set(self.user.token, self.user)
+
+        self.assertIsNone(token_cache.get(self.user.token))
+
+    def test_export_cache_metrics(self) -> None:
+        def count(name: str, **labels: str) -> float:
+            return REGISTRY.get_sample_value(name, labels) or 0
+
+        lookups = "siege_token_cache_lookups_total"
+        evictions = "siege_token_cache_evictions_total"
+        before = (
+            count(lookups, outcome="hit"),
+            count(lookups, outcome="miss"),
+            count(evictions),
+        )
+
+        cache = TokenCache(max_size=1, ttl=60)
+        cache.get(self.user.token)
+        cache.set(self.user.token, self.user)
+        cache.get(self.user.token)
+        cache.set("other", self.user)
+
+        self.assertTupleEqual(
+            (
+                count(lookups, outcome="hit"),
+                count(lookups, outcome="miss"),
+                count(evictions),
+            ),
+            (before[0] + 1, before[1] + 1, before[2] + 1),
+        )
@@ -6,17 +6,20 @@ Siege. All rights reserved
 :author: Siege Team
 """
 
+from asgiref.sync import sync_to_async
 from rest_framework.permissions import AllowAny
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.status import HTTP_200_OK
-from rest_framework.views import APIView
 
 from apps.authentication.logic.serializers import LoginSerializer
+from core.instrumentation import timing
 from core.renderers import BaseJSONRenderer
+from core.throttling import LoginThrottle
+from core.views import AsyncViewMixin
 
 
-class LoginView(APIView):
+class LoginView(AsyncViewMixin):
     """This view is responsible for authenticating users. It is not
     required to be authenticated to use this view. The view will
     return a token that can be used to authenticate the user in
@@ -26,9 +29,16 @@ class LoginView(APIView):
     permission_classes = [AllowAny]
     renderer_classes = [BaseJSONRenderer]
     serializer_class = LoginSerializer
+    throttle_classes = [LoginThrottle]
 
-    def post(self, request: Request) -> Response:
+    async def post(self, request: Request) -> Response:
         serializer = self.serializer_class(data=request.data)
-        serializer.is_valid(raise_exception=True)
 
-        return Response(serializer.data, status=HTTP_200_OK)
+        # `authenticate()` queries the database and hashes the password,
+        # which would block the event loop.
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+
+        with timing("serialize"):
+            data = serializer.data
+
+        return Response(data, status=HTTP_200_OK)
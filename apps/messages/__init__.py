@@ -8,8 +8,6 @@ Siege. All rights reserved
 
 from django.apps import AppConfig
 
-default_app_config = "apps.messages.MessagesConfig"
-
 
 class MessagesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
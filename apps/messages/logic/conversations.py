@@ -0,0 +1,267 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from typing import Any, Iterator
+
+from django.db import connection, transaction
+from django.db.models import (
+    BigIntegerField,
+    Case,
+    Count,
+    Exists,
+    F,
+    Max,
+    OuterRef,
+    PositiveIntegerField,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+
+from apps.messages.models import Conversation, Message
+
+
+def record_message(message: Message) -> None:
+    """Update the conversations of the sender and of the recipient of
+    a new message. This should run in the transaction that creates the
+    message.
+
+    The message becomes the last message of both conversations, and
+    it is unread for the recipient only. Sending a message marks the
+    conversation as read for the sender, since they have seen what
+    they are answering.
+
+    Parameters
+    ----------
+    message: :class:`Message`
+        The new message.
+    """
+    sender, recipient = message.sender_id, message.recipient_id
+    # The conversations are only updated when both of them exist, so
+    # that the update changes either both of them or none.
+    reverse = Conversation.objects.filter(
+        user=OuterRef("peer"), peer=OuterRef("user")
+    )
+    conversations = Conversation.objects.filter(
+        Q(user=sender, peer=recipient) | Q(user=recipient, peer=sender),
+        Exists(reverse),
+    )
+    # Concurrent messages may be recorded out of order, so the state
+    # of a conversation is only moved forward by a newer message. An
+    # older one is not unread if the recipient already read past it,
+    # and only clears the unread messages of the sender if none was
+    # recorded after it.
+    is_newer = Q(last_message__isnull=True) | Q(last_message__lt=message.id)
+    is_unread = Q(last_read_message__isnull=True) | Q(
+        last_read_message__lt=message.id
+    )
+    changes = {
+        "last_message": Case(
+            When(is_newer, then=Value(message.id)),
+            default=F("last_message"),
+            output_field=BigIntegerField(),
+        ),
+        "last_read_message": Case(
+            When(is_unread, user=sender, then=Value(message.id)),
+            default=F("last_read_message"),
+            output_field=BigIntegerField(),
+        ),
+        "unread_count": Case(
+            When(is_unread, user=recipient, then=F("unread_count") + 1),
+            When(is_newer, user=sender, then=Value(0)),
+            default=F("unread_count"),
+            output_field=PositiveIntegerField(),
+        ),
+    }
+
+    # Both conversations usually exist already, so this is a single
+    # `UPDATE`. Otherwise, they are created and updated like a batch.
+    if not conversations.update(**changes):
+        record_messages([message])
+
+
+def record_messages(messages: list[Message]) -> None:
+    """Update the conversations of a batch of new messages, like
+    :func:`record_message` does for each message, with the same three
+    queries whatever the size of the batch. This should run in the
+    transaction that creates the messages.
+
+    Parameters
+    ----------
+    messages: list[:class:`Message`]
+        The new messages.
+    """
+    changes = collect_changes(messages)
+
+    if not changes:
+        return
+
+    Conversation.objects.bulk_create(
+        [Conversation(user_id=user, peer_id=peer) for user, peer in changes],
+        ignore_conflicts=True,
+    )
+
+    query = Q()
+
+    for user, peer in changes:
+        query |= Q(user=user, peer=peer)
+
+    # The conversations are locked, in a consistent order to avoid
+    # deadlocks, so that concurrent messages can't overwrite the
+    # changes made here.
+    conversations = list(
+        Conversation.objects.select_for_update().filter(query).order_by("id")
+    )
+
+    for conversation in conversations:
+        change = changes[(conversation.user_id, conversation.peer_id)]
+        apply_change(conversation, change)
+
+    Conversation.objects.bulk_update(
+        conversations,
+        ["last_message", "last_read_message", "unread_count"],
+    )
+
+
+def collect_changes(
+    messages: list[Message],
+) -> dict[tuple[int, int], dict[str, Any]]:
+    """Return the changes that the given messages make to each of their
+    conversations, keyed by user and peer. `reset` tells whether the
+    user sent a message, which marks the messages received before it
+    as read.
+    """
+    changes: dict[tuple[int, int], dict[str, Any]] = {}
+
+    for message in sorted(messages, key=lambda message: message.id):
+        sender, recipient = message.sender_id, message.recipient_id
+        sent = changes.setdefault((sender, recipient), {"unread_count": 0})
+        received = changes.setdefault((recipient, sender), {"unread_count": 0})
+
+        sent.update(last_read_message=message.id, reset=True, unread_count=0)
+        received["unread_count"] += 1
+
+        for change in (sent, received):
+            change["last_message"] = message.id
+
+    return changes
+
+
+def apply_change(conversation: Conversation, change: dict[str, Any]) -> None:
+    """Apply a change returned by :func:`collect_changes` to the given
+    conversation.
+    """
+    if change.get("reset"):
+        conversation.last_read_message_id = max(
+            conversation.last_read_message_id or 0,
+            change["last_read_message"],
+        )
+        conversation.unread_count = change["unread_count"]
+    else:
+        conversation.unread_count += change["unread_count"]
+
+    conversation.last_message_id = max(
+        conversation.last_message_id or 0, change["last_message"]
+    )
+
+
+def read_conversation(user_id: int, peer_id: int) -> bool:
+    """Mark every message of a conversation as read by its user.
+
+    Parameters
+    ----------
+    user_id: :class:`int`
+        The ID of the user who read the conversation.
+    peer_id: :class:`int`
+        The ID of the other user of the conversation.
+
+    Returns
+    -------
+    :class:`bool`
+        Whether the conversation exists.
+    """
+    updated = Conversation.objects.filter(user=user_id, peer=peer_id).update(
+        last_read_message=F("last_message"), unread_count=0
+    )
+
+    return updated > 0
+
+
+def rebuild_conversations(batch_size: int = 1_000) -> int:
+    """Rebuild every conversation from the messages, keeping what each
+    user has read. Messages sent while this runs may be missed, so it
+    should run while the application is stopped.
+
+    Parameters
+    ----------
+    batch_size: :class:`int`
+        The number of conversations created per query.
+
+    Returns
+    -------
+    :class:`int`
+        The number of conversations.
+    """
+    with transaction.atomic():
+        # Every message is read at once, which can take longer than the
+        # statement timeout of the application.
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL statement_timeout = 0")
+
+        conversations = list(build_conversations())
+
+        Conversation.objects.all().delete()
+        Conversation.objects.bulk_create(conversations, batch_size=batch_size)
+
+    return len(conversations)
+
+
+def build_conversations() -> Iterator[Conversation]:
+    """Yield the conversations computed from the messages, with one
+    query grouping the messages by sender and recipient.
+    """
+    last_read = Conversation.objects.filter(
+        user=OuterRef("recipient"), peer=OuterRef("sender")
+    ).values("last_read_message")
+    sender_last_read = Conversation.objects.filter(
+        user=OuterRef("sender"), peer=OuterRef("recipient")
+    ).values("last_read_message")
+    pairs = Message.objects.values("sender", "recipient").annotate(
+        last_message=Max("id"),
+        last_read_message=Subquery(last_read),
+        sender_last_read_message=Subquery(sender_last_read),
+        unread_count=Count(
+            "id",
+            filter=Q(id__gt=Coalesce(Subquery(last_read), Value(0))),
+        ),
+    )
+    conversations: dict[tuple[int, int], dict[str, Any]] = {}
+
+    for pair in pairs.order_by():
+        sender, recipient = pair["sender"], pair["recipient"]
+        received = conversations.setdefault((recipient, sender), {})
+        sent = conversations.setdefault((sender, recipient), {})
+
+        received["last_read_message_id"] = pair["last_read_message"]
+        received["unread_count"] = pair["unread_count"]
+        # The senders may have read their conversation without
+        # receiving any message in it.
+        sent.setdefault(
+            "last_read_message_id", pair["sender_last_read_message"]
+        )
+
+        for conversation in (received, sent):
+            conversation["last_message_id"] = max(
+                conversation.get("last_message_id", 0), pair["last_message"]
+            )
+
+    for (user, peer), fields in conversations.items():
+        yield Conversation(user_id=user, peer_id=peer, **fields)
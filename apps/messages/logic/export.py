@@ -0,0 +1,100 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from __future__ import annotations
+
+from typing import Any, Iterator
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import QuerySet
+
+from apps.messages.models import Message
+from apps.users.models import User
+from core.renderers import BaseJSONRenderer
+
+# The fields of each exported message, besides its direction and the
+# other user of the conversation.
+EXPORTED_FIELDS = ("id", "sender_id", "recipient_id", "content", "created_at")
+
+
+def iterate_messages(
+    queryset: QuerySet[Message], chunk_size: int
+) -> Iterator[dict[str, Any]]:
+    """Iterate over the given messages, by ID, without ever holding
+    more than `chunk_size` of them in memory.
+
+    The rows are read through a server-side cursor. When server-side
+    cursors are disabled, like behind a pooler in transaction mode, the
+    driver would fetch every row at once instead, so the messages are
+    read in batches of increasing IDs.
+
+    Parameters
+    ----------
+    queryset: :class:`QuerySet`
+        The messages to read.
+    chunk_size: :class:`int`
+        The number of rows fetched at once.
+
+    Yields
+    ------
+    :class:`dict`
+        The exported fields of each message.
+    """
+    rows = queryset.order_by("id").values(*EXPORTED_FIELDS)
+    options = connections[rows.db].settings_dict
+
+    if not options.get("DISABLE_SERVER_SIDE_CURSORS"):
+        yield from rows.iterator(chunk_size=chunk_size)
+        return
+
+    last_id = 0
+
+    while batch := list(rows.filter(id__gt=last_id)[:chunk_size]):
+        yield from batch
+        last_id = batch[-1]["id"]
+
+
+def export_messages(
+    user: User, chunk_size: int | None = None
+) -> Iterator[bytes]:
+    """Export the messages sent and received by the given user, as
+    newline-delimited JSON: one document by line, for each message. The
+    sent messages come first, then the received ones, each by ID.
+
+    Parameters
+    ----------
+    user: :class:`User`
+        The user whose messages are exported.
+    chunk_size: Optional[:class:`int`]
+        The number of rows fetched at once, `MESSAGES_EXPORT_CHUNK_SIZE`
+        by default.
+
+    Yields
+    ------
+    :class:`bytes`
+        The lines of the export.
+    """
+    chunk_size = chunk_size or settings.MESSAGES_EXPORT_CHUNK_SIZE
+    renderer = BaseJSONRenderer()
+
+    directions = (
+        ("sent", "recipient_id", user.sent_messages.all()),
+        ("received", "sender_id", user.received_messages.all()),
+    )
+
+    for direction, peer_field, messages in directions:
+        for message in iterate_messages(messages, chunk_size):
+            document = {
+                "id": message["id"],
+                "direction": direction,
+                "peer": message[peer_field],
+                "content": message["content"],
+                "created_at": message["created_at"],
+            }
+            yield renderer.render_data(document) + b"\n"
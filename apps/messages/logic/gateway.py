@@ -0,0 +1,125 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Mapping
+
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import APIException
+
+from apps.authentication.logic.backend import TokenAuthentication
+from apps.messages.logic.hub import Subscription, hub
+from apps.users.models import User
+
+Receive = Callable[[], Awaitable[Mapping[str, Any]]]
+Send = Callable[[Mapping[str, Any]], Awaitable[None]]
+
+# https://www.rfc-editor.org/rfc/rfc6455#section-7.4.1
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class Gateway:
+    """ASGI application that serves the WebSocket connections of the
+    users. The events of a user, like the messages they receive, are
+    pushed to each of their connections as JSON text frames, see
+    :mod:`apps.messages.logic.hub`.
+
+    Connections authenticate with the same `Authorization` header as
+    the rest of the API, and nothing is read from them but their
+    disconnection.
+
+    A connection that can't keep up with its events is closed with the
+    `1013` (try again later) code, so that it doesn't hold back the
+    other connections. The client should reconnect and fetch what it
+    missed from the messages endpoint.
+    """
+
+    path = "/gateway"
+
+    def __init__(self) -> None:
+        self.authentication = TokenAuthentication()
+
+    async def __call__(
+        self, scope: dict[str, Any], receive: Receive, send: Send
+    ) -> None:
+        if (await receive())["type"] != "websocket.connect":
+            return
+
+        user = None
+
+        if scope["path"] == self.path:
+            user = await self.authenticate(scope)
+
+        if user is None:
+            await send(
+                {"type": "websocket.close", "code": CLOSE_POLICY_VIOLATION}
+            )
+            return
+
+        await send({"type": "websocket.accept"})
+        subscription = await hub.subscribe(user.id)
+
+        try:
+            await self.serve(subscription, receive, send)
+        finally:
+            await hub.unsubscribe(subscription)
+
+    async def authenticate(self, scope: dict[str, Any]) -> User | None:
+        """Return the user authenticated by the headers of the
+        connection, if any.
+        """
+        headers = dict(scope["headers"])
+        authorization = headers.get(b"authorization", b"")
+
+        try:
+            result = await sync_to_async(
+                self.authentication.authenticate_authorization
+            )(authorization)
+        except APIException:
+            return None
+
+        return result[0] if result is not None else None
+
+    async def serve(
+        self, subscription: Subscription, receive: Receive, send: Send
+    ) -> None:
+        """Push the events of the subscription until the client
+        disconnects or the subscription is dropped.
+        """
+        tasks = {
+            asyncio.create_task(self.send_events(subscription, send)),
+            asyncio.create_task(self.wait_disconnect(receive)),
+        }
+        done, pending = await asyncio.wait(
+            tasks, return_when=asyncio.FIRST_COMPLETED
+        )
+
+        for task in pending:
+            task.cancel()
+
+        for task in done:
+            task.result()
+
+    async def send_events(
+        self, subscription: Subscription, send: Send
+    ) -> None:
+        """Send the events of the subscription as they come."""
+        while (payload := await subscription.get()) is not None:
+            await send({"type": "websocket.send", "text": payload})
+
+        # The subscription was dropped because the client was too slow.
+        await send({"type": "websocket.close", "code": CLOSE_TRY_AGAIN_LATER})
+
+    async def wait_disconnect(self, receive: Receive) -> None:
+        """Wait until the client disconnects, ignoring what it sends."""
+        while (await receive())["type"] != "websocket.disconnect":
+            continue
+
+
+gateway = Gateway()
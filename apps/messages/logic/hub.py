@@ -0,0 +1,290 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from __future__ import annotations
+
+import asyncio
+from logging import getLogger
+from threading import Lock
+from typing import Any, Iterable
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from redis.asyncio.client import PubSub
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import RedisError
+
+logger = getLogger(__name__)
+
+
+class Subscription:
+    """The events that are waiting to be sent to one connection of a
+    user.
+
+    The events are kept in a bounded queue. If the connection can't
+    keep up and the queue fills up, the subscription is dropped instead
+    of buffering more events or making the publishers wait, and the
+    connection should be closed. The client can then reconnect and
+    fetch what it missed from the messages endpoint.
+
+    Parameters
+    ----------
+    user_id: :class:`int`
+        The ID of the subscribed user.
+    max_size: :class:`int`
+        The maximum number of pending events.
+    """
+
+    def __init__(self, user_id: int, max_size: int) -> None:
+        self.user_id = user_id
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue(max_size)
+        self.loop = asyncio.get_running_loop()
+        self.dropped = False
+
+    def put(self, payload: str) -> None:
+        """Queue the given event. This must be called from the event
+        loop of the subscription.
+        """
+        if self.dropped:
+            return
+
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.drop()
+
+    def drop(self) -> None:
+        """Discard the pending events and wake up the consumer, which
+        gets `None` from `get` once the subscription is dropped.
+        """
+        self.dropped = True
+
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+        self.queue.put_nowait(None)
+
+    async def get(self) -> str | None:
+        """Wait for the next event, or return `None` if the
+        subscription was dropped.
+        """
+        return await self.queue.get()
+
+
+class BaseBackend:
+    """Carries the published events to the hub of every process that
+    may have subscribers, see :class:`Hub`.
+
+    Parameters
+    ----------
+    hub: :class:`Hub`
+        The hub of this process.
+    """
+
+    def __init__(self, hub: Hub) -> None:
+        self.hub = hub
+
+    def publish(self, user_id: int, payload: str) -> None:
+        """Send the given event to the subscribers of a user, wherever
+        they are connected. This may be called from any thread.
+        """
+        raise NotImplementedError
+
+    def publish_many(self, events: Iterable[tuple[int, str]]) -> None:
+        """Send each of the given events, with the ID of the user it
+        is for, like :meth:`publish` does.
+        """
+        for user_id, payload in events:
+            self.publish(user_id, payload)
+
+    async def subscribe(self, user_id: int) -> None:
+        """Start receiving the events of a user, since they now have a
+        subscriber in this process.
+        """
+
+    async def unsubscribe(self, user_id: int) -> None:
+        """Stop receiving the events of a user, since they no longer
+        have any subscriber in this process.
+        """
+
+
+class LocalBackend(BaseBackend):
+    """A backend that only delivers the events to the subscribers of
+    the current process. This is enough when the application runs in a
+    single process, like in development and in tests.
+    """
+
+    def publish(self, user_id: int, payload: str) -> None:
+        self.hub.deliver(user_id, payload)
+
+
+class RedisBackend(BaseBackend):
+    """A backend that delivers the events through Redis Pub/Sub, so
+    that they reach the subscribers connected to any process.
+
+    Each process only subscribes to the channels of the users that are
+    connected to it, so events are not sent to every process.
+
+    Events are published once the messages are committed, so failing to
+    publish them can't fail the request anymore. If Redis can't be
+    reached, the events are dropped, and the clients fetch the messages
+    they missed from the messages endpoint.
+    """
+
+    prefix = "messages:hub:"
+
+    def __init__(self, hub: Hub) -> None:
+        super().__init__(hub)
+
+        self.client = Redis.from_url(settings.REDIS_URL)
+        self.pubsub: PubSub | None = None
+        self.listener: asyncio.Task[None] | None = None
+
+    def publish(self, user_id: int, payload: str) -> None:
+        try:
+            self.client.publish(f"{self.prefix}{user_id}", payload)
+        except RedisError:
+            logger.warning("Can't reach Redis, an event was dropped.")
+
+    def publish_many(self, events: Iterable[tuple[int, str]]) -> None:
+        # The events are sent in a single round trip.
+        pipeline = self.client.pipeline(transaction=False)
+
+        for user_id, payload in events:
+            pipeline.publish(f"{self.prefix}{user_id}", payload)
+
+        try:
+            pipeline.execute()
+        except RedisError:
+            logger.warning("Can't reach Redis, events were dropped.")
+
+    async def subscribe(self, user_id: int) -> None:
+        if self.pubsub is None:
+            self.pubsub = AsyncRedis.from_url(settings.REDIS_URL).pubsub()
+
+        await self.pubsub.subscribe(f"{self.prefix}{user_id}")
+
+        # The listener is started after the first subscription, since
+        # a connection can't be read before it has subscribed.
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.create_task(self.listen(self.pubsub))
+
+    async def unsubscribe(self, user_id: int) -> None:
+        if self.pubsub is not None:
+            await self.pubsub.unsubscribe(f"{self.prefix}{user_id}")
+
+    async def listen(self, pubsub: PubSub) -> None:
+        """Deliver the events received from Redis to the hub, until the
+        process has no subscriber left.
+        """
+        while True:
+            try:
+                async for message in pubsub.listen():
+                    self.receive(message)
+            except RedisConnectionError:
+                # The connection subscribes to its channels again when
+                # it reconnects.
+                logger.warning("Lost the connection to Redis, retrying.")
+                await asyncio.sleep(1)
+            else:
+                return
+
+    def receive(self, message: dict[str, Any]) -> None:
+        """Deliver a message received from Redis to the hub."""
+        if message["type"] != "message":
+            return
+
+        channel = message["channel"].decode()
+        user_id = int(channel.removeprefix(self.prefix))
+
+        self.hub.deliver(user_id, message["data"].decode())
+
+
+class Hub:
+    """Fans the events of users out to the connections they have in
+    this process. Events are published through the backend, which
+    brings them to the hub of every process with subscribers.
+
+    Delivering an event never waits on a connection: each one has its
+    own queue, see :class:`Subscription`.
+
+    Parameters
+    ----------
+    backend: type[:class:`BaseBackend`]
+        The class of the backend.
+    queue_size: :class:`int`
+        The maximum number of pending events of each subscription.
+    """
+
+    def __init__(self, backend: type[BaseBackend], queue_size: int) -> None:
+        self.backend = backend(self)
+        self.queue_size = queue_size
+
+        self.subscriptions: dict[int, set[Subscription]] = {}
+        self.lock = Lock()
+
+    def publish(self, user_id: int, payload: str) -> None:
+        """Send the given event to every connection of a user. This can
+        be called from any thread.
+        """
+        self.backend.publish(user_id, payload)
+
+    def publish_many(self, events: Iterable[tuple[int, str]]) -> None:
+        """Send each of the given events, with the ID of the user it
+        is for. This can be called from any thread.
+        """
+        self.backend.publish_many(events)
+
+    def deliver(self, user_id: int, payload: str) -> None:
+        """Queue the given event on the subscriptions of a user in this
+        process. This can be called from any thread.
+        """
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(user_id, ()))
+
+        for subscription in subscriptions:
+            if not subscription.loop.is_closed():
+                loop = subscription.loop
+                loop.call_soon_threadsafe(subscription.put, payload)
+
+    async def subscribe(self, user_id: int) -> Subscription:
+        """Return a new subscription to the events of a user."""
+        subscription = Subscription(user_id, self.queue_size)
+
+        with self.lock:
+            subscriptions = self.subscriptions.setdefault(user_id, set())
+            is_first = not subscriptions
+            subscriptions.add(subscription)
+
+        if is_first:
+            await self.backend.subscribe(user_id)
+
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        """Stop delivering events to the given subscription."""
+        user_id = subscription.user_id
+
+        with self.lock:
+            subscriptions = self.subscriptions.get(user_id, set())
+            subscriptions.discard(subscription)
+            is_last = not subscriptions
+
+            if is_last:
+                self.subscriptions.pop(user_id, None)
+
+        if is_last:
+            await self.backend.unsubscribe(user_id)
+
+
+hub = Hub(
+    backend=import_string(settings.MESSAGES_HUB_BACKEND),
+    queue_size=settings.MESSAGES_HUB_QUEUE_SIZE,
+)
@@ -0,0 +1,256 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from django.db import connection, transaction
+
+from apps.messages.models import Conversation
+
+# On PostgreSQL, the `messages` table is partitioned by month of
+# `created_at`, see the `0006_partition_messages` migration. Each month
+# has its own partition, named after it, and messages that fall outside
+# of every partition go to the default one. The other databases keep a
+# single table.
+TABLE = "messages"
+DEFAULT_PARTITION = "messages_default"
+PARTITION_PREFIX = "messages_p"
+
+# The schema that detached partitions are moved to when archived.
+ARCHIVE_SCHEMA = "messages_archive"
+
+
+def is_partitioned() -> bool:
+    """Return whether the messages table is partitioned, which is only
+    the case on PostgreSQL.
+    """
+    if connection.vendor != "postgresql":
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass(%s)",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def month_start(moment: datetime) -> datetime:
+    """Return the start of the month of the given moment, in UTC."""
+    moment = moment.astimezone(timezone.utc)
+
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    """Return the start of the month `count` months after the given
+    month, which may be negative.
+    """
+    index = month.year * 12 + month.month - 1 + count
+
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month: datetime) -> str:
+    """Return the name of the partition of the given month, like
+    `messages_p2023_01`.
+    """
+    return f"{PARTITION_PREFIX}{month:%Y_%m}"
+
+
+def partition_month(name: str) -> datetime | None:
+    """Return the month of the partition with the given name, or `None`
+    if it isn't the partition of a month, like the default partition.
+    """
+    if not name.startswith(PARTITION_PREFIX):
+        return None
+
+    try:
+        month = datetime.strptime(name.removeprefix(PARTITION_PREFIX), "%Y_%m")
+    except ValueError:
+        return None
+
+    return month.replace(tzinfo=timezone.utc)
+
+
+def expired_partitions(
+    names: list[str], now: datetime, retain: int
+) -> list[str]:
+    """Return the partitions, among the given ones, whose messages are
+    all older than the last `retain` months, including the current one.
+
+    Parameters
+    ----------
+    names: list[:class:`str`]
+        The names of the partitions.
+    now: :class:`datetime`
+        The current time.
+    retain: :class:`int`
+        The number of months to keep.
+
+    Returns
+    -------
+    list[:class:`str`]
+        The names of the expired partitions, from the oldest one.
+    """
+    oldest = add_months(month_start(now), 1 - retain)
+    months = {name: partition_month(name) for name in names}
+
+    return sorted(
+        name
+        for name, month in months.items()
+        if month is not None and month < oldest
+    )
+
+
+def get_partitions() -> list[str]:
+    """Return the names of the partitions of the messages table."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s) "
+            "ORDER BY child.relname",
+            [TABLE],
+        )
+        return [name for (name,) in cursor.fetchall()]
+
+
+def get_columns() -> list[str]:
+    """Return the columns of the messages table that can be written,
+    which excludes generated columns like `search_vector`.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = %s "
+            "AND is_generated = 'NEVER' ORDER BY ordinal_position",
+            [TABLE],
+        )
+        return [name for (name,) in cursor.fetchall()]
+
+
+def get_default_months() -> list[datetime]:
+    """Return the months of the messages in the default partition,
+    which have no partition of their own.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT DISTINCT date_trunc('month', created_at, 'UTC') FROM "
+            f"{connection.ops.quote_name(DEFAULT_PARTITION)} ORDER BY 1"
+        )
+        return [month_start(month) for (month,) in cursor.fetchall()]
+
+
+def create_partition(month: datetime) -> bool:
+    """Create the partition of the given month, unless it exists.
+
+    The messages of that month in the default partition, which happens
+    when no partition was created for it in time, are moved to the new
+    one. It is filled as a table of its own and then attached, which
+    builds its indexes. Meanwhile, messages can be read, but not
+    written to the default partition.
+
+    Parameters
+    ----------
+    month: :class:`datetime`
+        The start of the month.
+
+    Returns
+    -------
+    :class:`bool`
+        Whether the partition was created.
+    """
+    name = partition_name(month)
+
+    if name in get_partitions():
+        return False
+
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(column) for column in get_columns())
+    bounds = [month, add_months(month, 1)]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Moving the messages can take longer than the statement timeout
+        # of the application.
+        cursor.execute("SET LOCAL statement_timeout = 0")
+        cursor.execute(
+            f"LOCK TABLE {quote(DEFAULT_PARTITION)} IN EXCLUSIVE MODE"
+        )
+        cursor.execute(
+            f"CREATE TABLE {quote(name)} (LIKE {quote(TABLE)} "
+            "INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING STORAGE)"
+        )
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {quote(DEFAULT_PARTITION)} "
+            "WHERE created_at >= %s AND created_at < %s "
+            f"RETURNING {columns}) INSERT INTO {quote(name)} ({columns}) "
+            f"SELECT {columns} FROM moved",
+            bounds,
+        )
+        cursor.execute(
+            f"ALTER TABLE {quote(TABLE)} ATTACH PARTITION {quote(name)} "
+            "FOR VALUES FROM (%s) TO (%s)",
+            bounds,
+        )
+
+    return True
+
+
+def detach_partition(name: str, archive: bool) -> None:
+    """Detach the given partition from the messages table, so that its
+    messages are no longer read nor written through it. The partition
+    is kept as a table of its own, which can then be dumped or dropped.
+
+    Conversations no longer reference the messages of the partition,
+    as their last message or the last one read, like when messages
+    are deleted.
+
+    Parameters
+    ----------
+    name: :class:`str`
+        The name of the partition.
+    archive: :class:`bool`
+        Whether to move the detached table to the archive schema.
+    """
+    quote = connection.ops.quote_name
+    conversations = quote(Conversation._meta.db_table)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(name)}"
+        )
+
+        for column in ("last_message_id", "last_read_message_id"):
+            cursor.execute(
+                f"UPDATE {conversations} SET {column} = NULL "
+                f"WHERE {column} IN (SELECT id FROM {quote(name)})"
+            )
+
+        if archive:
+            cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+            cursor.execute(
+                f"ALTER TABLE {quote(name)} SET SCHEMA {ARCHIVE_SCHEMA}"
+            )
+
+
+def count_default_messages() -> int:
+    """Return the number of messages in the default partition, which
+    should stay empty.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM "
+            f"{connection.ops.quote_name(DEFAULT_PARTITION)}"
+        )
+        (count,) = cursor.fetchone()
+
+    return int(count)
@@ -0,0 +1,105 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from django.conf import settings
+from django.db.models import F, FloatField, QuerySet, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from django.utils.module_loading import import_string
+
+from apps.messages.models import Message
+
+
+class BaseSearch:
+    """Searches the content of messages. The backend is chosen with
+    the `MESSAGES_SEARCH_BACKEND` setting.
+    """
+
+    def search(
+        self, queryset: QuerySet[Message], terms: str
+    ) -> QuerySet[Message]:
+        """Return the messages of the queryset that match the given
+        terms, annotated with their `rank`. The higher the rank, the
+        better the message matches.
+
+        Parameters
+        ----------
+        queryset: :class:`QuerySet`
+            The messages to search.
+        terms: :class:`str`
+            The terms to search for.
+
+        Returns
+        -------
+        :class:`QuerySet`
+            The matching messages.
+        """
+        raise NotImplementedError
+
+
+class PostgresSearch(BaseSearch):
+    """A backend that uses the full-text search of PostgreSQL.
+
+    Messages are matched against the `search_vector` column of the
+    `messages` table, which is generated from their content and has a
+    GIN index. Both are created by a migration, outside of the model,
+    since Django can't declare generated columns. The terms support
+    the syntax of web search engines, like quoted phrases and `-` to
+    exclude a word.
+    """
+
+    # The text search configuration of the `search_vector` column. The
+    # `simple` configuration doesn't stem words, since messages can be
+    # written in any language.
+    config = "simple"
+
+    def search(
+        self, queryset: QuerySet[Message], terms: str
+    ) -> QuerySet[Message]:
+        # The PostgreSQL expressions import its driver, which isn't
+        # installed with the other databases.
+        from django.contrib.postgres.search import (
+            SearchQuery,
+            SearchRank,
+            SearchVectorField,
+        )
+
+        vector = RawSQL(
+            '"messages"."search_vector"', [], output_field=SearchVectorField()
+        )
+        query = SearchQuery(terms, config=self.config, search_type="websearch")
+
+        return (
+            queryset.annotate(search_vector=vector).filter(search_vector=query)
+            # `ts_rank` returns a `real`, which Python reads back as a
+            # slightly different `double precision`. The cursor would
+            # then compare the ranks with a different value, and repeat
+            # or skip results, so the rank is a `double precision` too.
+            .annotate(
+                rank=Cast(SearchRank(F("search_vector"), query), FloatField())
+            )
+        )
+
+
+class SimpleSearch(BaseSearch):
+    """A backend for the databases without full-text search, like the
+    SQLite database of the CI. Messages must contain every word of the
+    terms and they are not ranked, so each scan reads every message of
+    the queryset.
+    """
+
+    def search(
+        self, queryset: QuerySet[Message], terms: str
+    ) -> QuerySet[Message]:
+        for term in terms.split():
+            queryset = queryset.filter(content__icontains=term)
+
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+message_search: BaseSearch = import_string(settings.MESSAGES_SEARCH_BACKEND)()
@@ -6,19 +6,35 @@ Siege. All rights reserved
 :author: Siege Team
 """
 
-from typing import Any
+from functools import partial
+from typing import Any, cast
 
+from django.conf import settings
+from django.db import transaction
 from django.utils.translation import gettext as _
 from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.serializers import (
     CharField,
+    DictField,
+    IntegerField,
+    ListField,
     ModelSerializer,
+    Serializer,
     SerializerMethodField,
 )
+from rest_framework.status import (
+    HTTP_201_CREATED,
+    HTTP_400_BAD_REQUEST,
+    HTTP_404_NOT_FOUND,
+)
 
-from apps.messages.models import Message
+from apps.messages.logic.conversations import record_message, record_messages
+from apps.messages.logic.hub import hub
+from apps.messages.models import Conversation, Message
 from apps.users.logic.serializers import UserSerializer
-from apps.users.logic.utils import get_user
+from apps.users.models import MAX_USER_ID, User
+from core.metrics import messages_created
+from core.renderers import BaseJSONRenderer
 
 
 class MessageSerializer(ModelSerializer[Message]):
@@ -38,19 +54,197 @@ class MessageSerializer(ModelSerializer[Message]):
 
     def create(self, validated_data: dict[str, str]) -> Message:
         sender = self.context["sender"]
-        recipient = get_user(user_id=self.context["user_id"])
-
-        if not recipient.is_active:
-            raise NotFound(_("User not found."))
+        # The view parses the ID in the URL, see `parse_user_id`.
+        recipient_id = self.context["user_id"]
 
-        if sender == recipient:
+        if recipient_id == sender.id:
             raise ValidationError(
                 {"detail": _("You cannot send a message to yourself")}
             )
 
-        return Message.objects.create(
-            sender=sender, recipient=recipient, **validated_data
-        )
+        # Only the existence of the recipient matters here, so it is
+        # checked without loading the user.
+        recipients = User.objects.filter(id=recipient_id, is_active=True)
+
+        if not recipients.exists():
+            raise NotFound(_("User not found."))
+
+        with transaction.atomic():
+            message = Message.objects.create(
+                sender=sender, recipient_id=recipient_id, **validated_data
+            )
+            record_message(message)
+
+        messages_created.inc()
+
+        # The message is only pushed once it is committed, otherwise the
+        # recipient could receive a message that is then rolled back.
+        transaction.on_commit(partial(self.publish, message))
+
+        return message
+
+    def publish(self, message: Message) -> None:
+        """Push the given message to the connections of its recipient,
+        see :mod:`apps.messages.logic.gateway`.
+        """
+        hub.publish(*self.get_event(message))
+
+    def get_event(self, message: Message) -> tuple[int, str]:
+        """Return the event that pushes the given message, with the ID
+        of the user it is for.
+        """
+        event = {
+            "type": "message.created",
+            "channel_id": message.sender_id,
+            "message": self.to_representation(message),
+        }
+
+        return message.recipient_id, BaseJSONRenderer().render(event).decode()
 
     def get_sender(self, message: Message) -> dict[str, Any]:
-        return UserSerializer(message.sender).data
+        # A list of messages usually has only a few distinct senders,
+        # so each of them is serialized once and shared by all of its
+        # messages in the response.
+        senders = self.context.setdefault("serialized_senders", {})
+
+        if message.sender_id not in senders:
+            senders[message.sender_id] = UserSerializer(message.sender).data
+
+        return cast(dict[str, Any], senders[message.sender_id])
+
+
+class ConversationSerializer(ModelSerializer[Conversation]):
+    """This serializer is used to list the conversations of the inbox
+    of a user, with the other user of each conversation and its last
+    message.
+    """
+
+    peer = UserSerializer(read_only=True)
+    last_message = MessageSerializer(read_only=True)
+
+    class Meta:
+        model = Conversation
+        fields = ("peer", "last_message", "unread_count")
+
+
+class SearchSerializer(Serializer[dict[str, Any]]):
+    """This serializer is used to validate the query parameters of the
+    messages search endpoint.
+    """
+
+    q = CharField(max_length=256)
+
+
+class BulkMessageItemSerializer(Serializer[dict[str, Any]]):
+    """This serializer is used to validate one of the messages sent
+    through the bulk messages endpoint.
+    """
+
+    recipient = IntegerField(min_value=1, max_value=MAX_USER_ID)
+    content = CharField(max_length=2048)
+
+
+class BulkMessageSerializer(Serializer[list[Any]]):
+    """This serializer is used to send many messages, to any number of
+    recipients, in a single request. Each message is validated on its
+    own and gets its own result: either the created message or the
+    errors that prevented it from being sent, with their status code.
+
+    The recipients are fetched with a single query, and the messages
+    are inserted with a single query as well.
+    """
+
+    messages = ListField(
+        child=DictField(),
+        min_length=1,
+        max_length=settings.MESSAGES_BULK_MAX_SIZE,
+    )
+
+    def create(self, validated_data: dict[str, Any]) -> list[Any]:
+        items = [
+            BulkMessageItemSerializer(data=item)
+            for item in validated_data["messages"]
+        ]
+        recipients = self.get_recipients(
+            [item.validated_data for item in items if item.is_valid()]
+        )
+        results = [self.build_message(item, recipients) for item in items]
+        messages = [
+            result for result in results if isinstance(result, Message)
+        ]
+
+        with transaction.atomic():
+            Message.objects.bulk_create(messages)
+            record_messages(messages)
+
+        messages_created.inc(len(messages))
+
+        # Like for a single message, the messages are only pushed once
+        # they are committed.
+        transaction.on_commit(partial(self.publish, messages))
+
+        return results
+
+    def publish(self, messages: list[Message]) -> None:
+        """Push the given messages to the connections of their
+        recipients, all at once.
+        """
+        serializer = MessageSerializer(context=self.context)
+
+        hub.publish_many(serializer.get_event(message) for message in messages)
+
+    def get_recipients(self, items: list[dict[str, Any]]) -> set[int]:
+        """Return the IDs of the active users among the recipients of
+        the given messages.
+        """
+        ids = {item["recipient"] for item in items}
+        users = User.objects.filter(id__in=ids, is_active=True)
+
+        return set(users.values_list("id", flat=True))
+
+    def build_message(
+        self, item: BulkMessageItemSerializer, recipients: set[int]
+    ) -> Message | dict[str, Any]:
+        """Return the message to create for the given item, or the
+        errors that prevent it from being sent.
+        """
+        sender = self.context["sender"]
+
+        if item.errors:
+            return self.error(HTTP_400_BAD_REQUEST, item.errors)
+
+        data = item.validated_data
+
+        if data["recipient"] not in recipients:
+            detail = _("User not found.")
+            return self.error(HTTP_404_NOT_FOUND, {"detail": detail})
+
+        if data["recipient"] == sender.id:
+            detail = _("You cannot send a message to yourself")
+            return self.error(HTTP_400_BAD_REQUEST, {"detail": detail})
+
+        return Message(
+            sender=sender,
+            recipient_id=data["recipient"],
+            content=data["content"],
+        )
+
+    def to_representation(self, instance: list[Any]) -> dict[str, Any]:
+        serializer = MessageSerializer(context=self.context)
+        results = [
+            {
+                "status": HTTP_201_CREATED,
+                "message": serializer.to_representation(result),
+            }
+            if isinstance(result, Message)
+            else result
+            for result in instance
+        ]
+
+        return {"results": results}
+
+    def error(self, status: int, errors: Any) -> dict[str, Any]:
+        """Return the result of a message that could not be sent, in
+        the same format as the errors of the rest of the API.
+        """
+        return {"status": status, "errors": errors}
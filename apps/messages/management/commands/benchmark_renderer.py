@@ -0,0 +1,93 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+import json
+from argparse import ArgumentParser
+from typing import Any
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils import timezone
+
+from apps.messages.logic.serialiazers import MessageSerializer
+from apps.messages.models import Message
+from apps.users.models import User
+from core.benchmarks import benchmark_database, environment, measure
+from core.renderers import BaseJSONRenderer
+
+BACKENDS = ["json", "orjson"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how long each JSON backend of `BaseJSONRenderer` takes "
+        "to render a page of messages. The report is written as JSON."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--messages",
+            type=int,
+            default=1_000,
+            help="Number of messages in the rendered payload.",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=500,
+            help="Number of renders measured per backend.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        data = build_payload(options["messages"])
+        renderer = BaseJSONRenderer()
+        results: dict[str, dict[str, Any]] = {}
+
+        with benchmark_database():
+            for backend in BACKENDS:
+                with override_settings(JSON_RENDERER_BACKEND=backend):
+                    results[backend] = measure(
+                        lambda: renderer.render(data), options["iterations"]
+                    )
+
+            report = {
+                "benchmark": "renderer",
+                "environment": environment(),
+                "messages": options["messages"],
+                "results": [
+                    {"backend": backend, **result}
+                    for backend, result in results.items()
+                ],
+                "speedup": round(
+                    results["json"]["p50_ms"] / results["orjson"]["p50_ms"], 2
+                ),
+            }
+
+        self.stdout.write(json.dumps(report, indent=2))
+
+
+def build_payload(size: int) -> Any:
+    """Return the serialized data of `size` messages sent by a handful
+    of users, like a page of a busy channel.
+    """
+    now = timezone.now()
+    senders = [
+        User(id=i, username=f"user{i}", tag=i, created_at=now)
+        for i in range(1, 21)
+    ]
+    messages = [
+        Message(
+            id=i,
+            sender=senders[i % len(senders)],
+            content="Lorem ipsum dolor sit amet, consectetur adipiscing elit.",
+            created_at=now,
+        )
+        for i in range(size)
+    ]
+
+    return MessageSerializer(messages, many=True).data
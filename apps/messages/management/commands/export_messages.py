@@ -0,0 +1,51 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+import sys
+from argparse import ArgumentParser, FileType
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.messages.logic.export import export_messages
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Export every message sent or received by a user, as "
+        "newline-delimited JSON, like `GET /messages/export` does."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument("user_id", type=int, help="ID of the user.")
+        parser.add_argument(
+            "--output",
+            type=FileType("wb"),
+            default=sys.stdout.buffer,
+            help="File to write the export to, the standard output by "
+            "default.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            help="Number of messages fetched at once.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        try:
+            user = User.objects.get(id=options["user_id"])
+        except User.DoesNotExist:
+            raise CommandError("User not found.")
+
+        output = options["output"]
+
+        for line in export_messages(user, options["chunk_size"]):
+            output.write(line)
+
+        output.flush()
@@ -0,0 +1,117 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from argparse import ArgumentParser
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.messages.logic.partitions import (
+    ARCHIVE_SCHEMA,
+    add_months,
+    count_default_messages,
+    create_partition,
+    detach_partition,
+    expired_partitions,
+    get_default_months,
+    get_partitions,
+    is_partitioned,
+    month_start,
+    partition_name,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly partitions of the messages table ahead of "
+        "time, and detach the partitions older than the retention "
+        "period, if any. This should run at least once a month. Only "
+        "PostgreSQL partitions the messages table."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=3,
+            help="Number of future months to create partitions for.",
+        )
+        parser.add_argument(
+            "--move-default",
+            action="store_true",
+            help=(
+                "Also create the partitions of the months that have "
+                "messages in the default partition, and move them there."
+            ),
+        )
+        parser.add_argument(
+            "--retain",
+            type=int,
+            help=(
+                "Number of months to keep, including the current one. "
+                "Older partitions are detached. By default, every "
+                "partition is kept."
+            ),
+        )
+        parser.add_argument(
+            "--archive",
+            action="store_true",
+            help=(
+                "Move the detached partitions to the "
+                f"`{ARCHIVE_SCHEMA}` schema."
+            ),
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if options["retain"] is not None and options["retain"] < 1:
+            raise CommandError("At least the current month must be kept.")
+
+        if not is_partitioned():
+            self.stdout.write(
+                "The messages table isn't partitioned on this database, "
+                "there is nothing to do."
+            )
+            return
+
+        self.create(options["ahead"], options["move_default"])
+
+        if options["retain"] is not None:
+            self.detach(options["retain"], options["archive"])
+
+        if count := count_default_messages():
+            self.stderr.write(
+                f"The default partition has {count} messages, which "
+                "belong to months without a partition. Run this again "
+                "with --move-default to move them to their partitions."
+            )
+
+    def create(self, ahead: int, move_default: bool) -> None:
+        """Create the partitions of the current month and of the given
+        number of months after it, unless they exist, and those of the
+        months of the messages in the default partition if asked to.
+        """
+        current = month_start(timezone.now())
+        months = {add_months(current, offset) for offset in range(ahead + 1)}
+
+        if move_default:
+            months.update(get_default_months())
+
+        for month in sorted(months):
+            if create_partition(month):
+                self.stdout.write(f"Created {partition_name(month)}.")
+
+    def detach(self, retain: int, archive: bool) -> None:
+        """Detach the partitions older than the given number of months,
+        and archive them if asked to.
+        """
+        names = get_partitions()
+
+        for name in expired_partitions(names, timezone.now(), retain):
+            detach_partition(name, archive)
+            self.stdout.write(f"Detached {name}.")
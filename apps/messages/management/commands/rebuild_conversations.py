@@ -0,0 +1,36 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from argparse import ArgumentParser
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from apps.messages.logic.conversations import rebuild_conversations
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the conversations, which back the inbox of the users, "
+        "from the messages. What each user has read is kept. Messages "
+        "sent while this runs may be missed, so stop the application "
+        "first."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1_000,
+            help="Number of conversations created per query.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        count = rebuild_conversations(batch_size=options["batch_size"])
+
+        self.stdout.write(f"Rebuilt {count} conversations.")
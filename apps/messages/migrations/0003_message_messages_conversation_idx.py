@@ -0,0 +1,19 @@
+# Generated by Django 4.1.7 on 2026-10-18 10:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messages", "0002_alter_message_options_alter_message_table"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["sender", "recipient", "created_at"],
+                name="messages_conversation_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def create_search_vector(apps, schema_editor):
+    # Full-text search is only available on PostgreSQL, the other
+    # databases fall back to `apps.messages.logic.search.SimpleSearch`.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute(
+        "ALTER TABLE messages ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED"
+    )
+    schema_editor.execute(
+        "CREATE INDEX messages_search_idx ON messages "
+        "USING GIN (search_vector)"
+    )
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("DROP INDEX IF EXISTS messages_search_idx")
+    schema_editor.execute(
+        "ALTER TABLE messages DROP COLUMN IF EXISTS search_vector"
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messages", "0004_conversation"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_vector, drop_search_vector),
+    ]
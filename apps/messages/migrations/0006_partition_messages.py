@@ -0,0 +1,172 @@
+# Generated by Django 4.1.7 on 2026-10-18 11:43
+
+from datetime import datetime, timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The number of months after the current one that get a partition. The
+# `manage_partitions` command creates the next ones over time.
+MONTHS_AHEAD = 3
+
+
+def month_start(moment):
+    moment = moment.astimezone(timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def fetch(cursor, sql, params=()):
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+def rebuild_messages(schema_editor, partitioned):
+    """Copy the messages to a new table, partitioned by month or not,
+    which then replaces the current table. The indexes and the foreign
+    keys of the table are created again on the new one. Nothing else
+    may reference the table, which is why the conversations no longer
+    have foreign keys to the messages.
+    """
+    execute = schema_editor.execute
+
+    # The messages are copied with a single statement, which can take
+    # longer than the statement timeout of the application. This only
+    # lasts until the migration is committed.
+    execute("SET LOCAL statement_timeout = 0")
+
+    with schema_editor.connection.cursor() as cursor:
+        indexes = fetch(
+            cursor,
+            "SELECT indexdef FROM pg_indexes "
+            "WHERE schemaname = current_schema() AND tablename = 'messages' "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint "
+            "WHERE conrelid = 'messages'::regclass AND contype = 'p')",
+        )
+        foreign_keys = fetch(
+            cursor,
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = 'messages'::regclass AND contype = 'f'",
+        )
+        # Generated columns, like `search_vector`, can't be copied.
+        columns = ", ".join(
+            f'"{name}"'
+            for (name,) in fetch(
+                cursor,
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = current_schema() "
+                "AND table_name = 'messages' AND is_generated = 'NEVER' "
+                "ORDER BY ordinal_position",
+            )
+        )
+        [(oldest,)] = fetch(cursor, "SELECT min(created_at) FROM messages")
+
+    execute(
+        "CREATE TABLE messages_new (LIKE messages INCLUDING DEFAULTS "
+        "INCLUDING IDENTITY INCLUDING GENERATED INCLUDING STORAGE)"
+        + (" PARTITION BY RANGE (created_at)" if partitioned else "")
+    )
+
+    if partitioned:
+        # The primary key of a partitioned table must include the
+        # partition key.
+        execute("ALTER TABLE messages_new ADD PRIMARY KEY (id, created_at)")
+
+        now = month_start(datetime.now(timezone.utc))
+        month = month_start(oldest) if oldest else now
+
+        while month <= add_months(now, MONTHS_AHEAD):
+            execute(
+                f"CREATE TABLE messages_p{month:%Y_%m} "
+                "PARTITION OF messages_new FOR VALUES FROM (%s) TO (%s)",
+                [month, add_months(month, 1)],
+            )
+            month = add_months(month, 1)
+
+        execute(
+            "CREATE TABLE messages_default PARTITION OF messages_new DEFAULT"
+        )
+    else:
+        execute("ALTER TABLE messages_new ADD PRIMARY KEY (id)")
+
+    execute(
+        f"INSERT INTO messages_new ({columns}) OVERRIDING SYSTEM VALUE "
+        f"SELECT {columns} FROM messages"
+    )
+    execute(
+        "SELECT setval(pg_get_serial_sequence('messages_new', 'id'), "
+        "coalesce(max(id), 0) + 1, false) FROM messages_new"
+    )
+
+    execute("DROP TABLE messages")
+    execute("ALTER TABLE messages_new RENAME TO messages")
+    execute(
+        "ALTER TABLE messages RENAME CONSTRAINT messages_new_pkey TO messages_pkey"
+    )
+
+    with schema_editor.connection.cursor() as cursor:
+        [(sequence,)] = fetch(
+            cursor, "SELECT pg_get_serial_sequence('messages', 'id')"
+        )
+
+    execute(f"ALTER SEQUENCE {sequence} RENAME TO messages_id_seq")
+
+    for (definition,) in indexes:
+        # Indexes of a partitioned table are only defined on the table
+        # itself, which doesn't apply to a regular table.
+        execute(definition.replace(" ON ONLY ", " ON "))
+
+    for name, definition in foreign_keys:
+        execute(f"ALTER TABLE messages ADD CONSTRAINT {name} {definition}")
+
+
+def partition_messages(apps, schema_editor):
+    # Partitioning is only available on PostgreSQL, the messages stay
+    # in a single table on the other databases.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    rebuild_messages(schema_editor, partitioned=True)
+
+
+def unpartition_messages(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    rebuild_messages(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messages", "0005_message_search_vector"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="conversation",
+            name="last_message",
+            field=models.ForeignKey(
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="messages.message",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="conversation",
+            name="last_read_message",
+            field=models.ForeignKey(
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="messages.message",
+            ),
+        ),
+        migrations.RunPython(partition_messages, unpartition_messages),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.1.7 on 2026-10-18 14:05
+
+from django.db import migrations
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# The number of conversations created per query.
+BATCH_SIZE = 1_000
+
+
+def backfill_conversations(apps, schema_editor):
+    """Build the conversations of the messages sent before they were
+    recorded, like `rebuild_conversations` does. What each user has
+    read since then is kept.
+    """
+    Conversation = apps.get_model("messages", "Conversation")
+    Message = apps.get_model("messages", "Message")
+
+    # Every message is read at once, which can take longer than the
+    # statement timeout of the application.
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("SET LOCAL statement_timeout = 0")
+
+    last_read = Conversation.objects.filter(
+        user=OuterRef("recipient"), peer=OuterRef("sender")
+    ).values("last_read_message")
+    sender_last_read = Conversation.objects.filter(
+        user=OuterRef("sender"), peer=OuterRef("recipient")
+    ).values("last_read_message")
+    pairs = Message.objects.values("sender", "recipient").annotate(
+        last_message=Max("id"),
+        last_read_message=Subquery(last_read),
+        sender_last_read_message=Subquery(sender_last_read),
+        unread_count=Count(
+            "id",
+            filter=Q(id__gt=Coalesce(Subquery(last_read), Value(0))),
+        ),
+    )
+    conversations = {}
+
+    for pair in pairs.order_by():
+        sender, recipient = pair["sender"], pair["recipient"]
+        received = conversations.setdefault((recipient, sender), {})
+        sent = conversations.setdefault((sender, recipient), {})
+
+        received["last_read_message_id"] = pair["last_read_message"]
+        received["unread_count"] = pair["unread_count"]
+        sent.setdefault(
+            "last_read_message_id", pair["sender_last_read_message"]
+        )
+
+        for conversation in (received, sent):
+            conversation["last_message_id"] = max(
+                conversation.get("last_message_id", 0), pair["last_message"]
+            )
+
+    Conversation.objects.all().delete()
+    Conversation.objects.bulk_create(
+        [
+            Conversation(user_id=user, peer_id=peer, **fields)
+            for (user, peer), fields in conversations.items()
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messages", "0006_partition_messages"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_conversations, migrations.RunPython.noop
+        ),
+    ]
@@ -6,12 +6,55 @@ Siege. All rights reserved
 :author: Siege Team
 """
 
-from django.db.models import CASCADE, BooleanField, ForeignKey, TextField
+from __future__ import annotations
+
+from django.db.models import (
+    CASCADE,
+    SET_NULL,
+    BooleanField,
+    ForeignKey,
+    Index,
+    Model,
+    PositiveIntegerField,
+    Q,
+    QuerySet,
+    TextField,
+    UniqueConstraint,
+)
 
 from apps.users.models import User
 from core.models import TimestampedModel
 
 
+class MessageQuerySet(QuerySet["Message"]):
+    """Custom queryset with the filters we use to read messages."""
+
+    def between(self, user: User, peer: User) -> MessageQuerySet:
+        """Return the messages exchanged between the two given users,
+        in both directions.
+
+        The messages of each direction are a range of the conversation
+        index, but an `OR` of both would make the database read all of
+        them and sort them. The result is a `UNION ALL` of the two
+        directions instead, which :class:`KeysetPagination` pages with
+        a `LIMIT` on each of them. Since nothing can be filtered after a
+        union, the other filters must be applied before this one.
+        """
+        return self.filter(sender=user, recipient=peer).union(
+            self.filter(sender=peer, recipient=user), all=True
+        )
+
+    def involving(self, user: User) -> MessageQuerySet:
+        """Return the messages sent or received by the given user."""
+        return self.filter(Q(sender=user) | Q(recipient=user))
+
+    def with_senders(self) -> MessageQuerySet:
+        """Fetch the sender of each message in the same query, since
+        every serialized message includes its sender.
+        """
+        return self.select_related("sender")
+
+
 class Message(TimestampedModel):
     """Represents a message sent by a user to another user."""
 
@@ -24,6 +67,71 @@ class Message(TimestampedModel):
     # keep the message in the database, but we don't want to show it
     # to the sender.
     is_deleted = BooleanField(default=True)
+    # On PostgreSQL, the table also has a `search_vector` column that
+    # is generated from `content`, see `apps.messages.logic.search`.
+    # It is also partitioned by month of `created_at`, and its primary
+    # key is `(id, created_at)`, see `apps.messages.logic.partitions`.
+
+    objects = MessageQuerySet.as_manager()
 
     class Meta:
         db_table = "messages"
+        indexes = [
+            # Used to read the history of a conversation, one direction
+            # at a time, see `MessageQuerySet.between`.
+            Index(
+                fields=["sender", "recipient", "created_at"],
+                name="messages_conversation_idx",
+            ),
+        ]
+
+
+class Conversation(Model):
+    """Summary of the messages exchanged between a user and a peer, as
+    seen by the user. There is one conversation for each direction of
+    a pair of users, so that the inbox of a user is a single indexed
+    read instead of a `GROUP BY` over all of the messages.
+
+    Conversations are updated incrementally when a message is sent,
+    see :mod:`apps.messages.logic.conversations`, and can be rebuilt
+    from the messages with the `rebuild_conversations` command.
+    """
+
+    user = ForeignKey(User, on_delete=CASCADE, related_name="conversations")
+    peer = ForeignKey(User, on_delete=CASCADE, related_name="+")
+    # On PostgreSQL, the primary key of the partitioned messages table
+    # includes `created_at`, so the database can't enforce references
+    # to the ID of a message.
+    last_message = ForeignKey(
+        Message,
+        on_delete=SET_NULL,
+        null=True,
+        related_name="+",
+        db_constraint=False,
+    )
+    # The last message the user has read. It is kept so that the unread
+    # count can be computed again from the messages.
+    last_read_message = ForeignKey(
+        Message,
+        on_delete=SET_NULL,
+        null=True,
+        related_name="+",
+        db_constraint=False,
+    )
+    unread_count = PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "conversations"
+        constraints = [
+            UniqueConstraint(
+                fields=["user", "peer"], name="conversations_user_peer_uniq"
+            ),
+        ]
+        indexes = [
+            # Used to read the inbox of a user, from the most recently
+            # active conversation to the least recently active one.
+            Index(
+                fields=["user", "last_message", "id"],
+                name="conversations_inbox_idx",
+            ),
+        ]
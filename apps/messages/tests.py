@@ -6,17 +6,55 @@ Siege. All rights reserved
 :author: Siege Team
 """
 
+import asyncio
+import json
+from base64 import urlsafe_b64encode
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from tempfile import NamedTemporaryFile
+from typing import Any, Mapping, cast
+from unittest import skipUnless
+from unittest.mock import Mock, patch
+
+from asgiref.sync import sync_to_async
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from prometheus_client import REGISTRY
+from redis.exceptions import ConnectionError as RedisConnectionError
 from rest_framework.reverse import reverse
 from rest_framework.status import (
+    HTTP_200_OK,
     HTTP_201_CREATED,
+    HTTP_204_NO_CONTENT,
     HTTP_400_BAD_REQUEST,
     HTTP_401_UNAUTHORIZED,
     HTTP_404_NOT_FOUND,
 )
 from rest_framework.test import APITestCase
 
+from apps.messages.logic.conversations import read_conversation, record_message
+from apps.messages.logic.export import export_messages
+from apps.messages.logic.gateway import gateway
+from apps.messages.logic.hub import RedisBackend, hub
+from apps.messages.logic.partitions import (
+    add_months,
+    count_default_messages,
+    create_partition,
+    detach_partition,
+    expired_partitions,
+    get_partitions,
+    is_partitioned,
+    month_start,
+    partition_month,
+    partition_name,
+)
 from apps.messages.logic.serialiazers import MessageSerializer
-from apps.messages.models import Message
+from apps.messages.models import Conversation, Message
+from apps.users.logic.serializers import UserSerializer
 from apps.users.models import User
 
 
@@ -95,3 +133,1383 @@ class MessagesTestCase(APITestCase):
 
         self.assertEqual(res.status_code, HTTP_400_BAD_REQUEST)
         self.assertDictEqual(res.data, expected)
+
+    def test_create_message_send_to_self_without_queries(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        url = reverse(
+            "messages:messages-list", kwargs={"user_id": self.main_user.id}
+        )
+
+        with self.assertNumQueries(0):
+            self.client.post(url, {"content": "Hello World!"})
+
+    def test_create_message_with_inactive_user(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+        self.target_user.is_active = False
+        self.target_user.save()
+
+        url = reverse(
+            "messages:messages-list", kwargs={"user_id": self.target_user.id}
+        )
+        res = self.client.post(url, {"content": "Hello World!"})
+
+        self.assertEqual(res.status_code, HTTP_404_NOT_FOUND)
+        self.assertFalse(Message.objects.exists())
+
+    def test_create_message_with_invalid_user_id(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        res = self.client.post(
+            "/channels/user/messages", {"content": "Hello World!"}
+        )
+
+        self.assertEqual(res.status_code, HTTP_404_NOT_FOUND)
+
+    def test_create_message_with_too_large_user_id(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        for user_id in ("9" * 19, "9" * 20):
+            res = self.client.post(
+                f"/channels/{user_id}/messages", {"content": "Hello World!"}
+            )
+
+            self.assertEqual(res.status_code, HTTP_404_NOT_FOUND)
+
+    def test_create_message_does_not_load_recipient(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        url = reverse(
+            "messages:messages-list", kwargs={"user_id": self.target_user.id}
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url, {"content": "Hello World!"})
+
+        self.assertFalse(any("password" in query["sql"] for query in queries))
+
+
+class MessagesHistoryTestCase(APITestCase):
+    """Test case responsible to test the messages history endpoint."""
+
+    def setUp(self) -> None:
+        self.main_user = User.objects.create_user(
+            username="main_user",
+            email="main@email.com",
+            password="password",
+        )
+        self.target_user = User.objects.create_user(
+            username="target_user",
+            email="target@email.com",
+            password="password",
+        )
+        self.other_user = User.objects.create_user(
+            username="other_user",
+            email="other@email.com",
+            password="password",
+        )
+        self.messages = [
+            Message.objects.create(
+                sender=self.main_user,
+                recipient=self.target_user,
+                content="Hello!",
+            ),
+            Message.objects.create(
+                sender=self.target_user,
+                recipient=self.main_user,
+                content="Hi!",
+            ),
+            Message.objects.create(
+                sender=self.main_user,
+                recipient=self.target_user,
+                content="How are you?",
+            ),
+        ]
+        Message.objects.create(
+            sender=self.other_user,
+            recipient=self.main_user,
+            content="Hey!",
+        )
+
+        self.url = reverse(
+            "messages:messages-list", kwargs={"user_id": self.target_user.id}
+        )
+
+    def test_list_messages(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        res = self.client.get(self.url)
+        expected = {
+            "next": None,
+            "results": MessageSerializer(self.messages[::-1], many=True).data,
+        }
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertDictEqual(res.data, expected)
+
+    async def test_list_messages_with_asgi(self) -> None:
+        # The async client goes through the ASGI handler, where the view
+        # is awaited on the event loop instead of running in a thread.
+        res = await self.async_client.get(
+            self.url, AUTHORIZATION=f"Token {self.main_user.token}"
+        )
+        ids = [message["id"] for message in res.json()["results"]]
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertEqual(ids, [message.id for message in self.messages[::-1]])
+
+    def test_list_messages_with_cursor(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        res = self.client.get(self.url, {"limit": 2})
+        expected = MessageSerializer(self.messages[:0:-1], many=True)
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertEqual(res.data["results"], expected.data)
+
+        res = self.client.get(res.data["next"])
+        expected = MessageSerializer(self.messages[:1], many=True)
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertEqual(res.data["results"], expected.data)
+        self.assertIsNone(res.data["next"])
+
+    def test_list_messages_of_each_direction_separately(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.url, {"limit": 2})
+
+        sql = context.captured_queries[-1]["sql"]
+        # A page of each direction, then of their union.
+        limits = (
+            3
+            if connection.features.supports_slicing_ordering_in_compound
+            else 1
+        )
+
+        self.assertIn("UNION ALL", sql)
+        self.assertEqual(sql.count("LIMIT"), limits)
+
+    def test_list_messages_with_invalid_cursor(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        res = self.client.get(self.url, {"cursor": "invalid"})
+        expected = {
+            "status": HTTP_404_NOT_FOUND,
+            "errors": {"detail": "Invalid cursor"},
+        }
+
+        self.assertEqual(res.status_code, HTTP_404_NOT_FOUND)
+        self.assertDictEqual(res.data, expected)
+
+    def test_list_messages_with_too_large_cursor(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        for values in ([2**63, 1], ["2023-01-01T00:00:00+00:00", 2**63]):
+            cursor = urlsafe_b64encode(json.dumps(values).encode()).decode()
+            res = self.client.get(self.url, {"cursor": cursor})
+
+            self.assertEqual(res.status_code, HTTP_404_NOT_FOUND)
+            self.assertEqual(res.data["errors"], {"detail": "Invalid cursor"})
+
+    def test_list_messages_with_invalid_user(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        url = reverse("messages:messages-list", kwargs={"user_id": 4})
+
+        res = self.client.get(url)
+        expected = {
+            "status": HTTP_404_NOT_FOUND,
+            "errors": {"detail": "User not found"},
+        }
+
+        self.assertEqual(res.status_code, HTTP_404_NOT_FOUND)
+        self.assertDictEqual(res.data, expected)
+
+    def test_list_messages_without_authentication(self) -> None:
+        res = self.client.get(self.url)
+        expected = {
+            "status": HTTP_401_UNAUTHORIZED,
+            "errors": {
+                "detail": "Authentication credentials were not provided"
+            },
+        }
+
+        self.assertEqual(res.status_code, HTTP_401_UNAUTHORIZED)
+        self.assertDictEqual(res.data, expected)
+
+
+class ExportMessagesTestCase(APITestCase):
+    """Test case responsible to test the export of the messages."""
+
+    def setUp(self) -> None:
+        self.main_user = User.objects.create_user(
+            username="main_user",
+            email="main@email.com",
+            password="password",
+        )
+        self.other_user = User.objects.create_user(
+            username="other_user",
+            email="other@email.com",
+            password="password",
+        )
+        self.third_user = User.objects.create_user(
+            username="third_user",
+            email="third@email.com",
+            password="password",
+        )
+        self.sent = [
+            Message.objects.create(
+                sender=self.main_user,
+                recipient=self.other_user,
+                content=f"Hello {index}!",
+            )
+            for index in range(3)
+        ]
+        self.received = Message.objects.create(
+            sender=self.other_user, recipient=self.main_user, content="Hi!"
+        )
+        Message.objects.create(
+            sender=self.other_user, recipient=self.third_user, content="Hey!"
+        )
+
+        self.url = reverse("messages:export-messages-list")
+
+    def read_export(self, content: bytes) -> list[dict[str, Any]]:
+        lines = content.decode().splitlines()
+        return [json.loads(line) for line in lines]
+
+    def test_export_messages(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        res = self.client.get(self.url)
+        documents = self.read_export(b"".join(res.streaming_content))
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        self.assertEqual(
+            [(doc["id"], doc["direction"]) for doc in documents],
+            [(message.id, "sent") for message in self.sent]
+            + [(self.received.id, "received")],
+        )
+        self.assertEqual(
+            documents[-1],
+            {
+                "id": self.received.id,
+                "direction": "received",
+                "peer": self.other_user.id,
+                "content": "Hi!",
+                "created_at": documents[-1]["created_at"],
+            },
+        )
+        self.assertEqual(
+            datetime.fromisoformat(documents[-1]["created_at"]),
+            self.received.created_at,
+        )
+
+    async def test_export_messages_with_asgi(self) -> None:
+        res = await self.async_client.get(
+            self.url, AUTHORIZATION=f"Token {self.main_user.token}"
+        )
+        # The test client doesn't stream the response from the thread of
+        # the request like the application does, see `core.handlers`.
+        response = cast(StreamingHttpResponse, res)
+        content = await sync_to_async(b"".join)(response.streaming_content)
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertEqual(len(self.read_export(content)), 4)
+
+    def test_export_messages_in_chunks(self) -> None:
+        lines = list(export_messages(self.main_user, chunk_size=2))
+
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(all(line.endswith(b"\n") for line in lines))
+
+    def test_export_messages_without_server_side_cursors(self) -> None:
+        options = connection.settings_dict
+
+        with patch.dict(options, {"DISABLE_SERVER_SIDE_CURSORS": True}):
+            with CaptureQueriesContext(connection) as queries:
+                lines = list(export_messages(self.main_user, chunk_size=2))
+
+        ids = [json.loads(line)["id"] for line in lines]
+
+        self.assertEqual(
+            ids, [message.id for message in self.sent] + [self.received.id]
+        )
+        # Two batches of sent messages, then one of received messages,
+        # each followed by an empty one.
+        self.assertEqual(len(queries), 5)
+
+    def test_export_messages_command(self) -> None:
+        with NamedTemporaryFile() as output:
+            call_command(
+                "export_messages", str(self.main_user.id), output=output
+            )
+            output.seek(0)
+            documents = self.read_export(output.read())
+
+        self.assertEqual(len(documents), 4)
+
+    def test_export_messages_command_with_unknown_user(self) -> None:
+        with self.assertRaises(CommandError):
+            call_command("export_messages", str(self.third_user.id + 1))
+
+    def test_export_messages_without_authentication(self) -> None:
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, HTTP_401_UNAUTHORIZED)
+
+
+class MessageSerializerTestCase(APITestCase):
+    """Test case responsible to test the serialization of messages."""
+
+    def setUp(self) -> None:
+        senders = [
+            User.objects.create_user(
+                username=f"sender{i}",
+                email=f"sender{i}@email.com",
+                password="password",
+            )
+            for i in range(20)
+        ]
+        recipient = User.objects.create_user(
+            username="recipient",
+            email="recipient@email.com",
+            password="password",
+        )
+        Message.objects.bulk_create(
+            Message(sender=senders[i % 20], recipient=recipient, content="Hi")
+            for i in range(500)
+        )
+
+    def test_serialize_messages_with_constant_queries(self) -> None:
+        to_representation = UserSerializer.to_representation
+
+        with patch.object(
+            UserSerializer,
+            "to_representation",
+            autospec=True,
+            side_effect=to_representation,
+        ) as mock:
+            with self.assertNumQueries(1):
+                queryset = Message.objects.with_senders()
+                data = MessageSerializer(queryset, many=True).data
+
+        self.assertEqual(len(data), 500)
+        self.assertEqual(mock.call_count, 20)
+
+
+class SearchMessagesTestCase(APITestCase):
+    """Test case responsible to test the messages search endpoint."""
+
+    def setUp(self) -> None:
+        self.main_user = User.objects.create_user(
+            username="main_user",
+            email="main@email.com",
+            password="password",
+        )
+        self.target_user = User.objects.create_user(
+            username="target_user",
+            email="target@email.com",
+            password="password",
+        )
+        self.other_user = User.objects.create_user(
+            username="other_user",
+            email="other@email.com",
+            password="password",
+        )
+        self.messages = [
+            Message.objects.create(
+                sender=self.main_user,
+                recipient=self.target_user,
+                content="Are we still meeting for lunch?",
+            ),
+            Message.objects.create(
+                sender=self.target_user,
+                recipient=self.main_user,
+                content="Yes, lunch at noon!",
+            ),
+            Message.objects.create(
+                sender=self.other_user,
+                recipient=self.main_user,
+                content="Lunch is on me tomorrow.",
+            ),
+        ]
+        # Messages between other users must never be found.
+        Message.objects.create(
+            sender=self.target_user,
+            recipient=self.other_user,
+            content="Lunch?",
+        )
+
+        self.url = reverse("messages:search-messages-list")
+
+    def test_search_messages(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        res = self.client.get(self.url, {"q": "lunch"})
+        expected = {
+            "next": None,
+            "results": MessageSerializer(self.messages[::-1], many=True).data,
+        }
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertDictEqual(res.data, expected)
+
+    def test_search_messages_with_every_term(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        res = self.client.get(self.url, {"q": "lunch noon"})
+        ids = [message["id"] for message in res.data["results"]]
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertEqual(ids, [self.messages[1].id])
+
+    def test_search_messages_with_cursor(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        res = self.client.get(self.url, {"q": "lunch", "limit": 2})
+        expected = MessageSerializer(self.messages[:0:-1], many=True)
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertEqual(res.data["results"], expected.data)
+
+        res = self.client.get(res.data["next"])
+        expected = MessageSerializer(self.messages[:1], many=True)
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertEqual(res.data["results"], expected.data)
+        self.assertIsNone(res.data["next"])
+
+    def test_search_messages_with_cursor_on_each_rank(self) -> None:
+        messages = [
+            Message.objects.create(
+                sender=self.target_user,
+                recipient=self.main_user,
+                content=" ".join(["dinner"] * count),
+            )
+            for count in range(1, 6)
+        ]
+        self.client.force_authenticate(user=self.main_user)
+
+        ids: list[int] = []
+        res = self.client.get(self.url, {"q": "dinner", "limit": 1})
+
+        # A cursor that doesn't move past its rank would repeat pages.
+        for _page in messages:
+            ids.extend(message["id"] for message in res.data["results"])
+
+            if res.data["next"] is not None:
+                res = self.client.get(res.data["next"])
+
+        self.assertIsNone(res.data["next"])
+        self.assertCountEqual(ids, [message.id for message in messages])
+
+    def test_search_messages_without_terms(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        res = self.client.get(self.url)
+        expected = {
+            "status": HTTP_400_BAD_REQUEST,
+            "errors": {"q": ["This field is required"]},
+        }
+
+        self.assertEqual(res.status_code, HTTP_400_BAD_REQUEST)
+        self.assertDictEqual(res.data, expected)
+
+    def test_search_messages_without_authentication(self) -> None:
+        res = self.client.get(self.url, {"q": "lunch"})
+
+        self.assertEqual(res.status_code, HTTP_401_UNAUTHORIZED)
+
+
+class BulkMessagesTestCase(APITestCase):
+    """Test case responsible to test the bulk messages endpoint."""
+
+    def setUp(self) -> None:
+        self.main_user = User.objects.create_user(
+            username="main_user",
+            email="main@email.com",
+            password="password",
+        )
+        self.recipients = [
+            User.objects.create_user(
+                username=f"recipient{i}",
+                email=f"recipient{i}@email.com",
+                password="password",
+            )
+            for i in range(10)
+        ]
+        self.url = reverse("messages:bulk-messages-list")
+
+    def test_send_bulk_messages(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        inactive = self.recipients[1]
+        inactive.is_active = False
+        inactive.save()
+
+        data = {
+            "messages": [
+                {"recipient": self.recipients[0].id, "content": "Hello!"},
+                {"recipient": inactive.id, "content": "Hello!"},
+                {"recipient": 1000, "content": "Hello!"},
+                {"recipient": self.main_user.id, "content": "Hello!"},
+                {"recipient": self.recipients[0].id},
+                {"recipient": self.recipients[2].id, "content": "Hi!"},
+            ]
+        }
+        res = self.client.post(self.url, data, format="json")
+
+        messages = Message.objects.order_by("id")
+        not_found = {"status": 404, "errors": {"detail": "User not found"}}
+        expected = {
+            "results": [
+                {
+                    "status": 201,
+                    "message": MessageSerializer(messages[0]).data,
+                },
+                not_found,
+                not_found,
+                {
+                    "status": 400,
+                    "errors": {
+                        "detail": "You cannot send a message to yourself"
+                    },
+                },
+                {
+                    "status": 400,
+                    "errors": {"content": ["This field is required"]},
+                },
+                {
+                    "status": 201,
+                    "message": MessageSerializer(messages[1]).data,
+                },
+            ]
+        }
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertDictEqual(res.data, expected)
+        self.assertEqual(len(messages), 2)
+
+    def test_publish_bulk_messages_at_once(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        data = {
+            "messages": [
+                {"recipient": recipient.id, "content": "Hello!"}
+                for recipient in self.recipients[:3]
+            ]
+        }
+
+        with patch.object(hub.backend, "publish_many") as publish_many:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(self.url, data, format="json")
+
+        events = list(publish_many.call_args.args[0])
+
+        publish_many.assert_called_once()
+        self.assertEqual(
+            [user_id for user_id, _payload in events],
+            [recipient.id for recipient in self.recipients[:3]],
+        )
+
+    def test_send_bulk_messages_records_conversations(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        recipient = self.recipients[0]
+        data = {
+            "messages": [
+                {"recipient": recipient.id, "content": "Hello!"},
+                {"recipient": recipient.id, "content": "Are you there?"},
+            ]
+        }
+        self.client.post(self.url, data, format="json")
+
+        last = Message.objects.latest("id")
+        conversation = Conversation.objects.get(
+            user=recipient, peer=self.main_user
+        )
+
+        self.assertEqual(conversation.last_message_id, last.id)
+        self.assertEqual(conversation.unread_count, 2)
+
+    def test_send_bulk_messages_with_constant_queries(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        data = {
+            "messages": [
+                {"recipient": recipient.id, "content": "Hello!"}
+                for recipient in self.recipients
+            ]
+        }
+
+        # One query fetches the recipients and one inserts the
+        # messages. The conversations are created, locked and updated
+        # with three more, inside of a savepoint.
+        with self.assertNumQueries(7):
+            res = self.client.post(self.url, data, format="json")
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertEqual(Message.objects.count(), 10)
+
+    def test_send_bulk_messages_counts_messages(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        name = "siege_messages_created_total"
+        created = REGISTRY.get_sample_value(name) or 0
+        data = {
+            "messages": [
+                {"recipient": recipient.id, "content": "Hello!"}
+                for recipient in self.recipients[:3]
+            ]
+        }
+        self.client.post(self.url, data, format="json")
+
+        self.assertEqual(REGISTRY.get_sample_value(name), created + 3)
+
+    def test_send_bulk_messages_with_too_large_recipient(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        data = {
+            "messages": [
+                {"recipient": 2**63, "content": "Hello!"},
+                {"recipient": self.recipients[0].id, "content": "Hello!"},
+            ]
+        }
+        res = self.client.post(self.url, data, format="json")
+        results = res.data["results"]
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertEqual(results[0]["status"], 400)
+        self.assertIn("recipient", results[0]["errors"])
+        self.assertEqual(results[1]["status"], 201)
+
+    def test_send_too_many_bulk_messages(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        message = {"recipient": self.recipients[0].id, "content": "Hello!"}
+        data = {"messages": [message] * 101}
+        res = self.client.post(self.url, data, format="json")
+
+        self.assertEqual(res.status_code, HTTP_400_BAD_REQUEST)
+        self.assertFalse(Message.objects.exists())
+
+    def test_send_bulk_messages_without_authentication(self) -> None:
+        res = self.client.post(self.url, {"messages": []}, format="json")
+
+        self.assertEqual(res.status_code, HTTP_401_UNAUTHORIZED)
+
+
+class ConversationsTestCase(APITestCase):
+    """Test case responsible to test the channels endpoints."""
+
+    def setUp(self) -> None:
+        self.main_user = User.objects.create_user(
+            username="main_user",
+            email="main@email.com",
+            password="password",
+        )
+        self.target_user = User.objects.create_user(
+            username="target_user",
+            email="target@email.com",
+            password="password",
+        )
+        self.other_user = User.objects.create_user(
+            username="other_user",
+            email="other@email.com",
+            password="password",
+        )
+        self.url = reverse("messages:channels-list")
+
+    def send_message(self, sender: User, recipient: User) -> Message:
+        self.client.force_authenticate(user=sender)
+
+        url = reverse(
+            "messages:messages-list", kwargs={"user_id": recipient.id}
+        )
+        res = self.client.post(url, {"content": "Hello World!"})
+
+        return Message.objects.get(id=res.data["id"])
+
+    def get_conversations(self) -> list[tuple[int, int, int | None, int]]:
+        conversations = Conversation.objects.order_by("user", "peer")
+        fields = ("user", "peer", "last_message", "unread_count")
+
+        return list(conversations.values_list(*fields))
+
+    def test_list_channels(self) -> None:
+        sent = self.send_message(self.main_user, self.target_user)
+        self.send_message(self.other_user, self.main_user)
+        received = self.send_message(self.other_user, self.main_user)
+
+        self.client.force_authenticate(user=self.main_user)
+
+        res = self.client.get(self.url)
+        expected = {
+            "next": None,
+            "results": [
+                {
+                    "peer": UserSerializer(self.other_user).data,
+                    "last_message": MessageSerializer(received).data,
+                    "unread_count": 2,
+                },
+                {
+                    "peer": UserSerializer(self.target_user).data,
+                    "last_message": MessageSerializer(sent).data,
+                    "unread_count": 0,
+                },
+            ],
+        }
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertDictEqual(res.data, expected)
+
+    def test_list_channels_with_cursor(self) -> None:
+        self.send_message(self.target_user, self.main_user)
+        self.send_message(self.other_user, self.main_user)
+
+        self.client.force_authenticate(user=self.main_user)
+
+        res = self.client.get(self.url, {"limit": 1})
+        peers = [channel["peer"]["id"] for channel in res.data["results"]]
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertEqual(peers, [self.other_user.id])
+
+        res = self.client.get(res.data["next"])
+        peers = [channel["peer"]["id"] for channel in res.data["results"]]
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertEqual(peers, [self.target_user.id])
+        self.assertIsNone(res.data["next"])
+
+    def test_list_channels_with_too_large_cursor(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        cursor = urlsafe_b64encode(json.dumps([2**63, 1]).encode()).decode()
+        res = self.client.get(self.url, {"cursor": cursor})
+
+        self.assertEqual(res.status_code, HTTP_404_NOT_FOUND)
+
+    def test_list_channels_with_constant_queries(self) -> None:
+        for user in (self.target_user, self.other_user):
+            self.send_message(user, self.main_user)
+
+        self.client.force_authenticate(user=self.main_user)
+
+        # The user and the token are not fetched when the client is
+        # forcibly authenticated, so only the page is read.
+        with self.assertNumQueries(1):
+            res = self.client.get(self.url)
+
+        self.assertEqual(len(res.data["results"]), 2)
+
+    def test_list_channels_without_authentication(self) -> None:
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, HTTP_401_UNAUTHORIZED)
+
+    def test_reply_marks_channel_as_read(self) -> None:
+        self.send_message(self.target_user, self.main_user)
+        self.send_message(self.target_user, self.main_user)
+        reply = self.send_message(self.main_user, self.target_user)
+
+        expected = [
+            (self.main_user.id, self.target_user.id, reply.id, 0),
+            (self.target_user.id, self.main_user.id, reply.id, 1),
+        ]
+
+        self.assertEqual(self.get_conversations(), expected)
+
+    def test_record_message_with_one_missing_conversation(self) -> None:
+        self.send_message(self.target_user, self.main_user)
+        Conversation.objects.filter(user=self.target_user).delete()
+
+        message = self.send_message(self.target_user, self.main_user)
+        expected = [
+            (self.main_user.id, self.target_user.id, message.id, 2),
+            (self.target_user.id, self.main_user.id, message.id, 0),
+        ]
+
+        self.assertEqual(self.get_conversations(), expected)
+
+    def test_record_messages_out_of_order(self) -> None:
+        self.send_message(self.target_user, self.main_user)
+
+        received = [
+            Message.objects.create(
+                sender=self.target_user,
+                recipient=self.main_user,
+                content="Hello",
+            )
+            for _n in range(2)
+        ]
+        record_message(received[1])
+        read_conversation(self.main_user.id, self.target_user.id)
+        record_message(received[0])
+
+        sent = [
+            Message.objects.create(
+                sender=self.main_user,
+                recipient=self.target_user,
+                content="Hello",
+            )
+            for _n in range(2)
+        ]
+        record_message(sent[1])
+        record_message(sent[0])
+
+        conversations = Conversation.objects.order_by("user", "peer")
+        fields = ("last_message", "last_read_message", "unread_count")
+        expected = [
+            (sent[1].id, sent[1].id, 0),
+            (sent[1].id, received[1].id, 2),
+        ]
+
+        self.assertEqual(list(conversations.values_list(*fields)), expected)
+
+    def test_ack_channel(self) -> None:
+        message = self.send_message(self.target_user, self.main_user)
+
+        self.client.force_authenticate(user=self.main_user)
+
+        url = reverse(
+            "messages:channels-ack", kwargs={"user_id": self.target_user.id}
+        )
+        res = self.client.post(url)
+        conversation = Conversation.objects.get(
+            user=self.main_user, peer=self.target_user
+        )
+
+        self.assertEqual(res.status_code, HTTP_204_NO_CONTENT)
+        self.assertEqual(conversation.unread_count, 0)
+        self.assertEqual(conversation.last_read_message_id, message.id)
+
+    def test_ack_unknown_channel(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        url = reverse(
+            "messages:channels-ack", kwargs={"user_id": self.target_user.id}
+        )
+        res = self.client.post(url)
+        expected = {
+            "status": HTTP_404_NOT_FOUND,
+            "errors": {"detail": "Channel not found"},
+        }
+
+        self.assertEqual(res.status_code, HTTP_404_NOT_FOUND)
+        self.assertDictEqual(res.data, expected)
+
+    def test_ack_channel_with_too_large_id(self) -> None:
+        self.client.force_authenticate(user=self.main_user)
+
+        for user_id in ("9" * 19, "9" * 20):
+            res = self.client.post(f"/channels/{user_id}/ack")
+
+            self.assertEqual(res.status_code, HTTP_404_NOT_FOUND)
+
+    def test_rebuild_conversations(self) -> None:
+        self.send_message(self.target_user, self.main_user)
+        self.send_message(self.main_user, self.target_user)
+        self.send_message(self.target_user, self.main_user)
+        self.send_message(self.other_user, self.main_user)
+        self.send_message(self.other_user, self.main_user)
+
+        expected = self.get_conversations()
+        Conversation.objects.update(last_message=None, unread_count=0)
+
+        call_command("rebuild_conversations", stdout=StringIO())
+
+        self.assertEqual(self.get_conversations(), expected)
+
+    def test_rebuild_conversations_of_sent_messages_only(self) -> None:
+        message = self.send_message(self.main_user, self.target_user)
+
+        self.client.post(
+            reverse(
+                "messages:channels-ack",
+                kwargs={"user_id": self.target_user.id},
+            )
+        )
+        call_command("rebuild_conversations", stdout=StringIO())
+
+        conversation = Conversation.objects.get(
+            user=self.main_user, peer=self.target_user
+        )
+
+        self.assertEqual(conversation.last_message_id, message.id)
+        self.assertEqual(conversation.last_read_message_id, message.id)
+
+    def test_rebuild_conversations_without_summaries(self) -> None:
+        messages = [
+            Message.objects.create(
+                sender=self.target_user,
+                recipient=self.main_user,
+                content="Hello!",
+            )
+            for _ in range(3)
+        ]
+
+        call_command("rebuild_conversations", stdout=StringIO())
+
+        expected = [
+            (self.main_user.id, self.target_user.id, messages[-1].id, 3),
+            (self.target_user.id, self.main_user.id, messages[-1].id, 0),
+        ]
+
+        self.assertEqual(self.get_conversations(), expected)
+
+
+class WebSocket:
+    """A WebSocket client of the gateway, which drives it through the
+    ASGI interface like a server would.
+    """
+
+    def __init__(self, token: str | None = None, max_size: int = 0) -> None:
+        headers = []
+
+        if token is not None:
+            headers.append((b"authorization", f"Token {token}".encode()))
+
+        self.scope = {
+            "type": "websocket",
+            "path": "/gateway",
+            "headers": headers,
+        }
+        self.received: asyncio.Queue[Mapping[str, Any]] = asyncio.Queue()
+        # A client that doesn't read its messages fast enough is
+        # simulated with a bounded queue.
+        self.sent: asyncio.Queue[Mapping[str, Any]] = asyncio.Queue(max_size)
+
+    async def connect(self) -> Mapping[str, Any]:
+        self.task = asyncio.create_task(
+            gateway(self.scope, self.received.get, self.sent.put)
+        )
+        await self.received.put({"type": "websocket.connect"})
+
+        return await self.receive()
+
+    async def receive(self) -> Mapping[str, Any]:
+        return await asyncio.wait_for(self.sent.get(), timeout=1)
+
+    async def disconnect(self) -> None:
+        await self.received.put({"type": "websocket.disconnect"})
+        await self.task
+
+
+class GatewayTestCase(APITestCase):
+    """Test case responsible to test the WebSocket gateway."""
+
+    def setUp(self) -> None:
+        self.main_user = User.objects.create_user(
+            username="main_user",
+            email="main@email.com",
+            password="password",
+        )
+        self.target_user = User.objects.create_user(
+            username="target_user",
+            email="target@email.com",
+            password="password",
+        )
+
+    def send_message(self, content: str) -> Any:
+        self.client.force_authenticate(user=self.main_user)
+
+        url = reverse(
+            "messages:messages-list", kwargs={"user_id": self.target_user.id}
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, {"content": content}).data
+
+    async def test_receive_message(self) -> None:
+        websocket = WebSocket(self.target_user.token)
+        accept = await websocket.connect()
+
+        self.assertEqual(accept, {"type": "websocket.accept"})
+
+        message = await sync_to_async(self.send_message)("Hello World!")
+        event = json.loads((await websocket.receive())["text"])
+
+        self.assertEqual(event["type"], "message.created")
+        self.assertEqual(event["channel_id"], self.main_user.id)
+        self.assertEqual(event["message"]["id"], message["id"])
+        self.assertEqual(event["message"]["content"], "Hello World!")
+
+        await websocket.disconnect()
+
+        self.assertDictEqual(hub.subscriptions, {})
+
+    async def test_connect_without_token(self) -> None:
+        websocket = WebSocket()
+        close = await websocket.connect()
+
+        self.assertEqual(close, {"type": "websocket.close", "code": 1008})
+
+    async def test_connect_with_invalid_token(self) -> None:
+        websocket = WebSocket("invalid")
+        close = await websocket.connect()
+
+        self.assertEqual(close, {"type": "websocket.close", "code": 1008})
+
+    async def test_drop_slow_connection(self) -> None:
+        fast = WebSocket(self.target_user.token)
+        slow = WebSocket(self.target_user.token, max_size=1)
+
+        with patch.object(hub, "queue_size", 1):
+            await fast.connect()
+            await slow.connect()
+
+        for i in range(5):
+            hub.publish(self.target_user.id, str(i))
+            await asyncio.sleep(0.01)
+
+        # The slow connection is closed once its queue is full, while
+        # the other connection still gets every event.
+        events = [(await fast.receive())["text"] for _ in range(5)]
+        self.assertEqual(events, ["0", "1", "2", "3", "4"])
+
+        events = [await slow.receive() for _ in range(3)]
+        self.assertEqual(events[-1], {"type": "websocket.close", "code": 1013})
+
+        await fast.disconnect()
+        await slow.disconnect()
+
+
+class RedisBackendTestCase(SimpleTestCase):
+    """Test case for the Redis backend of the hub."""
+
+    def setUp(self) -> None:
+        self.backend = RedisBackend(hub)
+
+    def test_publish_without_redis(self) -> None:
+        client = self.backend.client
+
+        with patch.object(
+            client, "publish", side_effect=RedisConnectionError
+        ), self.assertLogs("apps.messages.logic.hub", "WARNING"):
+            self.backend.publish(1, "event")
+
+    def test_publish_many_in_one_round_trip(self) -> None:
+        pipeline = Mock()
+
+        with patch.object(self.backend.client, "pipeline") as factory:
+            factory.return_value = pipeline
+            self.backend.publish_many([(1, "first"), (2, "second")])
+
+        self.assertEqual(pipeline.publish.call_count, 2)
+        pipeline.publish.assert_called_with("messages:hub:2", "second")
+        pipeline.execute.assert_called_once_with()
+
+    def test_publish_many_without_redis(self) -> None:
+        pipeline = Mock()
+        pipeline.execute.side_effect = RedisConnectionError
+
+        with patch.object(
+            self.backend.client, "pipeline", return_value=pipeline
+        ), self.assertLogs("apps.messages.logic.hub", "WARNING"):
+            self.backend.publish_many([(1, "event")])
+
+
+class PartitionsTestCase(SimpleTestCase):
+    """Test case for the monthly partitions of the messages table."""
+
+    def test_add_months(self) -> None:
+        month = datetime(2023, 11, 1, tzinfo=timezone.utc)
+
+        self.assertEqual(
+            add_months(month, 2), datetime(2024, 1, 1, tzinfo=timezone.utc)
+        )
+        self.assertEqual(
+            add_months(month, -11), datetime(2022, 12, 1, tzinfo=timezone.utc)
+        )
+
+    def test_month_start_is_in_utc(self) -> None:
+        moment = datetime(2023, 3, 1, 1, tzinfo=timezone(timedelta(hours=2)))
+
+        self.assertEqual(
+            month_start(moment), datetime(2023, 2, 1, tzinfo=timezone.utc)
+        )
+
+    def test_partition_names(self) -> None:
+        month = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+        self.assertEqual(partition_name(month), "messages_p2023_01")
+        self.assertEqual(partition_month("messages_p2023_01"), month)
+        self.assertIsNone(partition_month("messages_default"))
+        self.assertIsNone(partition_month("messages_pending"))
+
+    def test_expired_partitions(self) -> None:
+        names = [
+            "messages_default",
+            "messages_p2023_01",
+            "messages_p2023_02",
+            "messages_p2023_03",
+            "messages_p2023_04",
+        ]
+        now = datetime(2023, 3, 15, tzinfo=timezone.utc)
+
+        self.assertEqual(
+            expired_partitions(names, now, retain=2), ["messages_p2023_01"]
+        )
+        self.assertEqual(expired_partitions(names, now, retain=3), [])
+
+    def test_manage_partitions_without_partitioning(self) -> None:
+        stdout = StringIO()
+
+        with patch(
+            "apps.messages.management.commands.manage_partitions"
+            ".is_partitioned",
+            return_value=False,
+        ):
+            call_command("manage_partitions", "--retain", "1", stdout=stdout)
+
+        self.assertIn("isn't partitioned", stdout.getvalue())
+
+    def test_manage_partitions_keeps_current_month(self) -> None:
+        with self.assertRaises(CommandError):
+            call_command("manage_partitions", "--retain", "0")
+
+
+@skipUnless(
+    connection.vendor == "postgresql",
+    "Only PostgreSQL partitions the messages table.",
+)
+class PartitionedMessagesTestCase(TestCase):
+    """Test case for the partitions of the messages table, which only
+    exist on PostgreSQL.
+    """
+
+    def setUp(self) -> None:
+        self.month = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        self.sender = User.objects.create_user(
+            username="sender", email="sender@email.com", password="password"
+        )
+        self.recipient = User.objects.create_user(
+            username="recipient",
+            email="recipient@email.com",
+            password="password",
+        )
+        # These months are older than every partition, so their
+        # messages are in the default partition.
+        self.messages = [
+            self.create_message(add_months(self.month, offset))
+            for offset in (0, 0, 1)
+        ]
+
+    def create_message(self, created_at: datetime) -> Message:
+        message = Message.objects.create(
+            sender=self.sender, recipient=self.recipient, content="Hello"
+        )
+        Message.objects.filter(id=message.id).update(created_at=created_at)
+
+        return message
+
+    def get_partition_ids(self, name: str) -> list[int]:
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT id FROM {name} ORDER BY id")
+            return [message_id for (message_id,) in cursor.fetchall()]
+
+    def count_matches(self, terms: str) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM messages "
+                "WHERE search_vector @@ plainto_tsquery('simple', %s)",
+                [terms],
+            )
+            (count,) = cursor.fetchone()
+
+        return int(count)
+
+    def test_create_partition_moves_default_messages(self) -> None:
+        name = partition_name(self.month)
+
+        self.assertEqual(count_default_messages(), 3)
+        self.assertTrue(create_partition(self.month))
+
+        self.assertIn(name, get_partitions())
+        self.assertEqual(count_default_messages(), 1)
+        self.assertEqual(
+            self.get_partition_ids(name),
+            [message.id for message in self.messages[:2]],
+        )
+        self.assertEqual(self.count_matches("hello"), 3)
+        self.assertFalse(create_partition(self.month))
+
+    def test_manage_partitions_moves_default_messages(self) -> None:
+        stdout, stderr = StringIO(), StringIO()
+
+        call_command("manage_partitions", stdout=stdout, stderr=stderr)
+
+        self.assertIn("--move-default", stderr.getvalue())
+
+        call_command("manage_partitions", "--move-default", stdout=stdout)
+
+        self.assertIn("Created messages_p2020_01.", stdout.getvalue())
+        self.assertIn("Created messages_p2020_02.", stdout.getvalue())
+        self.assertEqual(count_default_messages(), 0)
+        self.assertEqual(Message.objects.count(), 3)
+
+    def test_detach_partition_clears_conversation_references(self) -> None:
+        create_partition(self.month)
+        conversation = Conversation.objects.create(
+            user=self.recipient,
+            peer=self.sender,
+            last_message=self.messages[1],
+            last_read_message=self.messages[0],
+        )
+        other = Conversation.objects.create(
+            user=self.sender,
+            peer=self.recipient,
+            last_message=self.messages[2],
+            last_read_message=self.messages[2],
+        )
+
+        detach_partition(partition_name(self.month), archive=True)
+        conversation.refresh_from_db()
+        other.refresh_from_db()
+
+        self.assertNotIn(partition_name(self.month), get_partitions())
+        self.assertEqual(
+            self.get_partition_ids("messages_archive.messages_p2020_01"),
+            [message.id for message in self.messages[:2]],
+        )
+        self.assertEqual(list(Message.objects.all()), [self.messages[2]])
+        self.assertIsNone(conversation.last_message_id)
+        self.assertIsNone(conversation.last_read_message_id)
+        self.assertEqual(other.last_message_id, self.messages[2].id)
+        self.assertEqual(other.last_read_message_id, self.messages[2].id)
+
+
+@skipUnless(
+    connection.vendor == "postgresql",
+    "Only PostgreSQL partitions the messages table.",
+)
+class PartitionMigrationTestCase(TransactionTestCase):
+    """Test case for the migration that partitions the messages table,
+    forwards and backwards, with messages and conversations.
+    """
+
+    def setUp(self) -> None:
+        self.executor = MigrationExecutor(connection)
+        self.addCleanup(
+            self.migrate, *self.executor.loader.graph.leaf_nodes("messages")
+        )
+
+        apps = self.migrate(("messages", "0005_message_search_vector"))
+        Message = apps.get_model("messages", "Message")
+        Conversation = apps.get_model("messages", "Conversation")
+
+        sender = User.objects.create_user(
+            username="sender", email="sender@email.com", password="password"
+        )
+        recipient = User.objects.create_user(
+            username="recipient",
+            email="recipient@email.com",
+            password="password",
+        )
+        month = month_start(datetime.now(timezone.utc))
+        self.ids = []
+
+        for offset in (-3, -3, -1, 0):
+            message = Message.objects.create(
+                sender_id=sender.id,
+                recipient_id=recipient.id,
+                content=f"Hello {offset}",
+                is_deleted=False,
+            )
+            Message.objects.filter(id=message.id).update(
+                created_at=add_months(month, offset)
+            )
+            self.ids.append(message.id)
+
+        Conversation.objects.create(
+            user_id=recipient.id,
+            peer_id=sender.id,
+            last_message_id=self.ids[-1],
+            last_read_message_id=self.ids[0],
+        )
+
+    def migrate(self, target: tuple[str, str]) -> Any:
+        self.executor.loader.build_graph()
+        self.executor.migrate([target])
+
+        return self.executor.loader.project_state([target]).apps
+
+    def fetch(self, sql: str) -> list[Any]:
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            rows: list[Any] = cursor.fetchall()
+
+        return rows
+
+    def assert_messages_kept(self) -> None:
+        self.assertEqual(
+            self.fetch("SELECT id FROM messages ORDER BY id"),
+            [(message_id,) for message_id in self.ids],
+        )
+        self.assertEqual(
+            self.fetch(
+                "SELECT count(*) FROM messages WHERE search_vector @@ "
+                "plainto_tsquery('simple', 'hello')"
+            ),
+            [(4,)],
+        )
+        self.assertEqual(
+            self.fetch(
+                "SELECT last_message_id, last_read_message_id "
+                "FROM conversations"
+            ),
+            [(self.ids[-1], self.ids[0])],
+        )
+        # The sequence goes on after the copied messages.
+        self.assertGreater(
+            self.fetch("SELECT nextval('messages_id_seq')")[0][0],
+            self.ids[-1],
+        )
+
+    def get_search_indexes(self) -> list[str]:
+        return [
+            table
+            for (table,) in self.fetch(
+                "SELECT tablename FROM pg_indexes WHERE indexdef "
+                "LIKE '%USING gin (search_vector)%' ORDER BY tablename"
+            )
+        ]
+
+    def test_partition_messages(self) -> None:
+        self.migrate(("messages", "0006_partition_messages"))
+        month = month_start(datetime.now(timezone.utc))
+        names = [
+            partition_name(add_months(month, offset))
+            for offset in range(-3, 4)
+        ]
+
+        self.assertTrue(is_partitioned())
+        self.assertEqual(get_partitions(), ["messages_default", *names])
+        self.assertEqual(count_default_messages(), 0)
+        self.assertEqual(
+            self.get_search_indexes(),
+            ["messages", "messages_default", *names],
+        )
+        self.assert_messages_kept()
+
+    def test_unpartition_messages(self) -> None:
+        self.migrate(("messages", "0006_partition_messages"))
+        self.migrate(("messages", "0005_message_search_vector"))
+
+        self.assertFalse(is_partitioned())
+        self.assertEqual(self.get_search_indexes(), ["messages"])
+        self.assert_messages_kept()
+        # The foreign keys of the conversations are back.
+        self.assertEqual(
+            self.fetch(
+                "SELECT count(*) FROM pg_constraint WHERE contype = 'f' "
+                "AND conrelid = 'conversations'::regclass "
+                "AND confrelid = 'messages'::regclass"
+            ),
+            [(2,)],
+        )
@@ -8,13 +8,29 @@ Siege. All rights reserved
 
 from rest_framework.routers import SimpleRouter
 
-from apps.messages.views import MessagesView
+from apps.messages.views import (
+    BulkMessagesView,
+    ConversationsView,
+    ExportMessagesView,
+    MessagesView,
+    SearchMessagesView,
+)
 
 app_name = "messages"
 
 router = SimpleRouter(trailing_slash=False)
 router.register(
-    r"channels/(?P<user_id>[^./]+)/messages", MessagesView, basename="messages"
+    r"channels/(?P<user_id>[0-9]{1,19})/messages",
+    MessagesView,
+    basename="messages",
+)
+router.register(r"channels", ConversationsView, basename="channels")
+router.register(r"messages/bulk", BulkMessagesView, basename="bulk-messages")
+router.register(
+    r"messages/search", SearchMessagesView, basename="search-messages"
+)
+router.register(
+    r"messages/export", ExportMessagesView, basename="export-messages"
 )
 
 urlpatterns = router.urls
@@ -8,36 +8,264 @@ Siege. All rights reserved
 
 from typing import TYPE_CHECKING, Any, cast
 
-from rest_framework.mixins import CreateModelMixin
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from django.utils.translation import gettext as _
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.mixins import CreateModelMixin, ListModelMixin
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
-from rest_framework.status import HTTP_201_CREATED
+from rest_framework.status import (
+    HTTP_200_OK,
+    HTTP_201_CREATED,
+    HTTP_204_NO_CONTENT,
+)
 from rest_framework.viewsets import GenericViewSet
 
-from apps.messages.logic.serialiazers import MessageSerializer
-from apps.messages.models import Message
+from apps.messages.logic.conversations import read_conversation
+from apps.messages.logic.export import export_messages
+from apps.messages.logic.search import message_search
+from apps.messages.logic.serialiazers import (
+    BulkMessageSerializer,
+    ConversationSerializer,
+    MessageSerializer,
+    SearchSerializer,
+)
+from apps.messages.models import Conversation, Message
+from apps.users.logic.utils import aget_user, parse_user_id
 from apps.users.models import User
+from core.instrumentation import timing
+from core.pagination import KeysetPagination
 from core.renderers import BaseJSONRenderer
+from core.routers import read_replica
+from core.throttling import (
+    BulkMessagesThrottle,
+    ExportThrottle,
+    MessagesThrottle,
+    UserThrottle,
+)
+from core.views import AsyncViewMixin
 
 if TYPE_CHECKING:
     MessageGenericViewSet = GenericViewSet[Message]
+    ConversationGenericViewSet = GenericViewSet[Conversation]
 else:
     MessageGenericViewSet = GenericViewSet
+    ConversationGenericViewSet = GenericViewSet
 
 
-class MessagesView(CreateModelMixin, MessageGenericViewSet):
-    """This view is responsible for creating messages."""
+class MessagesView(
+    AsyncViewMixin, CreateModelMixin, ListModelMixin, MessageGenericViewSet
+):
+    """This view is responsible for creating messages and for listing
+    the messages exchanged between the authenticated user and another
+    user, from the newest to the oldest one.
+    """
 
     permission_classes = [IsAuthenticated]
     renderer_classes = [BaseJSONRenderer]
     serializer_class = MessageSerializer
+    pagination_class = KeysetPagination
 
-    def create(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+    def get_throttles(self) -> list[Any]:
+        throttles = super().get_throttles()
+
+        if self.action == "create":
+            throttles.append(MessagesThrottle())
+
+        return throttles
+
+    async def list(  # type: ignore[override]
+        self, request: Request, *args: Any, **kwargs: Any
+    ) -> Response:
+        user = cast(User, request.user)
+        peer = await aget_user(parse_user_id(self.kwargs["user_id"]))
+
+        queryset = Message.objects.with_senders().between(user, peer)
+        paginator = cast(KeysetPagination, self.paginator)
+
+        # The history can lag behind a little, so it is read from the
+        # replica, if there is one.
+        with read_replica():
+            page = await paginator.apaginate_queryset(queryset, request, self)
+
+        serializer = self.get_serializer(page, many=True)
+        with timing("serialize"):
+            data = serializer.data
+
+        return self.get_paginated_response(data)
+
+    async def create(  # type: ignore[override]
+        self, request: Request, *args: Any, **kwargs: Any
+    ) -> Response:
         kwargs["sender"] = cast(User, request.user)
+        kwargs["user_id"] = parse_user_id(kwargs["user_id"])
 
         serializer = self.get_serializer(data=request.data, context=kwargs)
         serializer.is_valid(raise_exception=True)
 
-        self.perform_create(serializer)
-        return Response(serializer.data, status=HTTP_201_CREATED)
+        await sync_to_async(self.perform_create)(serializer)
+        with timing("serialize"):
+            data = serializer.data
+
+        return Response(data, status=HTTP_201_CREATED)
+
+
+class SearchPagination(KeysetPagination):
+    """Paginate search results from the best match to the worst one."""
+
+    cursor_fields = ("rank", "id")
+
+
+class SearchMessagesView(
+    AsyncViewMixin, ListModelMixin, MessageGenericViewSet
+):
+    """This view is responsible for searching the content of the
+    messages sent or received by the authenticated user, see
+    :mod:`apps.messages.logic.search`.
+    """
+
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [BaseJSONRenderer]
+    serializer_class = MessageSerializer
+    pagination_class = SearchPagination
+
+    async def list(  # type: ignore[override]
+        self, request: Request, *args: Any, **kwargs: Any
+    ) -> Response:
+        user = cast(User, request.user)
+
+        params = SearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        queryset = message_search.search(
+            Message.objects.involving(user).with_senders(),
+            params.validated_data["q"],
+        )
+        paginator = cast(KeysetPagination, self.paginator)
+        page = await paginator.apaginate_queryset(queryset, request, self)
+
+        serializer = self.get_serializer(page, many=True)
+        with timing("serialize"):
+            data = serializer.data
+
+        return self.get_paginated_response(data)
+
+
+class BulkMessagesView(
+    AsyncViewMixin, CreateModelMixin, MessageGenericViewSet
+):
+    """This view is responsible for sending many messages, to any
+    number of users, in a single request. This is meant for jobs that
+    send a lot of messages, like broadcasts and notifications.
+
+    The response has the result of each message, in the order of the
+    request: either the created message or the errors that prevented
+    it from being sent, each with its own status code.
+    """
+
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [BaseJSONRenderer]
+    serializer_class = BulkMessageSerializer
+    throttle_classes = [UserThrottle, BulkMessagesThrottle]
+
+    async def create(  # type: ignore[override]
+        self, request: Request, *args: Any, **kwargs: Any
+    ) -> Response:
+        context = {"sender": cast(User, request.user)}
+
+        serializer = self.get_serializer(data=request.data, context=context)
+        serializer.is_valid(raise_exception=True)
+
+        await sync_to_async(self.perform_create)(serializer)
+        with timing("serialize"):
+            data = serializer.data
+
+        return Response(data, status=HTTP_200_OK)
+
+
+class ExportMessagesView(AsyncViewMixin, MessageGenericViewSet):
+    """This view is responsible for exporting every message sent or
+    received by the authenticated user, as newline-delimited JSON, see
+    :func:`export_messages`.
+
+    The export is streamed as it is read from the database, so its size
+    doesn't matter to the memory of the server.
+    """
+
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [BaseJSONRenderer]
+    throttle_classes = [UserThrottle, ExportThrottle]
+
+    async def list(
+        self, request: Request, *args: Any, **kwargs: Any
+    ) -> StreamingHttpResponse:
+        user = cast(User, request.user)
+
+        response = StreamingHttpResponse(
+            export_messages(user), content_type="application/x-ndjson"
+        )
+        response[
+            "Content-Disposition"
+        ] = 'attachment; filename="messages.ndjson"'
+        return response
+
+
+class ConversationPagination(KeysetPagination):
+    """Paginate conversations from the most recently active one. Since
+    message IDs are increasing, the ID of the last message orders the
+    conversations like its creation date.
+    """
+
+    cursor_fields = ("last_message_id", "id")
+
+
+class ConversationsView(
+    AsyncViewMixin, ListModelMixin, ConversationGenericViewSet
+):
+    """This view is responsible for listing the conversations of the
+    authenticated user, known as channels, with their last message and
+    their number of unread messages. It is also used to mark a channel
+    as read.
+    """
+
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [BaseJSONRenderer]
+    serializer_class = ConversationSerializer
+    pagination_class = ConversationPagination
+    lookup_url_kwarg = "user_id"
+    lookup_value_regex = "[0-9]{1,19}"
+
+    async def list(  # type: ignore[override]
+        self, request: Request, *args: Any, **kwargs: Any
+    ) -> Response:
+        user = cast(User, request.user)
+
+        queryset = Conversation.objects.filter(
+            user=user, last_message__isnull=False
+        ).select_related("peer", "last_message__sender")
+        paginator = cast(KeysetPagination, self.paginator)
+        page = await paginator.apaginate_queryset(queryset, request, self)
+
+        serializer = self.get_serializer(page, many=True)
+        with timing("serialize"):
+            data = serializer.data
+
+        return self.get_paginated_response(data)
+
+    @action(detail=True, methods=["post"])  # type: ignore[type-var]
+    async def ack(  # type: ignore[misc]
+        self, request: Request, *args: Any, **kwargs: Any
+    ) -> Response:
+        """Mark every message of the channel with the given user as
+        read.
+        """
+        user = cast(User, request.user)
+        peer_id = parse_user_id(self.kwargs["user_id"])
+
+        if not await sync_to_async(read_conversation)(user.id, peer_id):
+            raise NotFound(_("Channel not found."))
+
+        return Response(status=HTTP_204_NO_CONTENT)
@@ -0,0 +1,138 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from threading import Lock
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+
+from apps.users.logic.serializers import UserSerializer
+from apps.users.logic.utils import get_user
+from apps.users.models import User
+from core.instrumentation import timing
+from core.metrics import user_cache_lookups
+
+
+class UserCache:
+    """A read-through cache of the representations of the users, as
+    returned by :class:`UserSerializer`, so that reading a profile
+    doesn't need to query the database nor to serialize the user again.
+
+    The representations are kept in one of the caches of Django, which
+    is the local memory of each process by default, or can be shared
+    between processes, see the `CACHES` setting. Entries of a user are
+    dropped whenever the user is saved or deleted, see
+    :mod:`apps.users.signals`, and expire after the timeout of the
+    cache otherwise. Users updated with `QuerySet.update` must be
+    invalidated by hand.
+
+    Parameters
+    ----------
+    alias: :class:`str`
+        The alias of the cache to use, in the `CACHES` setting.
+    """
+
+    def __init__(self, alias: str) -> None:
+        self.alias = alias
+        self.lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self) -> BaseCache:
+        """The cache that holds the representations."""
+        cache: BaseCache = caches[self.alias]
+        return cache
+
+    def key(self, user_id: int) -> str:
+        """Return the key of the representation of the given user."""
+        return f"users:{user_id}"
+
+    def get(self, user_id: int, user: User | None = None) -> dict[str, Any]:
+        """Return the representation of the given user, from the cache
+        if possible. Otherwise, the user is serialized and the result is
+        cached.
+
+        Parameters
+        ----------
+        user_id: :class:`int`
+            The ID of the user.
+        user: Optional[:class:`User`]
+            The user, if it is already loaded. Otherwise, it is fetched
+            from the database on a cache miss.
+
+        Returns
+        -------
+        :class:`dict`
+            The representation of the user.
+
+        Raises
+        ------
+        :class:`NotFound`
+            If the user does not exist.
+        """
+        key = self.key(user_id)
+        data: dict[str, Any] | None = self.cache.get(key)
+
+        self.count(hit=data is not None)
+
+        if data is not None:
+            return data
+
+        # The user is read from the default database, since a replica
+        # that lags behind would cache its former profile until it
+        # expires.
+        if user is None:
+            user = get_user(user_id, replica=False)
+
+        with timing("serialize"):
+            data = dict(UserSerializer(user).data)
+
+        self.cache.set(key, data)
+        return data
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop the cached representation of the given user."""
+        self.cache.delete(self.key(user_id))
+
+    def clear(self) -> None:
+        """Drop every entry of the cache and reset its counters."""
+        self.cache.clear()
+
+        with self.lock:
+            self.hits = self.misses = 0
+
+    def count(self, hit: bool) -> None:
+        """Count a lookup in the counters of the process and in the
+        metrics of the application.
+        """
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        user_cache_lookups.labels(outcome="hit" if hit else "miss").inc()
+
+    def stats(self) -> dict[str, float]:
+        """Return the counters of the cache in this process, with the
+        ratio of lookups that were served from the cache.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+user_cache = UserCache(settings.USERS_CACHE_ALIAS)
@@ -0,0 +1,257 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import random
+from collections import Counter, defaultdict
+from concurrent.futures import Executor
+from itertools import islice
+from typing import IO, Any, Iterable, Iterator
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from apps.users.models import TAG_PROBES, TAGS, User
+
+# A record to import, with its number in the file, from 1.
+Record = tuple[int, dict[str, Any]]
+
+# How many passwords are sent at once to a process of the pool.
+HASH_CHUNK_SIZE = 16
+
+# How many times a batch is inserted again when its tags or e-mail
+# addresses collide with users that signed up during the import.
+MAX_INSERT_ATTEMPTS = 3
+
+
+def read_records(file: IO[str], format: str) -> Iterator[Record]:
+    """Read the users to import from a CSV file with a header, or from
+    newline-delimited JSON, one record at a time.
+
+    Parameters
+    ----------
+    file: IO[:class:`str`]
+        The file to read.
+    format: :class:`str`
+        Either `csv` or `ndjson`.
+
+    Yields
+    ------
+    tuple[:class:`int`, :class:`dict`]
+        The number of each record and its fields, `username`, `email`
+        and `password`.
+    """
+    if format == "csv":
+        yield from enumerate(csv.DictReader(file), start=1)
+        return
+
+    lines = (line for line in file if line.strip())
+
+    for number, line in enumerate(lines, start=1):
+        try:
+            fields = json.loads(line)
+        except ValueError:
+            fields = None
+
+        # Records that aren't objects have none of the fields, so they
+        # are rejected like the ones that aren't JSON.
+        yield number, fields if isinstance(fields, dict) else {}
+
+
+def batched(records: Iterable[Record], size: int) -> Iterator[list[Record]]:
+    """Split the records into lists of the given size."""
+    iterator = iter(records)
+
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def clean_record(fields: dict[str, Any]) -> tuple[User, str | None]:
+    """Return the user described by the given fields of a record, and
+    its password. Users without a password get an unusable one.
+
+    Raises
+    ------
+    :class:`ValidationError`
+        If the fields are not valid, like the signup endpoint would
+        tell.
+    """
+    username = str(fields.get("username") or "")
+    email = User.objects.normalize_email(str(fields.get("email") or ""))
+
+    if not 2 <= len(username) <= 32:
+        raise ValidationError("Invalid username.")
+
+    if len(email) > 255:
+        raise ValidationError("Invalid e-mail address.")
+
+    validate_email(email)
+
+    return User(username=username, email=email), fields.get("password") or None
+
+
+def pick_tag(used_tags: set[int]) -> int | None:
+    """Pick a random tag that is not among the given ones, like
+    :meth:`UserManager.candidate_tags` does, or `None` if they are all
+    used.
+    """
+    for _probe in range(TAG_PROBES):
+        tag = random.choice(TAGS)
+
+        if tag not in used_tags:
+            return tag
+
+    available_tags = [tag for tag in TAGS if tag not in used_tags]
+
+    return random.choice(available_tags) if available_tags else None
+
+
+class UserImporter:
+    """Imports users in batches, which is much faster than signing them
+    up one by one with :meth:`UserManager.create_user`.
+
+    For each batch, the users that already exist, by e-mail address,
+    are skipped, so an interrupted import can simply be run again. The
+    passwords of the others are hashed in parallel on the given
+    executor, which should be a pool of processes since hashing holds
+    the GIL. Tags are then allocated with one query for all of the
+    usernames of the batch, and the users are inserted with a single
+    `bulk_create`.
+
+    Parameters
+    ----------
+    executor: :class:`Executor`
+        The executor that hashes the passwords.
+    """
+
+    def __init__(self, executor: Executor) -> None:
+        self.executor = executor
+        self.counts: Counter[str] = Counter()
+
+    def import_batch(self, records: list[Record]) -> list[tuple[int, str]]:
+        """Import a batch of records and update the counts of imported,
+        skipped, invalid and untagged users.
+
+        Parameters
+        ----------
+        records: list[tuple[:class:`int`, :class:`dict`]]
+            The records, with their numbers.
+
+        Returns
+        -------
+        list[tuple[:class:`int`, :class:`str`]]
+            The number of each record that was rejected, and why.
+        """
+        users, passwords, rejected = self.clean(records)
+
+        if not users:
+            return rejected
+
+        hashes = self.executor.map(
+            make_password, passwords, chunksize=HASH_CHUNK_SIZE
+        )
+
+        for user, password in zip(users, hashes):
+            user.password = password
+
+        self.insert(users)
+        return rejected
+
+    def clean(
+        self, records: list[Record]
+    ) -> tuple[list[User], list[str | None], list[tuple[int, str]]]:
+        """Return the new users of the records, with their passwords,
+        and the records that were rejected.
+        """
+        passwords: dict[str, str | None] = {}
+        users = []
+        rejected = []
+
+        for number, fields in records:
+            try:
+                user, password = clean_record(fields)
+            except ValidationError as exc:
+                rejected.append((number, exc.messages[0]))
+                continue
+
+            # The first record of an e-mail address wins.
+            if user.email not in passwords:
+                passwords[user.email] = password
+                users.append(user)
+
+        users = self.exclude_existing(users)
+
+        self.counts["invalid"] += len(rejected)
+        # Users that already exist, or repeated in the batch.
+        self.counts["skipped"] += len(records) - len(rejected) - len(users)
+
+        return users, [passwords[user.email] for user in users], rejected
+
+    def exclude_existing(self, users: list[User]) -> list[User]:
+        """Return the given users, except those whose e-mail address
+        is already used.
+        """
+        existing = set(
+            User.objects.filter(
+                email__in=[user.email for user in users]
+            ).values_list("email", flat=True)
+        )
+
+        return [user for user in users if user.email not in existing]
+
+    def insert(self, users: list[User]) -> None:
+        """Allocate the tags of the given users and insert them. If a
+        tag or an e-mail address was taken in the meantime, by a user
+        who signed up during the import, this is done again.
+        """
+        for attempt in range(1, MAX_INSERT_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    self.insert_with_tags(users)
+                return
+            except IntegrityError:
+                if attempt == MAX_INSERT_ATTEMPTS:
+                    raise
+
+            remaining = self.exclude_existing(users)
+            self.counts["skipped"] += len(users) - len(remaining)
+            users = remaining
+
+    def insert_with_tags(self, users: list[User]) -> None:
+        """Allocate the tags of the given users and insert them in a
+        single query. Users whose username has no tag left are left
+        out.
+        """
+        usernames = {user.username for user in users}
+        taken = User.objects.filter(username__in=usernames).values_list(
+            "username", "tag"
+        )
+        used_tags: defaultdict[str, set[int]] = defaultdict(set)
+
+        for username, used_tag in taken:
+            used_tags[username].add(used_tag)
+
+        tagged = []
+
+        for user in users:
+            tag = pick_tag(used_tags[user.username])
+
+            if tag is not None:
+                user.tag = tag
+                used_tags[user.username].add(tag)
+                tagged.append(user)
+
+        User.objects.bulk_create(tagged)
+
+        self.counts["imported"] += len(tagged)
+        self.counts["untagged"] += len(users) - len(tagged)
@@ -8,11 +8,20 @@ Siege. All rights reserved
 
 from typing import Any
 
+from django.conf import settings
 from django.utils.translation import gettext as _
-from rest_framework.serializers import CharField, EmailField, ModelSerializer
+from rest_framework.serializers import (
+    CharField,
+    EmailField,
+    IntegerField,
+    ListField,
+    ModelSerializer,
+    Serializer,
+)
 from rest_framework.validators import UniqueValidator
 
-from apps.users.models import User
+from apps.users.logic.utils import REPRESENTED_FIELDS
+from apps.users.models import MAX_USER_ID, User
 
 
 class SelfUserSerializer(ModelSerializer[User]):
@@ -74,7 +83,7 @@ class UserSerializer(ModelSerializer[User]):
         # List all of the fields that could possibly be included in a
         # request or response, including fields specified explicitly
         # above.
-        fields = ("id", "username", "tag", "created_at")
+        fields = REPRESENTED_FIELDS
         read_only_fields = fields
 
     def to_representation(self, instance: User) -> Any:
@@ -83,3 +92,26 @@ class UserSerializer(ModelSerializer[User]):
         # of 4 characters.
         representation["tag"] = str(instance.tag).zfill(4)
         return representation
+
+
+class UsersLookupSerializer(Serializer[dict[str, Any]]):
+    """This serializer is used to validate the IDs of the users fetched
+    at once by the users endpoint. They are given as a comma-separated
+    list in the `ids` query parameter, like `/users?ids=1,2,3`.
+    """
+
+    ids = ListField(
+        child=IntegerField(min_value=1, max_value=MAX_USER_ID),
+        min_length=1,
+        max_length=settings.USERS_LOOKUP_MAX_SIZE,
+    )
+
+    def to_internal_value(self, data: Any) -> dict[str, Any]:
+        if isinstance(data.get("ids"), str):
+            data = {"ids": data["ids"].split(",")}
+
+        validated_data: dict[str, Any] = super().to_internal_value(data)
+        # Users requested more than once are only returned once.
+        validated_data["ids"] = list(dict.fromkeys(validated_data["ids"]))
+
+        return validated_data
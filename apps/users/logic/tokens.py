@@ -0,0 +1,131 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from threading import Lock
+from typing import Any, cast
+
+from django.conf import settings
+from itsdangerous import Signer, URLSafeSerializer
+from itsdangerous.encoding import want_bytes
+
+SALT = "auth"
+
+
+class PrecomputedSigner(Signer):
+    """A signer that derives the keys of all of its secrets once, when
+    it is created, instead of deriving them on every signature.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.derived_keys: dict[bytes, bytes] = {}
+
+        for key in self.secret_keys:
+            self.derived_keys[key] = super().derive_key(key)
+
+    def derive_key(self, secret_key: str | bytes | None = None) -> bytes:
+        if secret_key is None:
+            secret_key = self.secret_keys[-1]
+
+        key = want_bytes(secret_key)
+        derived_key = self.derived_keys.get(key)
+
+        if derived_key is None:
+            derived_key = super().derive_key(key)
+
+        return derived_key
+
+
+class TokenSerializer(URLSafeSerializer):
+    """A serializer that reuses a single signer, since signers hold no
+    state once created and can be shared between threads.
+    """
+
+    def __init__(self, secret_keys: list[str], salt: str) -> None:
+        super().__init__(secret_keys, salt=salt, signer=PrecomputedSigner)
+
+        self.shared_signer = super().make_signer()
+
+    def make_signer(self, salt: str | bytes | None = None) -> Signer:
+        if salt is None or want_bytes(salt) == self.salt:
+            return self.shared_signer
+
+        return super().make_signer(salt)
+
+
+lock = Lock()
+current: tuple[tuple[str, ...], TokenSerializer] | None = None
+
+
+def get_serializer() -> TokenSerializer:
+    """Return the serializer used to sign and verify tokens. It is only
+    rebuilt when `SECRET_KEY` or `SECRET_KEY_FALLBACKS` change.
+
+    Tokens are signed with `SECRET_KEY` and are verified against it and
+    then against every key of `SECRET_KEY_FALLBACKS`. To rotate the
+    secret without invalidating the existing tokens, move the current
+    key to the beginning of `SECRET_KEY_FALLBACKS` and set a new one.
+
+    Returns
+    -------
+    :class:`TokenSerializer`
+        The serializer for the current secret keys.
+    """
+    global current
+
+    # itsdangerous expects the keys from the oldest to the newest one.
+    keys = (*reversed(settings.SECRET_KEY_FALLBACKS), settings.SECRET_KEY)
+    state = current
+
+    if state is None or state[0] != keys:
+        with lock:
+            if current is None or current[0] != keys:
+                current = (keys, TokenSerializer(list(keys), salt=SALT))
+
+            state = current
+
+    return state[1]
+
+
+def make_token(user_id: int) -> str:
+    """Return a token that authenticates the user with the given ID.
+
+    Parameters
+    ----------
+    user_id: :class:`int`
+        The ID of the user.
+
+    Returns
+    -------
+    :class:`str`
+        The signed token.
+    """
+    return cast(str, get_serializer().dumps(user_id))
+
+
+def load_token(token: str) -> int:
+    """Verify the given token and return the ID of the user it belongs
+    to.
+
+    Parameters
+    ----------
+    token: :class:`str`
+        The token to verify.
+
+    Returns
+    -------
+    :class:`int`
+        The ID of the user.
+
+    Raises
+    ------
+    :class:`itsdangerous.BadSignature`
+        If the token was not signed by any of our secret keys.
+    """
+    return cast(int, get_serializer().loads(token))
@@ -6,20 +6,49 @@ Siege. All rights reserved
 :author: Siege Team
 """
 
+from contextlib import nullcontext
+
 from django.utils.translation import gettext as _
 from rest_framework.exceptions import NotFound
 
-from apps.users.models import User
+from apps.users.models import MAX_USER_ID, User
+from core.routers import read_replica
+
+# The fields of the users that are represented by `UserSerializer`.
+REPRESENTED_FIELDS = ("id", "username", "tag", "created_at")
+
+
+def parse_user_id(value: str) -> int:
+    """Return the user ID in the given part of a URL, which only matches
+    numbers.
+
+    Raises
+    ------
+    :class:`NotFound`
+        If the ID is larger than any user ID, since it would overflow
+        when querying the database.
+    """
+    user_id = int(value)
+
+    if user_id > MAX_USER_ID:
+        raise NotFound(_("User not found."))
+
+    return user_id
 
 
-def get_user(user_id: int) -> User:
+def get_user(user_id: int, replica: bool = True) -> User:
     """Get an user by is ID. If the user does no exist raise a
-    :class:`NotFound` exception.
+    :class:`NotFound` exception. The user is read from the replica, if
+    there is one, unless told otherwise.
 
     Parameters
     ----------
     user_id: :class:`int`
         The ID of the user to get.
+    replica: :class:`bool`
+        Whether the user may be read from the replica. Users that are
+        kept for a while, like in a cache, should be read from the
+        default database, which has their latest changes.
 
     Returns
     -------
@@ -31,7 +60,66 @@ def get_user(user_id: int) -> User:
     :class:`NotFound`
         If the user does not exist.
     """
+    # Larger IDs would overflow when querying the database.
+    if user_id > MAX_USER_ID:
+        raise NotFound(_("User not found."))
+
     try:
-        return User.objects.get(id=user_id)
+        with read_replica() if replica else nullcontext():
+            return User.objects.get(id=user_id)
     except User.DoesNotExist as exc:
         raise NotFound(_("User not found.")) from exc
+
+
+async def aget_user(user_id: int) -> User:
+    """Asynchronous version of :func:`get_user`.
+
+    Parameters
+    ----------
+    user_id: :class:`int`
+        The ID of the user to get.
+
+    Returns
+    -------
+    :class:`User`
+        The user with the given ID.
+
+    Raises
+    ------
+    :class:`NotFound`
+        If the user does not exist.
+    """
+    try:
+        with read_replica():
+            return await User.objects.aget(id=user_id)
+    except User.DoesNotExist as exc:
+        raise NotFound(_("User not found.")) from exc
+
+
+async def aget_users(user_ids: list[int]) -> tuple[list[User], list[int]]:
+    """Get the active users with the given IDs, with a single query
+    that only loads the fields needed to represent them. The users are
+    read from the replica, if there is one.
+
+    Parameters
+    ----------
+    user_ids: list[:class:`int`]
+        The IDs of the users to get.
+
+    Returns
+    -------
+    tuple[list[:class:`User`], list[:class:`int`]]
+        The users found, in the order of the given IDs, and the IDs
+        that don't belong to an active user.
+    """
+    queryset = User.objects.filter(id__in=user_ids, is_active=True).only(
+        *REPRESENTED_FIELDS
+    )
+
+    with read_replica():
+        found = {user.id: user async for user in queryset}
+
+    users = [found[user_id] for user_id in user_ids if user_id in found]
+    missing = [user_id for user_id in user_ids if user_id not in found]
+
+    return users, missing
@@ -0,0 +1,169 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+import json
+import random
+from argparse import ArgumentParser
+from itertools import count
+from typing import Any
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.users.models import User
+from core.benchmarks import benchmark_database, environment, measure
+from core.hashing import hashing_pool
+
+# Seeded users share a small pool of usernames, so that the tag
+# allocator works against usernames that already have many tags in use,
+# like it would in production.
+USERNAMES = 1_000
+
+SEED_BATCH_SIZE = 10_000
+
+PASSWORD = "password"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the latency and the number of queries of the signup and "
+        "login paths against increasingly large users tables. The report "
+        "is written as JSON so that it can be diffed between commits."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[10_000, 100_000, 1_000_000],
+            help="Number of users in the table for each run.",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=200,
+            help="Number of calls measured per operation and size.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed for the random generator, for reproducible runs.",
+        )
+        parser.add_argument(
+            "--output",
+            help="Write the report to this file instead of stdout.",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the benchmark database between runs.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        random.seed(options["seed"])
+
+        with benchmark_database(keepdb=options["keepdb"]):
+            report = {
+                "benchmark": "signup",
+                "environment": environment(),
+                "results": self.run(options["sizes"], options["iterations"]),
+                "hashing_pool": hashing_pool.stats(),
+            }
+
+        output = json.dumps(report, indent=2)
+
+        if options["output"] is None:
+            self.stdout.write(output)
+            return
+
+        with open(options["output"], "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+
+    def run(self, sizes: list[int], iterations: int) -> list[dict[str, Any]]:
+        """Seed the users table up to each size and measure every
+        operation against it.
+        """
+        client = APIClient()
+        emails = count()
+        results = []
+
+        for size in sorted(sizes):
+            seed_users(size)
+            login = {
+                "email": f"login{size}@benchmark.local",
+                "password": PASSWORD,
+            }
+            User.objects.create_user(username="login", **login)
+
+            operations = {
+                "create_user": lambda: User.objects.create_user(
+                    **signup_payload(next(emails))
+                ),
+                "SelfUserView.create": lambda: client.post(
+                    reverse("users:self-list"), signup_payload(next(emails))
+                ),
+                "LoginView": lambda: client.post(
+                    reverse("authentication:login"), login
+                ),
+            }
+
+            for name, operation in operations.items():
+                result = measure(operation, iterations)
+                results.append({"operation": name, "users": size, **result})
+                self.stderr.write(f"{name} with {size} users: {result}")
+
+                if result["failures"]:
+                    self.stderr.write(
+                        self.style.WARNING(
+                            f"{result['failures']} calls to {name} failed."
+                        )
+                    )
+
+        return results
+
+
+def signup_payload(number: int) -> dict[str, str]:
+    """Return the data of a new user whose username is taken from the
+    seeded pool.
+    """
+    return {
+        "username": f"user{random.randrange(USERNAMES)}",
+        "email": f"signup{number}@benchmark.local",
+        "password": PASSWORD,
+    }
+
+
+def seed_users(size: int) -> None:
+    """Insert users in batches until the table has `size` rows. Hashing
+    a password per seeded user would dominate the seeding time, so all
+    of them share an unusable password.
+
+    The users that signed up during a previous run took random tags, so
+    some seeded users collide with them and are skipped. Batches are
+    inserted until the table is full anyway.
+    """
+    password = make_password(None)
+    start = User.objects.count()
+
+    while (missing := size - User.objects.count()) > 0:
+        stop = start + min(missing, SEED_BATCH_SIZE)
+        users = (
+            User(
+                username=f"user{number % USERNAMES}",
+                email=f"user{number}@benchmark.local",
+                tag=number // USERNAMES + 1,
+                password=password,
+            )
+            for number in range(start, stop)
+        )
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        start = stop
@@ -0,0 +1,130 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from itertools import islice
+from time import perf_counter
+from typing import IO, Any, Iterable
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.users.logic.imports import (
+    Record,
+    UserImporter,
+    batched,
+    read_records,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import users from a CSV file, with a header, or from "
+        "newline-delimited JSON. Each record has a `username`, an "
+        "`email` and a `password`. Users whose e-mail address is "
+        "already used are skipped, so an interrupted import can be run "
+        "again."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "path", help="File to import, or `-` for the standard input."
+        )
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            help="Format of the file, guessed from its extension if not "
+            "given.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1_000,
+            help="Number of users inserted per query.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of processes hashing passwords.",
+        )
+        parser.add_argument(
+            "--start",
+            type=int,
+            default=0,
+            help="Number of records to skip, to resume an import from "
+            "the last reported record without reading the database.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        path = options["path"]
+        format = options["format"] or self.guess_format(path)
+
+        with ExitStack() as stack:
+            file: IO[str] = (
+                sys.stdin
+                if path == "-"
+                else stack.enter_context(open(path, encoding="utf-8"))
+            )
+            executor = stack.enter_context(
+                ProcessPoolExecutor(
+                    options["workers"], initializer=django.setup
+                )
+            )
+
+            records = islice(
+                read_records(file, format), options["start"], None
+            )
+            self.run(UserImporter(executor), records, options["batch_size"])
+
+    def guess_format(self, path: str) -> str:
+        """Return the format of the file at the given path."""
+        extension = os.path.splitext(path)[1].lower()
+
+        if extension in (".json", ".jsonl", ".ndjson"):
+            return "ndjson"
+
+        if extension == ".csv":
+            return "csv"
+
+        raise CommandError("Unknown format, use --format.")
+
+    def run(
+        self, importer: UserImporter, records: Iterable[Record], size: int
+    ) -> None:
+        """Import the records in batches, reporting the progress after
+        each one.
+        """
+        start = perf_counter()
+        number = 0
+
+        for batch in batched(records, size):
+            for rejected, reason in importer.import_batch(batch):
+                self.stderr.write(f"Record {rejected}: {reason}")
+
+            number = batch[-1][0]
+            self.report(importer, number, perf_counter() - start)
+
+        self.stdout.write(f"Done, {number} records were read.")
+
+    def report(
+        self, importer: UserImporter, number: int, duration: float
+    ) -> None:
+        """Report the progress of the import."""
+        counts = importer.counts
+        rate = counts["imported"] / duration if duration else 0
+
+        self.stdout.write(
+            f"Record {number}: {counts['imported']} imported, "
+            f"{counts['skipped']} skipped, {counts['invalid']} invalid, "
+            f"{counts['untagged']} without tags ({rate:.0f} users/s)"
+        )
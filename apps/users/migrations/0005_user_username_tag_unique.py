@@ -0,0 +1,18 @@
+# Generated by Django 4.1.7 on 2026-10-18 10:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0004_alter_user_table"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="user",
+            constraint=models.UniqueConstraint(
+                fields=("username", "tag"), name="users_username_tag_unique"
+            ),
+        ),
+    ]
@@ -9,25 +9,41 @@ Siege. All rights reserved
 from __future__ import annotations
 
 import random
+from collections.abc import Iterator
 
-from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
+from django.db import IntegrityError, router, transaction
 from django.db.models import (
     BooleanField,
     CharField,
     EmailField,
     SmallIntegerField,
+    UniqueConstraint,
 )
 from django.utils.translation import gettext as _
-from itsdangerous import URLSafeSerializer
 from rest_framework.exceptions import ValidationError
 
+from apps.users.logic.tokens import make_token
+from core.hashing import run_hash
+from core.metrics import tag_allocation_retries
 from core.models import TimestampedModel
 
+# The largest ID of a user, since IDs are stored as a `bigint`.
+MAX_USER_ID = 2**63 - 1
+
+# Every user gets a tag between 1 and 9999, unique per username.
+TAGS = range(1, 10_000)
+
+# How many random tags we try to insert before falling back to a full
+# scan of the tags already used by the username. Most usernames have
+# only a handful of users, so the first probe almost always succeeds.
+TAG_PROBES = 8
+
 
 class UserManager(BaseUserManager["User"]):
     """Django requires that custom users define their own manager class.
@@ -56,21 +72,90 @@ class UserManager(BaseUserManager["User"]):
         :class:`User`
             A new user object with the provided data.
         """
-        used_tags = self.values_list("tag", flat=True)
-        available_tags = [x for x in range(1, 10_000) if x not in used_tags]
+        email = self.normalize_email(email)
+
+        user = self.model(username=username, email=email)
+        user.set_password(password)
+
+        for tag in self.candidate_tags(username):
+            user.tag = tag
+
+            if self.insert_with_tag(user):
+                return user
+
+            tag_allocation_retries.inc()
 
         # If there are no available tags, raise an error.
-        if not available_tags:
-            raise ValidationError({"username": [_("No available tags.")]})
+        raise ValidationError({"username": [_("No available tags.")]})
 
-        tag = random.choice(available_tags)
-        email = self.normalize_email(email)
+    def candidate_tags(self, username: str) -> Iterator[int]:
+        """Yield the tags we should try to give to a new user with the
+        given username, in order.
 
-        user = self.model(username=username, email=email, tag=tag)
-        user.set_password(password)
-        user.save()
+        The first few candidates are random probes, which allocate a tag
+        in constant expected time without reading the table. If all of
+        them collide, we read the tags already used by this username
+        (an index range scan over `(username, tag)`) and yield the free
+        ones in random order.
+
+        Parameters
+        ----------
+        username: :class:`str`
+            The username of the user.
+
+        Yields
+        ------
+        :class:`int`
+            A tag that may be available for the username.
+        """
+        for _probe in range(TAG_PROBES):
+            yield random.choice(TAGS)
+
+        used_tags = set(
+            self.filter(username=username).values_list("tag", flat=True)
+        )
+        available_tags = [tag for tag in TAGS if tag not in used_tags]
+        random.shuffle(available_tags)
+
+        yield from available_tags
 
-        return user
+    def insert_with_tag(self, user: User) -> bool:
+        """Try to insert the given user with its current tag.
+
+        The insert runs in its own savepoint so that a collision on the
+        `(username, tag)` unique constraint, either with an existing
+        user or with a concurrent signup, does not break the outer
+        transaction.
+
+        Parameters
+        ----------
+        user: :class:`User`
+            The unsaved user to insert.
+
+        Returns
+        -------
+        :class:`bool`
+            Whether the user was inserted. `False` means the tag is
+            already taken and another one should be tried.
+        """
+        # Unlike `self.db`, which is where the manager reads from and
+        # may be a replica, this is where the user must be written.
+        using = self._db or router.db_for_write(self.model)
+
+        try:
+            with transaction.atomic(using=using):
+                user.save(using=using)
+        except IntegrityError:
+            taken = self.filter(username=user.username, tag=user.tag)
+
+            # Not a tag collision (e.g. a duplicated e-mail), so there
+            # is nothing we can do about it here.
+            if not taken.exists():
+                raise
+
+            return False
+
+        return True
 
 
 class User(AbstractBaseUser, PermissionsMixin, TimestampedModel):
@@ -107,6 +192,36 @@ class User(AbstractBaseUser, PermissionsMixin, TimestampedModel):
 
     class Meta:
         db_table = "users"
+        constraints = [
+            UniqueConstraint(
+                fields=["username", "tag"], name="users_username_tag_unique"
+            ),
+        ]
+
+    def set_password(self, raw_password: str | None) -> None:
+        # Hashing is slow on purpose, so requests run it on a dedicated
+        # pool of threads, see `core.hashing.HashingPool`.
+        self.password = run_hash(make_password, raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password: str) -> bool:
+        outdated: list[str] = []
+        is_correct = run_hash(
+            check_password, raw_password, self.password, outdated.append
+        )
+
+        # If the password was hashed with outdated parameters, hash it
+        # again once the check is done. The setter passed to Django only
+        # records that the password is outdated, since hashing from it
+        # would wait on the pool from one of its own threads. The new
+        # hash goes through `run_hash` like any other, and the user is
+        # saved here rather than in a thread of the pool.
+        if outdated:
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=["password"])
+
+        return is_correct
 
     @property
     def token(self) -> str:
@@ -120,10 +235,4 @@ class User(AbstractBaseUser, PermissionsMixin, TimestampedModel):
         :class:`str`
             A unique token for the user.
         """
-        serializer = URLSafeSerializer(settings.SECRET_KEY, salt="auth")
-        token = serializer.dumps(self.id)
-
-        if isinstance(token, bytes):
-            token = token.decode("utf-8")
-
-        return token
+        return make_token(self.id)
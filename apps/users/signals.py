@@ -0,0 +1,31 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from functools import partial
+from typing import Any
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from apps.users.logic.cache import user_cache
+from apps.users.models import User
+
+
+def invalidate_user_representation(
+    sender: type[User], instance: User, **kwargs: Any
+) -> None:
+    """Drop the cached representation of a user when it changes. It is
+    dropped again once the transaction commits, in case a concurrent
+    request cached the previous version of the user in the meantime.
+    """
+    user_cache.invalidate(instance.id)
+    transaction.on_commit(partial(user_cache.invalidate, instance.id))
+
+
+post_save.connect(invalidate_user_representation, sender=User)
+post_delete.connect(invalidate_user_representation, sender=User)
@@ -6,18 +6,34 @@ Siege. All rights reserved
 :author: Siege Team
 """
 
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from tempfile import NamedTemporaryFile
 from typing import Any
-
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from itsdangerous import BadSignature
+from prometheus_client import REGISTRY
+from rest_framework.exceptions import ValidationError
 from rest_framework.reverse import reverse
 from rest_framework.status import (
+    HTTP_200_OK,
     HTTP_201_CREATED,
     HTTP_400_BAD_REQUEST,
     HTTP_401_UNAUTHORIZED,
+    HTTP_404_NOT_FOUND,
 )
 from rest_framework.test import APITestCase
 
+from apps.users.logic.cache import user_cache
+from apps.users.logic.imports import UserImporter, pick_tag
 from apps.users.logic.serializers import UserSerializer
-from apps.users.models import User
+from apps.users.logic.tokens import get_serializer, load_token, make_token
+from apps.users.models import MAX_USER_ID, TAGS, User
 
 
 class SelfUserTestCase(APITestCase):
@@ -232,6 +248,207 @@ class SelfUserTestCase(APITestCase):
         self.assertDictEqual(res.data, expected)
 
 
+class UserManagerTestCase(APITestCase):
+    """Test case for the tag allocation done by the users manager."""
+
+    def setUp(self) -> None:
+        self.example = {
+            "username": "user",
+            "email": "user@email.com",
+            "password": "password",
+        }
+
+        with patch("random.choice", return_value=1):
+            self.user = User.objects.create_user(**self.example)
+
+    def test_create_user_retries_on_tag_collision(self) -> None:
+        self.example["email"] = "other@email.com"
+
+        retries = REGISTRY.get_sample_value(
+            "siege_tag_allocation_retries_total"
+        )
+
+        with patch("random.choice", side_effect=[1, 2]):
+            user = User.objects.create_user(**self.example)
+
+        self.assertEqual(user.tag, 2)
+        self.assertEqual(
+            REGISTRY.get_sample_value("siege_tag_allocation_retries_total"),
+            (retries or 0) + 1,
+        )
+
+    def test_create_user_without_available_tags(self) -> None:
+        User.objects.bulk_create(
+            User(username="user", email=f"user{tag}@email.com", tag=tag)
+            for tag in TAGS
+            if tag != self.user.tag
+        )
+        self.example["email"] = "other@email.com"
+
+        with self.assertRaises(ValidationError) as context:
+            User.objects.create_user(**self.example)
+
+        self.assertEqual(
+            context.exception.detail,
+            {
+                "username": [
+                    "Too many users have this username, please try another"
+                ]
+            },
+        )
+        self.assertFalse(User.objects.filter(email="other@email.com").exists())
+
+    def test_create_user_with_same_tag_and_other_username(self) -> None:
+        self.example["email"] = "other@email.com"
+        self.example["username"] = "other"
+
+        with patch("random.choice", return_value=1):
+            user = User.objects.create_user(**self.example)
+
+        self.assertEqual(user.tag, 1)
+
+
+class ImportUsersTestCase(APITestCase):
+    """Test case for the bulk import of users."""
+
+    def setUp(self) -> None:
+        self.existing = User.objects.create_user(
+            username="alice", email="alice@email.com", password="password"
+        )
+
+    def write_file(self, content: str, suffix: str) -> str:
+        file = NamedTemporaryFile("w", suffix=suffix, delete=False)
+        self.addCleanup(os.remove, file.name)
+
+        with file:
+            file.write(content)
+
+        return file.name
+
+    def import_users(self, path: str, *args: str) -> str:
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            "import_users",
+            path,
+            "--workers",
+            "1",
+            *args,
+            stdout=stdout,
+            stderr=stderr,
+        )
+
+        return stdout.getvalue() + stderr.getvalue()
+
+    def test_import_users_from_csv(self) -> None:
+        path = self.write_file(
+            "username,email,password\n"
+            "alice,other.alice@email.com,password\n"
+            "bob,bob@email.com,password\n",
+            ".csv",
+        )
+
+        output = self.import_users(path)
+        alice = User.objects.get(email="other.alice@email.com")
+
+        self.assertIn("2 imported, 0 skipped, 0 invalid", output)
+        self.assertEqual(alice.username, "alice")
+        self.assertNotEqual(alice.tag, self.existing.tag)
+        self.assertTrue(alice.check_password("password"))
+        self.assertTrue(User.objects.filter(email="bob@email.com").exists())
+
+    def test_import_users_from_ndjson(self) -> None:
+        path = self.write_file(
+            '{"username": "bob", "email": "bob@email.com", "password": '
+            '"password"}\n'
+            '{"username": "alice", "email": "alice@email.com"}\n'
+            '{"username": "b", "email": "b@email.com"}\n'
+            "not json\n"
+            '{"username": "carol", "email": "carol@email.com"}\n'
+            '{"username": "carol", "email": "carol@email.com"}\n',
+            ".ndjson",
+        )
+
+        output = self.import_users(path, "--batch-size", "2")
+        carol = User.objects.get(email="carol@email.com")
+
+        self.assertIn("2 imported, 2 skipped, 2 invalid", output)
+        self.assertIn("Record 3: Invalid username.", output)
+        self.assertIn("Record 4: Invalid username.", output)
+        self.assertFalse(carol.has_usable_password())
+
+    def test_import_users_from_ndjson_values_other_than_objects(
+        self,
+    ) -> None:
+        path = self.write_file(
+            '[1, 2]\n"bob"\nnull\n{"username": "bob", "email": '
+            '"bob@email.com"}\n',
+            ".ndjson",
+        )
+
+        output = self.import_users(path)
+
+        self.assertIn("1 imported, 0 skipped, 3 invalid", output)
+
+        for number in range(1, 4):
+            self.assertIn(f"Record {number}: Invalid username.", output)
+
+    def test_resume_import(self) -> None:
+        path = self.write_file(
+            "username,email,password\n"
+            "bob,bob@email.com,password\n"
+            "carol,carol@email.com,password\n",
+            ".csv",
+        )
+
+        output = self.import_users(path, "--start", "1")
+
+        self.assertIn("Record 2: 1 imported", output)
+        self.assertFalse(User.objects.filter(username="bob").exists())
+
+    def test_import_users_with_unknown_format(self) -> None:
+        with self.assertRaises(CommandError):
+            self.import_users(self.write_file("", ".txt"))
+
+    def test_import_users_without_available_tags(self) -> None:
+        users = [
+            User(username="bob", email=f"bob{tag}@email.com", tag=tag)
+            for tag in TAGS
+        ]
+        User.objects.bulk_create(users)
+
+        with ThreadPoolExecutor(1) as executor:
+            importer = UserImporter(executor)
+            importer.import_batch(
+                [(1, {"username": "bob", "email": "bob@email.com"})]
+            )
+
+        self.assertEqual(importer.counts["untagged"], 1)
+        self.assertFalse(User.objects.filter(email="bob@email.com").exists())
+
+    def test_import_users_again_after_collision(self) -> None:
+        records = [(1, {"username": "alice", "email": "bob@email.com"})]
+        tags = [self.existing.tag, self.existing.tag + 1]
+
+        # The first tag is the one of the existing user, as if they had
+        # signed up after the tags were allocated.
+        with ThreadPoolExecutor(1) as executor, patch(
+            "apps.users.logic.imports.pick_tag", side_effect=tags
+        ):
+            importer = UserImporter(executor)
+            importer.import_batch(records)
+
+        user = User.objects.get(email="bob@email.com")
+
+        self.assertEqual(user.tag, self.existing.tag + 1)
+        self.assertEqual(importer.counts["imported"], 1)
+
+    def test_pick_tag(self) -> None:
+        used_tags = set(TAGS) - {42}
+
+        self.assertEqual(pick_tag(used_tags), 42)
+        self.assertIsNone(pick_tag(set(TAGS)))
+
+
 class UsersTestCase(APITestCase):
     """Test case for users retrieving endpoints."""
 
@@ -288,3 +505,242 @@ class UsersTestCase(APITestCase):
 
         self.assertEqual(res.status_code, HTTP_401_UNAUTHORIZED)
         self.assertDictEqual(res.data, expected)
+
+    def test_get_user_with_too_large_id(self) -> None:
+        self.client.force_authenticate(self.user)
+
+        for user_id in ("9" * 19, "9" * 20):
+            res = self.client.get(f"/users/{user_id}")
+
+            self.assertEqual(res.status_code, HTTP_404_NOT_FOUND)
+
+
+class UsersLookupTestCase(APITestCase):
+    """Test case for fetching many users at once."""
+
+    def setUp(self) -> None:
+        self.url = reverse("users:users-collection")
+        self.users = [
+            User.objects.create_user(
+                username=f"user{index}",
+                email=f"user{index}@email.com",
+                password="password",
+            )
+            for index in range(3)
+        ]
+        self.client.force_authenticate(self.users[0])
+
+    def lookup(self, ids: str) -> Any:
+        return self.client.get(self.url, {"ids": ids})
+
+    def test_get_users_in_request_order(self) -> None:
+        users = [self.users[2], self.users[0], self.users[1]]
+
+        with self.assertNumQueries(1):
+            res = self.lookup(",".join(str(user.id) for user in users))
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertEqual(
+            res.data["results"], UserSerializer(users, many=True).data
+        )
+        self.assertEqual(res.data["not_found"], [])
+
+    def test_get_users_reports_unknown_and_inactive_users(self) -> None:
+        self.users[1].is_active = False
+        self.users[1].save()
+
+        unknown = self.users[2].id + 1
+
+        res = self.lookup(f"{self.users[0].id},{unknown},{self.users[1].id}")
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertEqual(
+            res.data["results"], [UserSerializer(self.users[0]).data]
+        )
+        self.assertEqual(res.data["not_found"], [unknown, self.users[1].id])
+
+    def test_get_users_once(self) -> None:
+        user_id = self.users[0].id
+
+        res = self.lookup(f"{user_id},{user_id}")
+
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_get_users_without_ids(self) -> None:
+        res = self.client.get(self.url)
+        expected = {
+            "status": HTTP_400_BAD_REQUEST,
+            "errors": {"ids": ["This field is required"]},
+        }
+
+        self.assertEqual(res.status_code, HTTP_400_BAD_REQUEST)
+        self.assertDictEqual(res.data, expected)
+
+    def test_get_users_with_invalid_ids(self) -> None:
+        res = self.lookup("1,a")
+
+        self.assertEqual(res.status_code, HTTP_400_BAD_REQUEST)
+        self.assertIn(1, res.data["errors"]["ids"])
+
+    def test_get_users_with_too_large_ids(self) -> None:
+        res = self.lookup(f"{self.users[0].id},{MAX_USER_ID + 1}")
+
+        self.assertEqual(res.status_code, HTTP_400_BAD_REQUEST)
+        self.assertIn(1, res.data["errors"]["ids"])
+
+    @override_settings(USERS_LOOKUP_MAX_SIZE=2)
+    def test_get_too_many_users(self) -> None:
+        res = self.lookup(",".join(str(index) for index in range(1, 252)))
+
+        self.assertEqual(res.status_code, HTTP_400_BAD_REQUEST)
+
+    def test_get_users_without_authentication(self) -> None:
+        self.client = self.client_class()
+
+        res = self.lookup(str(self.users[0].id))
+
+        self.assertEqual(res.status_code, HTTP_401_UNAUTHORIZED)
+
+    def test_create_user_is_still_routed(self) -> None:
+        self.client = self.client_class()
+        example = {
+            "username": "user",
+            "email": "user@email.com",
+            "password": "password",
+        }
+
+        res = self.client.post(self.url, example)
+
+        self.assertEqual(res.status_code, HTTP_201_CREATED)
+
+    def test_create_user_with_full_middleware_profile(self) -> None:
+        self.client = self.client_class(enforce_csrf_checks=True)
+        example = {
+            "username": "user",
+            "email": "user@email.com",
+            "password": "password",
+        }
+
+        with override_settings(MIDDLEWARE=settings.FULL_MIDDLEWARE):
+            res = self.client.post(self.url, example)
+
+        self.assertEqual(res.status_code, HTTP_201_CREATED)
+
+
+class UserCacheTestCase(APITestCase):
+    """Test case for the cache of the users representations."""
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            username="user", email="user@email.com", password="password"
+        )
+        self.url = reverse("users:users-detail", kwargs={"pk": self.user.id})
+        self.client.force_authenticate(self.user)
+
+        user_cache.clear()
+
+    def test_get_user_from_cache(self) -> None:
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(self.url)
+
+        self.assertDictEqual(res.data, UserSerializer(self.user).data)
+        self.assertDictEqual(
+            user_cache.stats(), {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+        )
+
+    def test_get_self_from_cache(self) -> None:
+        url = reverse("users:users-detail", kwargs={"pk": "me"})
+
+        with self.assertNumQueries(0):
+            self.client.get(url)
+            res = self.client.get(self.url)
+
+        self.assertDictEqual(res.data, UserSerializer(self.user).data)
+        self.assertEqual(user_cache.stats()["hits"], 1)
+
+    def test_saving_user_invalidates_cache(self) -> None:
+        self.client.get(self.url)
+
+        self.user.username = "other"
+        self.user.save()
+
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.data["username"], "other")
+        self.assertEqual(user_cache.stats()["misses"], 2)
+
+    def test_get_unknown_user_is_not_cached(self) -> None:
+        url = reverse("users:users-detail", kwargs={"pk": 0})
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, HTTP_404_NOT_FOUND)
+        self.assertIsNone(user_cache.cache.get(user_cache.key(0)))
+
+    def test_get_user_with_invalid_id(self) -> None:
+        res = self.client.get(f"/users/{self.user.id}a")
+
+        self.assertEqual(res.status_code, HTTP_404_NOT_FOUND)
+
+    def test_lookups_are_counted(self) -> None:
+        def lookups(outcome: str) -> float:
+            return (
+                REGISTRY.get_sample_value(
+                    "siege_user_cache_lookups_total", {"outcome": outcome}
+                )
+                or 0
+            )
+
+        hits, misses = lookups("hit"), lookups("miss")
+
+        self.client.get(self.url)
+        self.client.get(self.url)
+
+        self.assertEqual(lookups("hit"), hits + 1)
+        self.assertEqual(lookups("miss"), misses + 1)
+
+    @override_settings(
+        CACHES={
+            "users": {
+                "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+            },
+        }
+    )
+    def test_get_user_with_other_backend(self) -> None:
+        self.client.get(self.url)
+        res = self.client.get(self.url)
+
+        self.assertDictEqual(res.data, UserSerializer(self.user).data)
+        self.assertDictEqual(
+            user_cache.stats(), {"hits": 0, "misses": 2, "hit_ratio": 0.0}
+        )
+
+
+class TokensTestCase(APITestCase):
+    """Test case for the tokens service."""
+
+    @override_settings(SECRET_KEY="secret", SECRET_KEY_FALLBACKS=[])
+    def test_load_token(self) -> None:
+        self.assertEqual(load_token(make_token(1)), 1)
+
+    @override_settings(SECRET_KEY="secret", SECRET_KEY_FALLBACKS=[])
+    def test_reuse_serializer(self) -> None:
+        self.assertIs(get_serializer(), get_serializer())
+
+    def test_load_token_signed_with_fallback_key(self) -> None:
+        with override_settings(SECRET_KEY="old", SECRET_KEY_FALLBACKS=[]):
+            token = make_token(1)
+
+        with override_settings(SECRET_KEY="new", SECRET_KEY_FALLBACKS=["old"]):
+            self.assertEqual(load_token(token), 1)
+            self.assertNotEqual(make_token(1), token)
+
+    def test_load_token_signed_with_removed_key(self) -> None:
+        with override_settings(SECRET_KEY="old", SECRET_KEY_FALLBACKS=[]):
+            token = make_token(1)
+
+        with override_settings(SECRET_KEY="new", SECRET_KEY_FALLBACKS=[]):
+            self.assertRaises(BadSignature, load_token, token)
@@ -6,9 +6,10 @@ Siege. All rights reserved
 :author: Siege Team
 """
 
+from django.urls import path
 from rest_framework.routers import SimpleRouter
 
-from apps.users.views import SelfUserView, UsersView
+from apps.users.views import SelfUserView, UsersView, users
 
 app_name = "users"
 
@@ -16,4 +17,9 @@ router = SimpleRouter(trailing_slash=False)
 router.register(r"users", SelfUserView, basename="self")
 router.register(r"users", UsersView, basename="users")
 
-urlpatterns = router.urls
+urlpatterns = [
+    # Both views are routed to `/users`, see `apps.users.views.users`.
+    # The stubs of Django don't know that views can be asynchronous.
+    path("users", users, name="users-collection"),  # type: ignore[arg-type]
+    *router.urls,
+]
@@ -6,19 +6,30 @@ Siege. All rights reserved
 :author: Siege Team
 """
 
+from functools import partial
 from typing import TYPE_CHECKING, Any
 
+from asgiref.sync import sync_to_async
+from django.http import HttpRequest, HttpResponseBase
 from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
-from rest_framework.status import HTTP_201_CREATED
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED
 from rest_framework.viewsets import GenericViewSet
 
-from apps.users.logic.serializers import SelfUserSerializer, UserSerializer
-from apps.users.logic.utils import get_user
+from apps.users.logic.cache import user_cache
+from apps.users.logic.serializers import (
+    SelfUserSerializer,
+    UserSerializer,
+    UsersLookupSerializer,
+)
+from apps.users.logic.utils import aget_users
 from apps.users.models import User
+from core.instrumentation import timing
 from core.renderers import BaseJSONRenderer
+from core.throttling import SignupThrottle
+from core.views import AsyncViewMixin
 
 if TYPE_CHECKING:
     UserGenericViewSet = GenericViewSet[User]
@@ -26,7 +37,7 @@ else:
     UserGenericViewSet = GenericViewSet
 
 
-class SelfUserView(CreateModelMixin, UserGenericViewSet):
+class SelfUserView(AsyncViewMixin, CreateModelMixin, UserGenericViewSet):
     """This view is responsible for creating users. Since this viewset
     is supposed to be used for creating users, the used serializer will
     only contain the fields that ar e required for creating a user, and
@@ -36,30 +47,106 @@ class SelfUserView(CreateModelMixin, UserGenericViewSet):
     permission_classes = [AllowAny]
     renderer_classes = [BaseJSONRenderer]
     serializer_class = SelfUserSerializer
+    throttle_classes = [SignupThrottle]
+
+    async def create(  # type: ignore[override]
+        self, request: Request, *args: Any, **kwargs: Any
+    ) -> Response:
+        serializer = self.get_serializer(data=request.data)
+
+        # Validating the e-mail queries the database and creating the
+        # user hashes its password, so both run in a worker thread to
+        # keep the event loop free.
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        await sync_to_async(self.perform_create)(serializer)
+
+        with timing("serialize"):
+            data = serializer.data
+
+        return Response(data, status=HTTP_201_CREATED)
 
 
-class UsersView(RetrieveModelMixin, UserGenericViewSet):
+class UsersView(AsyncViewMixin, RetrieveModelMixin, UserGenericViewSet):
     """This view is responsible for retrieving users. Since this viewset
     is supposed to be used for retrieving users, the used serializer
     will only contain the fields that are required for retrieving a
     user, and return the user schema. It is required to be authenticated
     to use this view.
+
+    Many users can also be fetched at once, with their IDs in the `ids`
+    query parameter, like `/users?ids=1,2,3`. The users are returned
+    in the order of the IDs, and the IDs that don't belong to an active
+    user are listed apart instead of failing the whole request.
     """
 
     permission_classes = [IsAuthenticated]
     renderer_classes = [BaseJSONRenderer]
     serializer_class = UserSerializer
     queryset = User.objects.all()
+    # Longer IDs can't be stored in a `bigint`, see `MAX_USER_ID`.
+    lookup_value_regex = "me|[0-9]{1,19}"
 
-    def retrieve(
+    async def retrieve(  # type: ignore[override]
         self, request: Request, *args: Any, **kwargs: Any
     ) -> Response:
         assert isinstance(request.user, User)
 
         pk = kwargs.pop("pk")
         # If the user is requesting their own data (/users/me), then
-        # we will return the data of the authenticated user.
-        target = request.user if pk == "me" else get_user(pk)
+        # we will return the data of the authenticated user, which is
+        # already loaded.
+        if pk == "me":
+            get = partial(user_cache.get, request.user.id, request.user)
+        else:
+            get = partial(user_cache.get, int(pk))
+
+        # Profiles are read from the users cache, which may query the
+        # database or a shared cache on a miss.
+        data = await sync_to_async(get)()
+
+        return Response(data, status=HTTP_201_CREATED)
+
+    async def list(
+        self, request: Request, *args: Any, **kwargs: Any
+    ) -> Response:
+        lookup = UsersLookupSerializer(data=request.query_params.dict())
+        lookup.is_valid(raise_exception=True)
+
+        users, missing = await aget_users(lookup.validated_data["ids"])
+
+        with timing("serialize"):
+            data = {
+                "results": self.serializer_class(users, many=True).data,
+                "not_found": missing,
+            }
+
+        return Response(data, status=HTTP_200_OK)
+
+
+create_user = SelfUserView.as_view({"post": "create"})
+list_users = UsersView.as_view({"get": "list"})
+
+
+async def users(
+    request: HttpRequest, *args: Any, **kwargs: Any
+) -> HttpResponseBase:
+    """Serve `/users`, which is used both to create a user and to fetch
+    many users at once. Each view only handles its own methods, but a
+    URL can only be routed to one view.
+
+    Like the views of Django REST Framework, it is exempt from the CSRF
+    middleware, which the authentication classes enforce instead.
+    """
+    view = list_users if request.method in ("GET", "HEAD") else create_user
+
+    # The views of `AsyncViewMixin` are coroutine functions, which the
+    # stubs of Django REST Framework don't know about.
+    response: HttpResponseBase = await view(  # type: ignore[misc]
+        request, *args, **kwargs
+    )
+    return response
+
 
-        serializer = self.serializer_class(target)
-        return Response(serializer.data, status=HTTP_201_CREATED)
+# `csrf_exempt` of Django 4.1 would wrap the coroutine in a synchronous
+# view, so the flag it sets is set directly.
+users.csrf_exempt = True  # type: ignore[attr-defined]
@@ -0,0 +1,168 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+import platform
+import subprocess
+from collections.abc import Callable, Container, Iterator
+from contextlib import contextmanager
+from statistics import fmean
+from time import perf_counter
+from typing import Any
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+
+def percentile(values: list[float], rank: float) -> float:
+    """Return the given percentile of the values using the nearest-rank
+    method, which is what most latency dashboards report.
+
+    Parameters
+    ----------
+    values: list[:class:`float`]
+        The measured values. They do not need to be sorted.
+    rank: :class:`float`
+        The percentile to compute, between 0 and 100.
+
+    Returns
+    -------
+    :class:`float`
+        The value at the given percentile.
+    """
+    ordered = sorted(values)
+    index = max(0, round(rank / 100 * len(ordered)) - 1)
+
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def measure(
+    func: Callable[[], Any],
+    iterations: int,
+    statuses: Container[int] = range(200, 300),
+) -> dict[str, float]:
+    """Call the given function a number of times and return its latency
+    distribution, the average number of SQL queries per call and how
+    many calls failed.
+
+    Parameters
+    ----------
+    func: Callable[[], Any]
+        The function to measure.
+    iterations: :class:`int`
+        How many times the function should be called.
+    statuses: Container[:class:`int`]
+        The expected statuses, when the function returns a response.
+        The calls that return another status count as failures, since
+        an error is usually much faster than the path being measured.
+
+    Returns
+    -------
+    dict[:class:`str`, :class:`float`]
+        The latency percentiles, in milliseconds, the number of
+        queries per call and the number of failed calls.
+    """
+    timings = []
+    queries = 0
+    failures = 0
+
+    for _iteration in range(iterations):
+        with CaptureQueriesContext(connection) as context:
+            start = perf_counter()
+            result = func()
+            timings.append((perf_counter() - start) * 1000)
+
+        queries += len(context.captured_queries)
+        status = getattr(result, "status_code", None)
+
+        if status is not None and status not in statuses:
+            failures += 1
+
+    return {
+        "iterations": iterations,
+        "failures": failures,
+        "mean_ms": round(fmean(timings), 3),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "queries_per_call": queries / iterations,
+    }
+
+
+def environment() -> dict[str, Any]:
+    """Describe where a benchmark ran, so that reports from different
+    commits and machines can be told apart when diffing them.
+
+    Returns
+    -------
+    dict[:class:`str`, Any]
+        The commit, interpreter, Django version and database vendor.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+    }
+
+
+@contextmanager
+def unthrottled() -> Iterator[None]:
+    """Give every throttle scope a limit that the enclosed block can't
+    reach. The benchmarks send far more requests from the same client
+    than the throttles allow, and the rejected requests would hide the
+    path being measured.
+    """
+    rates = {scope: "1000000/s" for scope in settings.THROTTLE_RATES}
+
+    with override_settings(THROTTLE_RATES=rates):
+        yield
+
+
+@contextmanager
+def benchmark_database(keepdb: bool = False) -> Iterator[None]:
+    """Run the enclosed block against a throwaway test database, in the
+    same way the test runner does, so benchmarks never touch real data.
+    The requests are not throttled inside the block.
+
+    Parameters
+    ----------
+    keepdb: :class:`bool`
+        Whether the test database should be kept after the benchmark,
+        which makes reruns against big tables much faster.
+    """
+    setup_test_environment(debug=False)
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb
+    )
+
+    try:
+        with unthrottled():
+            yield
+    finally:
+        connection.creation.destroy_test_db(
+            old_name, verbosity=0, keepdb=keepdb
+        )
+        teardown_test_environment()
@@ -8,13 +8,35 @@ Siege. All rights reserved
 
 from typing import Any, Mapping
 
+from django.utils.translation import gettext as _
 from rest_framework.exceptions import APIException
 from rest_framework.response import Response
-from rest_framework.views import exception_handler
+from rest_framework.status import HTTP_503_SERVICE_UNAVAILABLE
 
 from core.renderers import BaseJSONRenderer
 
 
+class ServiceUnavailable(APIException):
+    """Raised when the server is too busy to handle a request. The
+    response tells the client to retry after `wait` seconds.
+
+    Parameters
+    ----------
+    wait: :class:`int`
+        How many seconds the client should wait before retrying.
+    """
+
+    status_code = HTTP_503_SERVICE_UNAVAILABLE
+    default_code = "service_unavailable"
+
+    def __init__(self, wait: int = 1) -> None:
+        super().__init__(
+            _("Service temporarily unavailable, try again later.")
+        )
+        # Django REST Framework sets the `Retry-After` header from it.
+        self.wait = wait
+
+
 def main_exception_handler(
     exc: APIException, context: Mapping[str, Any]
 ) -> Response | None:
@@ -31,6 +53,11 @@ def main_exception_handler(
     context: Mapping[:class:`str`, Any]
         The context of the exception.
     """
+    # Importing the views of Django REST Framework imports the
+    # authentication classes, which import our models, so it can't be
+    # done when the models import the exceptions defined here.
+    from rest_framework.views import exception_handler
+
     context["request"].accepted_renderer = BaseJSONRenderer()
     response = exception_handler(exc, context)
 
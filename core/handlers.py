@@ -0,0 +1,94 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable, Iterator, Mapping
+
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponseBase
+
+Send = Callable[[Mapping[str, Any]], Awaitable[None]]
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """The ASGI handler of Django, which also lets streaming responses
+    query the database while they are sent.
+
+    Django iterates over streaming responses on the event loop, where
+    the ORM can't be used, and which would be blocked by the queries.
+    Instead, each part of a streaming response is produced in the
+    thread of the request, like its synchronous code, so the queries
+    run on the connections of the request, and a part is sent before
+    the next one is produced.
+    """
+
+    async def send_response(
+        self, response: HttpResponseBase, send: Send
+    ) -> None:
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": self.get_headers(response),
+            }
+        )
+
+        parts = iter(response)
+        next_part = sync_to_async(self.next_part, thread_sensitive=True)
+
+        while (part := await next_part(parts)) is not None:
+            for chunk, _last in self.chunk_bytes(part):
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": True,
+                    }
+                )
+
+        await send({"type": "http.response.body"})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+    def next_part(self, parts: Iterator[bytes]) -> bytes | None:
+        """Return the next part of a streaming response, or `None` once
+        it is over.
+        """
+        return next(parts, None)
+
+    def get_headers(
+        self, response: HttpResponseBase
+    ) -> list[tuple[bytes, bytes]]:
+        """Return the headers of the given response, with its cookies,
+        encoded like Django does.
+        """
+        headers = [
+            (name.encode("ascii"), value.encode("latin1"))
+            for name, value in response.items()
+        ]
+
+        for cookie in response.cookies.values():
+            value = cookie.output(header="").encode("ascii").strip()
+            headers.append((b"Set-Cookie", value))
+
+        return headers
+
+
+def get_asgi_application() -> StreamingASGIHandler:
+    """Set up Django and return its ASGI application, like
+    :func:`django.core.asgi.get_asgi_application` does, but with the
+    :class:`StreamingASGIHandler`.
+    """
+    django.setup(set_prefix=False)
+    return StreamingASGIHandler()
@@ -0,0 +1,173 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, ParamSpec, TypeVar
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+
+from core.exceptions import ServiceUnavailable
+from core.metrics import hashing_duration, hashing_queue_depth
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+class HashingPool:
+    """A bounded pool of threads dedicated to password hashing.
+
+    Hashing a password is deliberately slow, so running it on the
+    request threads lets a burst of logins or signups starve every
+    other endpoint. Instead, hashes run on a fixed number of threads,
+    which hold the GIL for a small part of the work only, and at most
+    `queue_size` hashes can wait for a free thread. Once the queue is
+    full, new hashes are rejected right away with a 503 response
+    instead of making every request slower.
+
+    Only requests go through the pool, see :func:`run_hash`. Management
+    commands and the shell hash on their own thread, where a 503 would
+    make no sense.
+
+    Parameters
+    ----------
+    max_workers: :class:`int`
+        The number of threads hashing passwords.
+    queue_size: :class:`int`
+        How many hashes can wait for a free thread.
+    """
+
+    def __init__(self, max_workers: int, queue_size: int) -> None:
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+
+        self.executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="hashing"
+        )
+        self.lock = Lock()
+
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.duration = 0.0
+        self.max_duration = 0.0
+
+    def run(
+        self, func: Callable[P, T], *args: P.args, **kwargs: P.kwargs
+    ) -> T:
+        """Run the given function on the pool and wait for its result.
+
+        Raises
+        ------
+        :class:`ServiceUnavailable`
+            If the queue of the pool is full.
+        """
+        with self.lock:
+            if self.pending >= self.max_workers + self.queue_size:
+                self.rejected += 1
+                raise ServiceUnavailable()
+
+            self.pending += 1
+            self.update_queue_depth()
+
+        def call() -> T:
+            start = perf_counter()
+
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(perf_counter() - start)
+
+        future = self.executor.submit(call)
+        future.add_done_callback(self.release)
+
+        return future.result()
+
+    def record(self, duration: float) -> None:
+        """Record how long a hash took."""
+        with self.lock:
+            self.completed += 1
+            self.duration += duration
+            self.max_duration = max(self.max_duration, duration)
+
+        hashing_duration.observe(duration)
+
+    def release(self, future: Future[Any]) -> None:
+        """Free the slot of a finished hash."""
+        with self.lock:
+            self.pending -= 1
+            self.update_queue_depth()
+
+    def update_queue_depth(self) -> None:
+        """Export the number of hashes waiting for a thread. The lock
+        must be held by the caller.
+        """
+        hashing_queue_depth.set(max(self.pending - self.max_workers, 0))
+
+    def stats(self) -> dict[str, float]:
+        """Return the counters of the pool, which are useful to size
+        it. `queued` is the number of hashes waiting for a thread and
+        the durations are in seconds.
+        """
+        with self.lock:
+            return {
+                "workers": self.max_workers,
+                "running": min(self.pending, self.max_workers),
+                "queued": max(self.pending - self.max_workers, 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "duration_sum": self.duration,
+                "duration_max": self.max_duration,
+            }
+
+
+hashing_pool = HashingPool(
+    max_workers=settings.HASHING_POOL_WORKERS,
+    queue_size=settings.HASHING_POOL_QUEUE_SIZE,
+)
+
+# Whether the current thread or task is serving a request. Context
+# variables are copied to the threads of `sync_to_async`, so this is
+# also set in the threads that run the views of the ASGI handler.
+serving_request: ContextVar[bool] = ContextVar(
+    "serving_request", default=False
+)
+
+
+def run_hash(func: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+    """Run the given hashing function on :data:`hashing_pool` while
+    serving a request, or right away otherwise.
+
+    Raises
+    ------
+    :class:`ServiceUnavailable`
+        If a request is served and the queue of the pool is full.
+    """
+    if serving_request.get():
+        return hashing_pool.run(func, *args, **kwargs)
+
+    return func(*args, **kwargs)
+
+
+def start_request(**kwargs: Any) -> None:
+    """Mark the current context as serving a request."""
+    serving_request.set(True)
+
+
+def finish_request(**kwargs: Any) -> None:
+    """Mark the current context as no longer serving a request, since
+    the threads of the WSGI server are reused between requests.
+    """
+    serving_request.set(False)
+
+
+request_started.connect(start_request)
+request_finished.connect(finish_request)
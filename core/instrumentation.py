@@ -0,0 +1,111 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Callable, Iterator
+
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+
+class RequestMetrics:
+    """The queries and the timings recorded while handling a request.
+
+    Each timing is the number of seconds spent in a part of the request
+    cycle, see :func:`timing`. Queries are kept with their duration, in
+    the order they ran.
+    """
+
+    def __init__(self) -> None:
+        self.start = perf_counter()
+        self.queries: list[tuple[str, float]] = []
+        self.timings: dict[str, float] = {}
+        self.active: set[str] = set()
+
+    @property
+    def duration(self) -> float:
+        """The number of seconds since the request started."""
+        return perf_counter() - self.start
+
+    @property
+    def database_duration(self) -> float:
+        """The number of seconds spent running queries."""
+        return sum(duration for _, duration in self.queries)
+
+
+# The metrics of the request being handled. Context variables are
+# copied to the threads of `sync_to_async`, so the queries that async
+# views run in worker threads are recorded as well.
+current_metrics: ContextVar[RequestMetrics | None] = ContextVar(
+    "current_metrics", default=None
+)
+
+
+@contextmanager
+def timing(name: str) -> Iterator[None]:
+    """Add the time spent in the block to the timing with the given
+    name. Nested blocks with the same name are only counted once, and
+    nothing is measured outside of an instrumented request.
+
+    Parameters
+    ----------
+    name: :class:`str`
+        The name of the timing, like `render`.
+    """
+    metrics = current_metrics.get()
+
+    if metrics is None or name in metrics.active:
+        yield
+        return
+
+    metrics.active.add(name)
+    start = perf_counter()
+
+    try:
+        yield
+    finally:
+        metrics.active.discard(name)
+        duration = perf_counter() - start
+        metrics.timings[name] = metrics.timings.get(name, 0.0) + duration
+
+
+def record_query(
+    execute: Callable[..., Any],
+    sql: str,
+    params: Any,
+    many: bool,
+    context: dict[str, Any],
+) -> Any:
+    """A database execute wrapper that records the queries run during
+    an instrumented request.
+    """
+    metrics = current_metrics.get()
+
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = perf_counter()
+
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries.append((sql, perf_counter() - start))
+
+
+def install_query_recorder(
+    connection: BaseDatabaseWrapper, **kwargs: Any
+) -> None:
+    """Record the queries of the given connection. This is connected
+    to the `connection_created` signal, which is sent again when a
+    connection reconnects.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
@@ -0,0 +1,102 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from os import environ
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+)
+
+# The metrics of the application, exposed in the Prometheus format by
+# `core.views.metrics`. Rates, like the number of messages created per
+# second, are computed from the counters by Prometheus.
+# https://prometheus.io/docs/practices/naming/
+
+request_duration = Histogram(
+    "siege_request_duration_seconds",
+    "Time spent handling a request, by view.",
+    ["view", "method", "status"],
+)
+
+token_validations = Counter(
+    "siege_token_validations",
+    "Number of tokens validated, by outcome.",
+    ["outcome"],
+)
+
+throttled_requests = Counter(
+    "siege_throttled_requests",
+    "Number of requests rejected by the throttles, by scope.",
+    ["scope"],
+)
+
+token_cache_lookups = Counter(
+    "siege_token_cache_lookups",
+    "Number of lookups in the tokens cache, by outcome.",
+    ["outcome"],
+)
+
+token_cache_evictions = Counter(
+    "siege_token_cache_evictions",
+    "Number of tokens evicted from the full tokens cache.",
+)
+
+tag_allocation_retries = Counter(
+    "siege_tag_allocation_retries",
+    "Number of tags that were already taken when creating a user.",
+)
+
+hashing_queue_depth = Gauge(
+    "siege_hashing_queue_depth",
+    "Number of password hashes waiting for a thread of the pool.",
+    multiprocess_mode="livesum",
+)
+
+hashing_duration = Histogram(
+    "siege_hashing_duration_seconds",
+    "Time spent hashing or checking a password in the pool.",
+)
+
+user_cache_lookups = Counter(
+    "siege_user_cache_lookups",
+    "Number of lookups in the users cache, by outcome.",
+    ["outcome"],
+)
+
+messages_created = Counter(
+    "siege_messages_created",
+    "Number of messages created.",
+)
+
+
+def get_registry() -> CollectorRegistry:
+    """Return the registry with the metrics of the whole node.
+
+    When the application runs in several processes, each of them writes
+    its metrics to the directory in `PROMETHEUS_MULTIPROC_DIR`, and the
+    metrics of every process are aggregated from there.
+
+    Returns
+    -------
+    :class:`CollectorRegistry`
+        The registry to expose.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in environ:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(  # type: ignore[no-untyped-call]
+        registry
+    )
+
+    return registry
@@ -0,0 +1,225 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from asyncio import iscoroutinefunction
+from logging import getLogger
+from time import perf_counter
+from typing import Any, Awaitable, Callable
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpRequest, HttpResponseBase
+
+from core.instrumentation import (
+    RequestMetrics,
+    current_metrics,
+    install_query_recorder,
+)
+from core.metrics import request_duration
+
+logger = getLogger("core.instrumentation")
+
+
+class InstrumentationMiddleware:
+    """Record the number of queries, the time spent in the database and
+    the time spent in each instrumented part of a request, like the
+    serialization and the rendering, see
+    :func:`core.instrumentation.timing`.
+
+    The numbers are sent back in the `Server-Timing` header and logged
+    as a structured line for every request. When a request is slower
+    than `INSTRUMENTATION_SLOW_REQUEST_MS`, each of its queries is
+    logged as well.
+
+    Unless `INSTRUMENTATION_ENABLED` is set, the middleware removes
+    itself from the stack and queries are not wrapped, so it costs
+    nothing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], Any]) -> None:
+        if not settings.INSTRUMENTATION_ENABLED:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.slow_request = settings.INSTRUMENTATION_SLOW_REQUEST_MS / 1000
+
+        connection_created.connect(install_query_recorder)
+
+        for connection in connections.all():
+            install_query_recorder(connection)
+
+        # Django calls the middleware like the next one in the stack,
+        # so it must be a coroutine function if the next one is.
+        self.is_async = iscoroutinefunction(get_response)
+
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(
+        self, request: HttpRequest
+    ) -> HttpResponseBase | Awaitable[HttpResponseBase]:
+        if self.is_async:
+            return self.acall(request)
+
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+
+        try:
+            response: HttpResponseBase = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+
+        self.report(request, response, metrics)
+        return response
+
+    async def acall(self, request: HttpRequest) -> HttpResponseBase:
+        """Asynchronous version of `__call__`."""
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+
+        try:
+            response: HttpResponseBase = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+
+        self.report(request, response, metrics)
+        return response
+
+    def report(
+        self,
+        request: HttpRequest,
+        response: HttpResponseBase,
+        metrics: RequestMetrics,
+    ) -> None:
+        """Add the `Server-Timing` header to the response and log the
+        metrics of the request.
+        """
+        duration = metrics.duration
+        timings = {
+            "db": metrics.database_duration,
+            **metrics.timings,
+            "total": duration,
+        }
+
+        # https://www.w3.org/TR/server-timing/
+        response["Server-Timing"] = ", ".join(
+            f"{name};dur={seconds * 1000:.2f}"
+            for name, seconds in timings.items()
+        )
+
+        record: dict[str, Any] = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": len(metrics.queries),
+            **{
+                f"{name}_ms": round(s * 1000, 2) for name, s in timings.items()
+            },
+        }
+        logger.info(
+            " ".join(f"{key}={value}" for key, value in record.items()),
+            extra={"metrics": record},
+        )
+
+        if duration >= self.slow_request:
+            self.report_queries(request, metrics)
+
+    def report_queries(
+        self, request: HttpRequest, metrics: RequestMetrics
+    ) -> None:
+        """Log every query of a slow request with its duration."""
+        lines = [
+            f"{index}. {seconds * 1000:.2f}ms {sql}"
+            for index, (sql, seconds) in enumerate(metrics.queries, 1)
+        ]
+        logger.warning(
+            "Slow request: %s %s ran %d queries\n%s",
+            request.method,
+            request.path,
+            len(metrics.queries),
+            "\n".join(lines),
+        )
+
+
+class MetricsMiddleware:
+    """Measure how long each request takes, by view, for the metrics
+    endpoint, see :mod:`core.metrics`. Requests that don't match any
+    view are counted together.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], Any]) -> None:
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(
+        self, request: HttpRequest
+    ) -> HttpResponseBase | Awaitable[HttpResponseBase]:
+        if self.is_async:
+            return self.acall(request)
+
+        start = perf_counter()
+        response: HttpResponseBase = self.get_response(request)
+
+        self.observe(request, response, perf_counter() - start)
+        return response
+
+    async def acall(self, request: HttpRequest) -> HttpResponseBase:
+        """Asynchronous version of `__call__`."""
+        start = perf_counter()
+        response: HttpResponseBase = await self.get_response(request)
+
+        self.observe(request, response, perf_counter() - start)
+        return response
+
+    def observe(
+        self,
+        request: HttpRequest,
+        response: HttpResponseBase,
+        duration: float,
+    ) -> None:
+        """Record the duration of the given request."""
+        request_duration.labels(
+            view=self.get_view_name(request, response),
+            method=request.method,
+            status=response.status_code,
+        ).observe(duration)
+
+    def get_view_name(
+        self, request: HttpRequest, response: HttpResponseBase
+    ) -> str:
+        """Return the name of the view that handled the request, which
+        is the name of its class for class-based views.
+
+        The responses of Django REST Framework tell their view, which
+        differs from the one of the URL when it dispatches to others,
+        like `/users` does.
+        """
+        match = request.resolver_match
+
+        if match is None:
+            return "unmatched"
+
+        context = getattr(response, "renderer_context", None) or {}
+
+        if context.get("view") is not None:
+            return type(context["view"]).__name__
+
+        view = getattr(match.func, "cls", None) or match.func
+        return view.__name__
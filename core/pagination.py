@@ -0,0 +1,224 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+from typing import Any
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import Model, Q, QuerySet
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+
+# The largest integer a cursor may hold, which is the largest value of
+# a bigint column. Larger ones would overflow when querying.
+MAX_CURSOR_INTEGER = 2**63 - 1
+
+
+class KeysetPagination(BasePagination):
+    """Paginate a queryset from the newest to the oldest object using
+    keyset (also known as cursor) pagination.
+
+    Instead of skipping a number of rows with `OFFSET`, which makes the
+    database read every skipped row, each page starts right after the
+    last object of the previous one. With an index on `cursor_fields`,
+    every page costs the same, no matter how deep it is.
+
+    The fields in `cursor_fields` must identify an object, so the last
+    one is usually the primary key.
+
+    The queryset can also be a union, made with `QuerySet.union`, of
+    querysets that each have an index on `cursor_fields`. A page is then
+    read from each of them, and the pages are merged.
+    """
+
+    cursor_fields: tuple[str, ...] = ("created_at", "id")
+    cursor_query_param = "cursor"
+    page_size_query_param = "limit"
+    page_size = 50
+    max_page_size = 100
+
+    def paginate_queryset(
+        self,
+        queryset: QuerySet[Any],
+        request: Request,
+        view: APIView | None = None,
+    ) -> list[Any]:
+        queryset = self.get_page_queryset(queryset, request)
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(
+        self,
+        queryset: QuerySet[Any],
+        request: Request,
+        view: APIView | None = None,
+    ) -> list[Any]:
+        """Asynchronous version of `paginate_queryset`, which fetches
+        the page with the asynchronous interface of the ORM.
+        """
+        queryset = self.get_page_queryset(queryset, request)
+        return self.set_page([instance async for instance in queryset])
+
+    def get_page_queryset(
+        self, queryset: QuerySet[Any], request: Request
+    ) -> QuerySet[Any]:
+        """Return the queryset of the page requested by the client."""
+        self.request = request
+        self.limit = self.get_limit(request)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+
+        if queryset.query.combinator == "union":
+            return self.get_union_queryset(queryset, cursor)
+
+        return self.get_part_queryset(queryset, cursor)
+
+    def get_union_queryset(
+        self, queryset: QuerySet[Any], cursor: str | None
+    ) -> QuerySet[Any]:
+        """Return the objects of the given union that belong to the page
+        starting at the given cursor, in the pagination order.
+
+        Each queryset of the union is paginated on its own, so that each
+        of them is read with its own index range scan, and their pages
+        are merged. Some databases, like SQLite, don't allow `LIMIT` in
+        the queries of a union, which are then merged whole.
+        """
+        features = connections[queryset.db].features
+        limit = features.supports_slicing_ordering_in_compound
+        parts = []
+
+        for query in queryset.query.combined_queries:
+            part = queryset.all()
+            part.query = query.chain()
+            parts.append(self.get_part_queryset(part, cursor, limit))
+
+        union = parts[0].union(*parts[1:], all=queryset.query.combinator_all)
+
+        return union.order_by(*self.get_ordering())[: self.limit + 1]
+
+    def get_part_queryset(
+        self, queryset: QuerySet[Any], cursor: str | None, limit: bool = True
+    ) -> QuerySet[Any]:
+        """Return the objects of the queryset that belong to the page
+        starting at the given cursor, in the pagination order. Without
+        `limit`, every object after the cursor is returned, unordered.
+        """
+        if cursor is not None:
+            queryset = self.filter_after(queryset, cursor)
+
+        if not limit:
+            return queryset.order_by()
+
+        # Fetch one more object than needed to know if there is a next
+        # page, without having to count the whole queryset.
+        return queryset.order_by(*self.get_ordering())[: self.limit + 1]
+
+    def get_ordering(self) -> list[str]:
+        """Return the ordering of the pages, from the newest object."""
+        return [f"-{field}" for field in self.cursor_fields]
+
+    def set_page(self, page: list[Any]) -> list[Any]:
+        """Store the objects of the page, without the extra object used
+        to know if there is a next page, and return them.
+        """
+        self.page = page[: self.limit]
+        self.has_next = len(page) > self.limit
+
+        return self.page
+
+    def get_paginated_response(self, data: Any) -> Response:
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_limit(self, request: Request) -> int:
+        """Return the page size requested by the client, bounded by
+        `max_page_size`.
+        """
+        try:
+            limit = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        return min(max(limit, 1), self.max_page_size)
+
+    def get_next_link(self) -> str | None:
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        cursor = self.encode_cursor(self.page[-1])
+
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def encode_cursor(self, instance: Model) -> str:
+        """Return an opaque cursor pointing right after the given
+        object.
+        """
+        values = [getattr(instance, field) for field in self.cursor_fields]
+        # Datetimes are encoded with all of their precision, otherwise
+        # objects created in the same millisecond could be skipped.
+        data = json.dumps(values, default=datetime.isoformat)
+
+        return urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, cursor: str) -> list[Any]:
+        """Return the values of `cursor_fields` stored in the given
+        cursor.
+        """
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode()))
+        except (BinasciiError, UnicodeError, ValueError) as exc:
+            raise NotFound(_("Invalid cursor")) from exc
+
+        if not isinstance(values, list) or not self.is_valid_cursor(values):
+            raise NotFound(_("Invalid cursor"))
+
+        return values
+
+    def is_valid_cursor(self, values: list[Any]) -> bool:
+        """Return whether the given values, decoded from a cursor, can
+        be compared to `cursor_fields`.
+        """
+        return len(values) == len(self.cursor_fields) and all(
+            abs(value) <= MAX_CURSOR_INTEGER
+            for value in values
+            if isinstance(value, int)
+        )
+
+    def filter_after(
+        self, queryset: QuerySet[Any], cursor: str
+    ) -> QuerySet[Any]:
+        """Filter the queryset to the objects that come after the given
+        cursor, in the pagination order.
+        """
+        values = self.decode_cursor(cursor)
+        fields = list(zip(self.cursor_fields, values))
+
+        # For fields `(a, b)`, this builds `a <= x AND (a < x OR (a = x
+        # AND b < y))`. The first condition is redundant, but it lets
+        # the database use an index range scan on `a`.
+        field, value = fields[-1]
+        query = Q(**{f"{field}__lt": value})
+
+        for field, value in reversed(fields[:-1]):
+            query = Q(**{f"{field}__lt": value}) | Q(**{field: value}) & query
+
+        field, value = fields[0]
+
+        try:
+            return queryset.filter(Q(**{f"{field}__lte": value}) & query)
+        except (DjangoValidationError, TypeError, ValueError) as exc:
+            raise NotFound(_("Invalid cursor")) from exc
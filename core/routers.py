@@ -0,0 +1,64 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Model
+
+# Whether the queries of the current context may read from the replica.
+# Context variables are copied to the threads of `sync_to_async`, so
+# this also covers the queries of async views.
+reading_replica: ContextVar[bool] = ContextVar(
+    "reading_replica", default=False
+)
+
+
+@contextmanager
+def read_replica() -> Iterator[None]:
+    """Let the reads of the block go to the read replica, if there is
+    one, see :class:`ReplicaRouter`. This must only wrap read-only code
+    that can tolerate the replication lag, like reading a profile.
+    """
+    token = reading_replica.set(True)
+
+    try:
+        yield
+    finally:
+        reading_replica.reset(token)
+
+
+class ReplicaRouter:
+    """A database router that sends the reads done in a
+    :func:`read_replica` block to the replica database, named by the
+    `DATABASE_REPLICA` setting. Every other query goes to the default
+    database, which is also used when there is no replica.
+
+    Reads done inside a transaction of the default database stay on it,
+    so that a transaction always sees its own writes.
+    """
+
+    def db_for_read(self, model: type[Model], **hints: Any) -> str | None:
+        replica: str | None = settings.DATABASE_REPLICA
+
+        if replica is None or not reading_replica.get():
+            return None
+
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+
+        return replica
+
+    def allow_relation(self, obj1: Model, obj2: Model, **hints: Any) -> bool:
+        # The replica holds the same data as the default database.
+        return True
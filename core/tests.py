@@ -0,0 +1,809 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from importlib import import_module
+from threading import Event, Thread
+from time import sleep
+from typing import Any, Iterator, Mapping, cast
+from unittest.mock import Mock, patch
+from uuid import UUID
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import close_old_connections, transaction
+from django.http import HttpResponse, HttpResponseBase, StreamingHttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils.translation import gettext_lazy as _
+from prometheus_client import REGISTRY
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework.exceptions import ErrorDetail, NotFound
+from rest_framework.reverse import reverse
+from rest_framework.status import (
+    HTTP_200_OK,
+    HTTP_201_CREATED,
+    HTTP_400_BAD_REQUEST,
+    HTTP_401_UNAUTHORIZED,
+    HTTP_403_FORBIDDEN,
+    HTTP_404_NOT_FOUND,
+    HTTP_429_TOO_MANY_REQUESTS,
+)
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
+
+from apps.messages.models import Message
+from apps.users.logic.cache import user_cache
+from apps.users.logic.utils import get_user
+from apps.users.models import User
+from core.benchmarks import measure, unthrottled
+from core.exceptions import ServiceUnavailable
+from core.handlers import StreamingASGIHandler
+from core.hashing import HashingPool, hashing_pool, run_hash, serving_request
+from core.instrumentation import RequestMetrics, current_metrics, timing
+from core.renderers import BaseJSONRenderer
+from core.routers import read_replica
+from core.throttling import (
+    LocalBucketStore,
+    RedisBucketStore,
+    bucket_store,
+    parse_rate,
+)
+
+
+class BaseJSONRendererTestCase(SimpleTestCase):
+    """Test case for the JSON renderer and its backends."""
+
+    def setUp(self) -> None:
+        self.renderer = BaseJSONRenderer()
+        self.data = {
+            "id": 1,
+            "content": "Hello World! ❤",
+            "created_at": datetime(
+                2023, 3, 1, 12, 30, 15, 123456, timezone.utc
+            ),
+            "uuid": UUID("12345678-1234-5678-1234-567812345678"),
+            "detail": _("User not found."),
+            "errors": [ErrorDetail("Invalid cursor", code="invalid")],
+        }
+        self.expected = {
+            "id": 1,
+            "content": "Hello World! ❤",
+            "created_at": "2023-03-01T12:30:15.123456Z",
+            "uuid": "12345678-1234-5678-1234-567812345678",
+            "detail": "User not found",
+            "errors": ["Invalid cursor"],
+        }
+
+    @override_settings(JSON_RENDERER_BACKEND="orjson")
+    def test_render_with_orjson(self) -> None:
+        res = self.renderer.render(self.data)
+        self.assertDictEqual(json.loads(res), self.expected)
+
+    @override_settings(JSON_RENDERER_BACKEND="json")
+    def test_render_with_json(self) -> None:
+        res = self.renderer.render(self.data)
+        self.assertDictEqual(json.loads(res), self.expected)
+
+    @override_settings(JSON_RENDERER_BACKEND="orjson")
+    def test_render_with_indent(self) -> None:
+        res = self.renderer.render(self.data, "application/json; indent=2")
+
+        self.assertIn(b'\n  "id": 1', res)
+        self.assertDictEqual(json.loads(res), self.expected)
+
+    def test_render_none(self) -> None:
+        self.assertEqual(self.renderer.render(None), b"")
+
+
+class BenchmarksTestCase(TestCase):
+    """Test case for the helpers of the benchmark commands."""
+
+    def test_measure_counts_failures(self) -> None:
+        responses = iter(
+            [HttpResponse(status=200), HttpResponse(status=500), None]
+        )
+        result = measure(lambda: next(responses), 3)
+
+        self.assertEqual(result["iterations"], 3)
+        self.assertEqual(result["failures"], 1)
+
+    def test_measure_with_expected_statuses(self) -> None:
+        result = measure(lambda: HttpResponse(status=404), 2, (404,))
+
+        self.assertEqual(result["failures"], 0)
+
+
+class HashingPoolTestCase(SimpleTestCase):
+    """Test case for the password hashing pool."""
+
+    def setUp(self) -> None:
+        self.pool = HashingPool(max_workers=1, queue_size=1)
+        self.started = Event()
+        self.release = Event()
+
+    def block(self) -> None:
+        self.started.set()
+        self.release.wait()
+
+    def test_run(self) -> None:
+        self.assertEqual(self.pool.run(str.upper, "hash"), "HASH")
+
+        stats = self.pool.stats()
+
+        self.assertEqual(stats["completed"], 1)
+        self.assertEqual(stats["running"], 0)
+
+    def test_reject_when_queue_is_full(self) -> None:
+        threads = [Thread(target=self.pool.run, args=(self.block,))]
+        threads[0].start()
+        self.started.wait()
+
+        threads.append(Thread(target=self.pool.run, args=(self.block,)))
+        threads[1].start()
+
+        with self.assertRaises(ServiceUnavailable):
+            self.pool.run(str.upper, "hash")
+
+        stats = self.pool.stats()
+
+        self.assertEqual(stats["running"], 1)
+        self.assertEqual(stats["rejected"], 1)
+
+        self.release.set()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.pool.stats()["completed"], 2)
+
+    def test_export_metrics(self) -> None:
+        duration = "siege_hashing_duration_seconds_count"
+        count = REGISTRY.get_sample_value(duration) or 0
+
+        thread = Thread(target=self.pool.run, args=(self.block,))
+        thread.start()
+        self.started.wait()
+
+        queued = Thread(target=self.pool.run, args=(str.upper, "hash"))
+        queued.start()
+
+        # The second hash waits until the first one is released.
+        while not self.pool.stats()["queued"]:
+            sleep(0.001)
+
+        depth = REGISTRY.get_sample_value("siege_hashing_queue_depth")
+
+        self.release.set()
+        thread.join()
+        queued.join()
+
+        self.assertEqual(depth, 1)
+        self.assertEqual(REGISTRY.get_sample_value(duration), count + 2)
+        self.assertEqual(
+            REGISTRY.get_sample_value("siege_hashing_queue_depth"), 0
+        )
+
+    def test_run_hash_outside_request(self) -> None:
+        with patch.object(
+            hashing_pool, "run", side_effect=ServiceUnavailable()
+        ):
+            self.assertEqual(run_hash(str.upper, "hash"), "HASH")
+
+    def test_run_hash_while_serving_request(self) -> None:
+        token = serving_request.set(True)
+
+        try:
+            with patch.object(hashing_pool, "run") as run:
+                run_hash(str.upper, "hash")
+        finally:
+            serving_request.reset(token)
+
+        run.assert_called_once_with(str.upper, "hash")
+
+
+class StreamingASGIHandlerTestCase(APITestCase):
+    """Test case for the ASGI handler of the application."""
+
+    def setUp(self) -> None:
+        # Closing a response signals that the request is finished, which
+        # would close the connection of the test, like the test client
+        # of Django prevents.
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+
+    async def send_response(self, response: HttpResponseBase) -> list[Any]:
+        messages: list[Any] = []
+
+        async def send(message: Mapping[str, Any]) -> None:
+            messages.append(message)
+
+        await StreamingASGIHandler().send_response(response, send)
+        return messages
+
+    async def test_stream_response_with_queries(self) -> None:
+        def stream() -> Iterator[bytes]:
+            # The ORM can't be used on the event loop.
+            yield str(User.objects.count()).encode()
+            yield b"!"
+
+        response = StreamingHttpResponse(stream(), content_type="text/plain")
+        messages = await self.send_response(response)
+
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertIn((b"Content-Type", b"text/plain"), messages[0]["headers"])
+        self.assertEqual(
+            [message.get("body") for message in messages[1:]],
+            [b"0", b"!", None],
+        )
+
+    async def test_send_response(self) -> None:
+        messages = await self.send_response(HttpResponse(b"Hello!"))
+
+        self.assertEqual(messages[-1]["body"], b"Hello!")
+
+
+class TimingTestCase(SimpleTestCase):
+    """Test case for the timings of the instrumentation."""
+
+    def test_timing(self) -> None:
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+
+        try:
+            with timing("render"):
+                with timing("render"):
+                    pass
+
+            with timing("render"):
+                pass
+        finally:
+            current_metrics.reset(token)
+
+        self.assertEqual(list(metrics.timings), ["render"])
+        self.assertGreater(metrics.timings["render"], 0)
+
+    def test_timing_outside_of_request(self) -> None:
+        with timing("render"):
+            pass
+
+        self.assertIsNone(current_metrics.get())
+
+
+@override_settings(INSTRUMENTATION_ENABLED=True)
+class InstrumentationMiddlewareTestCase(APITestCase):
+    """Test case for the instrumentation middleware."""
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            username="user",
+            email="user@email.com",
+            password="password",
+        )
+        self.url = reverse("users:users-detail", kwargs={"pk": "me"})
+        self.authorization = f"Token {self.user.token}"
+
+    def get_timings(self, header: str) -> dict[str, str]:
+        timings = [timing.split(";dur=") for timing in header.split(", ")]
+        return {name: duration for name, duration in timings}
+
+    def test_report_request(self) -> None:
+        self.client.credentials(HTTP_AUTHORIZATION=self.authorization)
+
+        with self.assertLogs("core.instrumentation", "INFO") as logs:
+            res = self.client.get(self.url)
+
+        timings = self.get_timings(res["Server-Timing"])
+
+        self.assertEqual(list(timings), ["db", "serialize", "render", "total"])
+        self.assertIn("status=201 queries=1 ", logs.output[0])
+
+    async def test_report_request_with_asgi(self) -> None:
+        # The queries of async views run in worker threads, which must
+        # be recorded as well.
+        with self.assertLogs("core.instrumentation", "INFO") as logs:
+            res = await self.async_client.get(
+                self.url, AUTHORIZATION=self.authorization
+            )
+
+        timings = self.get_timings(res["Server-Timing"])
+
+        self.assertIn("serialize", timings)
+        self.assertIn("status=201 queries=1 ", logs.output[0])
+
+    @override_settings(INSTRUMENTATION_SLOW_REQUEST_MS=0)
+    def test_report_slow_request(self) -> None:
+        self.client.credentials(HTTP_AUTHORIZATION=self.authorization)
+
+        with self.assertLogs("core.instrumentation", "WARNING") as logs:
+            self.client.get(self.url)
+
+        self.assertIn("ran 1 queries", logs.output[0])
+        self.assertIn('FROM "users"', logs.output[0])
+
+    @override_settings(INSTRUMENTATION_ENABLED=False)
+    def test_disabled(self) -> None:
+        self.client.credentials(HTTP_AUTHORIZATION=self.authorization)
+
+        with self.assertNoLogs("core.instrumentation"):
+            res = self.client.get(self.url)
+
+        self.assertNotIn("Server-Timing", res)
+
+
+class MetricsTestCase(APITestCase):
+    """Test case for the metrics endpoint."""
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            username="user",
+            email="user@email.com",
+            password="password",
+        )
+        self.url = reverse("users:users-detail", kwargs={"pk": "me"})
+
+    def test_measure_request_duration(self) -> None:
+        name = "siege_request_duration_seconds_count"
+        labels = {"view": "UsersView", "method": "GET", "status": "201"}
+        count = REGISTRY.get_sample_value(name, labels) or 0
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user.token}")
+        self.client.get(self.url)
+
+        self.assertEqual(REGISTRY.get_sample_value(name, labels), count + 1)
+
+    def test_measure_each_view_of_users(self) -> None:
+        name = "siege_request_duration_seconds_count"
+        signup = {"view": "SelfUserView", "method": "POST", "status": "201"}
+        lookup = {"view": "UsersView", "method": "GET", "status": "200"}
+        counts = [
+            REGISTRY.get_sample_value(name, labels) or 0
+            for labels in (signup, lookup)
+        ]
+        url = reverse("users:users-collection")
+
+        self.client.post(
+            url,
+            {
+                "username": "other",
+                "email": "other@email.com",
+                "password": "password",
+            },
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user.token}")
+        self.client.get(url, {"ids": str(self.user.id)})
+
+        self.assertEqual(
+            REGISTRY.get_sample_value(name, signup), counts[0] + 1
+        )
+        self.assertEqual(
+            REGISTRY.get_sample_value(name, lookup), counts[1] + 1
+        )
+
+    def test_expose_metrics(self) -> None:
+        self.client.get("/unknown")
+        res = self.client.get("/metrics")
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+        self.assertIn(
+            b'siege_request_duration_seconds_count{method="GET",'
+            b'status="404",view="unmatched"}',
+            res.content,
+        )
+
+    def test_expose_metrics_to_other_network(self) -> None:
+        res = self.client.get("/metrics", REMOTE_ADDR="203.0.113.1")
+
+        self.assertEqual(res.status_code, HTTP_403_FORBIDDEN)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_expose_metrics_with_token(self) -> None:
+        res = self.client.get(
+            "/metrics",
+            REMOTE_ADDR="203.0.113.1",
+            HTTP_AUTHORIZATION="Bearer secret",
+        )
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_expose_metrics_with_invalid_token(self) -> None:
+        res = self.client.get(
+            "/metrics",
+            REMOTE_ADDR="203.0.113.1",
+            HTTP_AUTHORIZATION="Bearer invalid",
+        )
+
+        self.assertEqual(res.status_code, HTTP_403_FORBIDDEN)
+
+
+class MiddlewareProfileTestCase(APITestCase):
+    """Test case for the API middleware profile, which doesn't have the
+    sessions and CSRF middlewares.
+    """
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            username="user",
+            email="user@email.com",
+            password="password",
+        )
+        self.url = reverse("users:users-detail", kwargs={"pk": "me"})
+
+    def test_api_profile_is_used(self) -> None:
+        self.assertEqual(settings.MIDDLEWARE, settings.API_MIDDLEWARE)
+
+    def test_authenticate_with_token(self) -> None:
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user.token}")
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, HTTP_201_CREATED)
+        self.assertEqual(res.data["id"], self.user.id)
+        self.assertNotIn("Set-Cookie", res)
+        self.assertNotIn("Vary", res)
+
+    def test_authenticate_with_invalid_token(self) -> None:
+        self.client.credentials(HTTP_AUTHORIZATION="Token invalid")
+        res = self.client.get(self.url)
+        expected = {
+            "status": HTTP_400_BAD_REQUEST,
+            "errors": ["Invalid token provided"],
+        }
+
+        self.assertEqual(res.status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.json(), expected)
+
+    def test_request_without_authentication(self) -> None:
+        res = self.client.get(self.url)
+        expected = {
+            "status": HTTP_401_UNAUTHORIZED,
+            "errors": {
+                "detail": "Authentication credentials were not provided"
+            },
+        }
+
+        self.assertEqual(res.status_code, HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res.json(), expected)
+
+    def test_post_without_csrf_token(self) -> None:
+        client = APIClient(enforce_csrf_checks=True)
+        url = reverse("authentication:login")
+        payload = {"email": self.user.email, "password": "password"}
+
+        res = client.post(url, payload)
+
+        self.assertEqual(res.status_code, HTTP_200_OK)
+
+
+class ProductionSettingsTestCase(SimpleTestCase):
+    """Test case for the settings of the production environment."""
+
+    def load_settings(self, **environ: str) -> Any:
+        """Import the production settings again with the given
+        environment variables, without changing the current settings.
+        """
+        environ.setdefault("DJANGO_ALLOWED_HOSTS", "example.com")
+
+        with patch.dict(os.environ, environ), patch.dict(sys.modules):
+            for name in ("server.settings.base", "server.settings.production"):
+                sys.modules.pop(name, None)
+
+            return import_module("server.settings.production")
+
+    def test_connections_are_not_persistent(self) -> None:
+        production = self.load_settings(DJANGO_DATABASE_REPLICA_HOST="replica")
+
+        self.assertEqual(list(production.DATABASES), ["default", "replica"])
+
+        for database in production.DATABASES.values():
+            self.assertEqual(database["CONN_MAX_AGE"], 0)
+
+
+@override_settings(DATABASE_REPLICA="replica")
+class ReplicaRouterTestCase(APITransactionTestCase):
+    """Test case for the routing of reads to the replica. In the CI,
+    the replica is a separate database, so a user can only be read from
+    the database it was created in. Reads inside a transaction never go
+    to the replica, so the tests can't run in one.
+    """
+
+    databases = {"default", "replica"}
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            username="user", email="user@email.com", password="password"
+        )
+        self.other = User.objects.create_user(
+            username="other", email="other@email.com", password="password"
+        )
+        self.replica_user = User.objects.db_manager("replica").create_user(
+            username="replica", email="replica@email.com", password="password"
+        )
+
+    def test_reads_go_to_default_database(self) -> None:
+        self.assertEqual(User.objects.all().db, "default")
+
+    def test_reads_go_to_replica(self) -> None:
+        with read_replica():
+            self.assertEqual(User.objects.all().db, "replica")
+
+    def test_writes_go_to_default_database(self) -> None:
+        with read_replica():
+            User.objects.create_user(
+                username="new", email="new@email.com", password="password"
+            )
+
+        users = User.objects.using("default").filter(username="new")
+        self.assertTrue(users.exists())
+
+    def test_reads_in_transaction_go_to_default_database(self) -> None:
+        with read_replica(), transaction.atomic():
+            self.assertEqual(User.objects.all().db, "default")
+
+    @override_settings(DATABASE_REPLICA=None)
+    def test_reads_without_replica_go_to_default_database(self) -> None:
+        with read_replica():
+            self.assertEqual(User.objects.all().db, "default")
+
+    def test_get_user_reads_replica(self) -> None:
+        user = get_user(self.replica_user.id)
+
+        self.assertEqual(user.username, "replica")
+
+        with self.assertRaises(NotFound):
+            get_user(self.other.id)
+
+    def test_user_cache_reads_default_database(self) -> None:
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.client.force_authenticate(self.user)
+
+        for user, status in (
+            (self.other, HTTP_201_CREATED),
+            (self.replica_user, HTTP_404_NOT_FOUND),
+        ):
+            url = reverse("users:users-detail", kwargs={"pk": user.id})
+            res = self.client.get(url)
+
+            self.assertEqual(res.status_code, status)
+
+    def test_messages_history_reads_replica(self) -> None:
+        self.client.force_authenticate(self.user)
+
+        for peer, status in (
+            (self.replica_user, HTTP_200_OK),
+            (self.other, HTTP_404_NOT_FOUND),
+        ):
+            url = reverse(
+                "messages:messages-list", kwargs={"user_id": peer.id}
+            )
+            res = self.client.get(url)
+
+            self.assertEqual(res.status_code, status)
+
+
+class TokenBucketTestCase(SimpleTestCase):
+    """Test case for the token buckets of the throttles."""
+
+    def setUp(self) -> None:
+        self.store = LocalBucketStore()
+
+    def test_parse_rate(self) -> None:
+        self.assertEqual(parse_rate("30/min"), (0.5, 30))
+        self.assertEqual(parse_rate("5/s"), (5, 5))
+
+    def test_consume_bursts_up_to_capacity(self) -> None:
+        with patch("core.throttling.monotonic", return_value=100.0):
+            waits = [self.store.consume("key", 0.5, 3) for _key in range(4)]
+
+        self.assertEqual(waits, [0, 0, 0, 2])
+
+    def test_consume_refills_bucket(self) -> None:
+        with patch("core.throttling.monotonic") as monotonic:
+            monotonic.return_value = 100.0
+
+            for _index in range(3):
+                self.store.consume("key", 0.5, 3)
+
+            monotonic.return_value = 101.0
+            self.assertEqual(self.store.consume("key", 0.5, 3), 1)
+
+            monotonic.return_value = 102.0
+            self.assertEqual(self.store.consume("key", 0.5, 3), 0)
+
+    def test_consume_takes_cost(self) -> None:
+        with patch("core.throttling.monotonic", return_value=100.0):
+            self.assertEqual(self.store.consume("key", 0.5, 3, 2), 0)
+            self.assertEqual(self.store.consume("key", 0.5, 3, 2), 2)
+            self.assertEqual(self.store.consume("key", 0.5, 3), 0)
+
+    def test_consume_cost_above_capacity(self) -> None:
+        with patch("core.throttling.monotonic") as monotonic:
+            monotonic.return_value = 100.0
+
+            self.assertEqual(self.store.consume("key", 0.5, 3, 5), 0)
+            # The bucket is 2 tokens below zero, and needs 3 more.
+            self.assertEqual(self.store.consume("key", 0.5, 3), 6)
+
+            monotonic.return_value = 106.0
+            self.assertEqual(self.store.consume("key", 0.5, 3, 5), 4)
+
+    def test_consume_separates_keys(self) -> None:
+        with patch("core.throttling.monotonic", return_value=100.0):
+            self.store.consume("key", 1, 1)
+
+            self.assertEqual(self.store.consume("other", 1, 1), 0)
+            self.assertGreater(self.store.consume("key", 1, 1), 0)
+
+    def test_store_drops_least_recently_used_buckets(self) -> None:
+        self.store.max_size = 2
+
+        for key in ("first", "second", "first", "third"):
+            self.store.consume(key, 1, 10)
+
+        self.assertEqual(list(self.store.buckets), ["first", "third"])
+
+    def test_redis_store_returns_wait(self) -> None:
+        store = RedisBucketStore()
+        store.consume_script = Mock(return_value=b"1.5")
+
+        self.assertEqual(store.consume("key", 1, 1), 1.5)
+        store.consume_script.assert_called_once_with(
+            keys=["throttle:key"], args=[1, 1, 1]
+        )
+
+    def test_redis_store_lets_requests_through_without_redis(self) -> None:
+        store = RedisBucketStore()
+        store.consume_script = Mock(side_effect=RedisConnectionError)
+
+        self.assertEqual(store.consume("key", 1, 1), 0)
+
+
+@override_settings(
+    THROTTLE_RATES={
+        "user": "2/min",
+        "messages": "1/min",
+        "login": "1/min",
+        "signup": "1/min",
+    }
+)
+class ThrottlingTestCase(APITestCase):
+    """Test case for the throttling of the views."""
+
+    def setUp(self) -> None:
+        cast(LocalBucketStore, bucket_store).clear()
+
+        self.user = User.objects.create_user(
+            username="user", email="user@email.com", password="password"
+        )
+        self.other = User.objects.create_user(
+            username="other", email="other@email.com", password="password"
+        )
+
+    def test_throttle_user(self) -> None:
+        url = reverse("users:users-detail", kwargs={"pk": "me"})
+        self.client.force_authenticate(self.user)
+
+        statuses = [self.client.get(url).status_code for _n in range(3)]
+        res = self.client.get(url)
+
+        self.assertEqual(
+            statuses,
+            [HTTP_201_CREATED, HTTP_201_CREATED, HTTP_429_TOO_MANY_REQUESTS],
+        )
+        self.assertEqual(res["Retry-After"], "30")
+        self.assertDictEqual(
+            res.json(),
+            {
+                "status": HTTP_429_TOO_MANY_REQUESTS,
+                "errors": {
+                    "detail": "Too many requests (try again in 30 seconds)"
+                },
+            },
+        )
+
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(url).status_code, HTTP_201_CREATED)
+
+    @override_settings(THROTTLE_RATES={"user": "10/min", "messages": "1/min"})
+    def test_throttle_messages(self) -> None:
+        url = reverse(
+            "messages:messages-list", kwargs={"user_id": self.other.id}
+        )
+        self.client.force_authenticate(self.user)
+
+        sent = self.client.post(url, {"content": "Hello"})
+        throttled = self.client.post(url, {"content": "Hello"})
+        listed = self.client.get(url)
+
+        self.assertEqual(sent.status_code, HTTP_201_CREATED)
+        self.assertEqual(throttled.status_code, HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(throttled["Retry-After"], "60")
+        self.assertEqual(listed.status_code, HTTP_200_OK)
+
+    @override_settings(THROTTLE_RATES={"user": "10/min", "messages": "3/min"})
+    def test_throttle_bulk_messages_by_message(self) -> None:
+        url = reverse("messages:bulk-messages-list")
+        self.client.force_authenticate(self.user)
+
+        message = {"recipient": self.other.id, "content": "Hello"}
+        sent = self.client.post(
+            url, {"messages": [message, message]}, format="json"
+        )
+        throttled = self.client.post(
+            url, {"messages": [message, message]}, format="json"
+        )
+        single = self.client.post(
+            reverse(
+                "messages:messages-list", kwargs={"user_id": self.other.id}
+            ),
+            {"content": "Hello"},
+        )
+
+        self.assertEqual(sent.status_code, HTTP_200_OK)
+        self.assertEqual(throttled.status_code, HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(throttled["Retry-After"], "20")
+        self.assertEqual(single.status_code, HTTP_201_CREATED)
+        self.assertEqual(Message.objects.count(), 3)
+
+    def test_throttle_login_by_ip(self) -> None:
+        url = reverse("authentication:login")
+        data = {"email": "user@email.com", "password": "password"}
+
+        self.assertEqual(self.client.post(url, data).status_code, HTTP_200_OK)
+
+        res = self.client.post(url, data)
+        other = self.client.post(url, data, REMOTE_ADDR="10.0.0.1")
+
+        self.assertEqual(res.status_code, HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(other.status_code, HTTP_200_OK)
+
+    def test_throttle_signup_by_ip(self) -> None:
+        url = reverse("users:self-list")
+        data = {
+            "username": "new",
+            "email": "new@email.com",
+            "password": "password",
+        }
+
+        self.assertEqual(
+            self.client.post(url, data).status_code, HTTP_201_CREATED
+        )
+
+        data["email"] = "other.new@email.com"
+        res = self.client.post(url, data)
+
+        self.assertEqual(res.status_code, HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(User.objects.filter(email=data["email"]).exists())
+
+    def test_benchmarks_are_not_throttled(self) -> None:
+        url = reverse("users:users-detail", kwargs={"pk": "me"})
+        self.client.force_authenticate(self.user)
+
+        with unthrottled():
+            result = measure(lambda: self.client.get(url), 5, (201,))
+
+        self.assertEqual(result["failures"], 0)
+
+    def test_throttled_requests_are_counted(self) -> None:
+        url = reverse("authentication:login")
+        data = {"email": "user@email.com", "password": "password"}
+        before = REGISTRY.get_sample_value(
+            "siege_throttled_requests_total", {"scope": "login"}
+        )
+
+        self.client.post(url, data)
+        self.client.post(url, data)
+
+        self.assertEqual(
+            REGISTRY.get_sample_value(
+                "siege_throttled_requests_total", {"scope": "login"}
+            ),
+            (before or 0) + 1,
+        )
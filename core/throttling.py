@@ -0,0 +1,310 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from logging import getLogger
+from threading import Lock
+from time import monotonic
+from typing import Any
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from redis import Redis
+from redis.exceptions import RedisError
+from rest_framework.request import Request
+from rest_framework.throttling import BaseThrottle
+
+from core.metrics import throttled_requests
+
+logger = getLogger(__name__)
+
+# The number of seconds in each period of a rate, like `30/min`.
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate: str) -> tuple[float, int]:
+    """Parse a rate like `30/min` into the refill rate and the capacity
+    of a token bucket. A bucket holds as many tokens as the number of
+    requests of the rate, so clients can burst up to it, and it is
+    refilled evenly over the period.
+
+    Parameters
+    ----------
+    rate: :class:`str`
+        The number of requests allowed by period, which is one of `s`,
+        `m`, `h` or `d`, and may be spelled out, like `min`.
+
+    Returns
+    -------
+    tuple[:class:`float`, :class:`int`]
+        The number of tokens added per second and the capacity.
+    """
+    requests, period = rate.split("/")
+    capacity = int(requests)
+
+    return capacity / PERIODS[period[0]], capacity
+
+
+class BaseBucketStore:
+    """Stores the token buckets of the throttles. The store is chosen
+    with the `THROTTLE_STORE` setting, and must be shared by every
+    process for the limits to apply to the whole application.
+    """
+
+    def consume(
+        self, key: str, rate: float, capacity: int, cost: int = 1
+    ) -> float:
+        """Take tokens from the given bucket, which is created full when
+        it doesn't exist yet. This is a single operation on the store,
+        whatever the state of the bucket.
+
+        A cost above the capacity is taken once the bucket is full, and
+        leaves it below zero, so the next requests wait until it is
+        paid back.
+
+        Parameters
+        ----------
+        key: :class:`str`
+            The key of the bucket.
+        rate: :class:`float`
+            The number of tokens added to the bucket per second.
+        capacity: :class:`int`
+            The maximum number of tokens of the bucket.
+        cost: :class:`int`
+            The number of tokens to take.
+
+        Returns
+        -------
+        :class:`float`
+            `0` if the tokens were taken, otherwise the number of
+            seconds until the bucket has enough of them.
+        """
+        raise NotImplementedError
+
+
+class LocalBucketStore(BaseBucketStore):
+    """A store that keeps the buckets in the memory of the current
+    process, so each process enforces the limits on its own. This is
+    enough when the application runs in a single process, like in
+    development and in tests.
+
+    The least recently used buckets are dropped once the store holds
+    `THROTTLE_LOCAL_MAX_SIZE` of them. A dropped bucket was idle for a
+    while, so it would most likely be full again anyway.
+    """
+
+    def __init__(self) -> None:
+        self.max_size = settings.THROTTLE_LOCAL_MAX_SIZE
+        self.buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self.lock = Lock()
+
+    def consume(
+        self, key: str, rate: float, capacity: int, cost: int = 1
+    ) -> float:
+        now = monotonic()
+        required = min(cost, capacity)
+
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0 if tokens >= required else (required - tokens) / rate
+
+            self.buckets[key] = (tokens - cost if wait == 0 else tokens, now)
+
+            if len(self.buckets) > self.max_size:
+                self.buckets.popitem(last=False)
+
+        return wait
+
+    def clear(self) -> None:
+        """Drop every bucket, which refills them all."""
+        with self.lock:
+            self.buckets.clear()
+
+
+class RedisBucketStore(BaseBucketStore):
+    """A store that keeps the buckets in Redis, so that the limits
+    apply to every process. Each bucket is updated by a Lua script, in
+    a single round trip, and expires once it would be full again.
+
+    The time of the Redis server is used, so the clocks of the
+    processes don't need to agree. If Redis can't be reached, requests
+    are let through rather than failing.
+    """
+
+    prefix = "throttle:"
+
+    # Lua numbers are truncated to integers in the replies of Redis, so
+    # the wait is returned as a string.
+    script = """
+        local rate = tonumber(ARGV[1])
+        local capacity = tonumber(ARGV[2])
+        local cost = tonumber(ARGV[3])
+        local required = math.min(cost, capacity)
+        local time = redis.call("TIME")
+        local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+        local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+        local tokens = tonumber(bucket[1]) or capacity
+        local updated = tonumber(bucket[2]) or now
+
+        local elapsed = math.max(0, now - updated)
+        tokens = math.min(capacity, tokens + elapsed * rate)
+
+        local wait = 0
+        if tokens >= required then
+            tokens = tokens - cost
+        else
+            wait = (required - tokens) / rate
+        end
+
+        redis.call("HSET", KEYS[1], "tokens", tokens, "updated", now)
+        local refill = math.ceil((capacity - tokens) / rate)
+        redis.call("EXPIRE", KEYS[1], refill + 1)
+
+        return tostring(wait)
+    """
+
+    def __init__(self) -> None:
+        self.client = Redis.from_url(settings.REDIS_URL)
+        self.consume_script = self.client.register_script(self.script)
+
+    def consume(
+        self, key: str, rate: float, capacity: int, cost: int = 1
+    ) -> float:
+        try:
+            wait = self.consume_script(
+                keys=[f"{self.prefix}{key}"], args=[rate, capacity, cost]
+            )
+        except RedisError:
+            logger.warning("Can't reach Redis, the request isn't throttled.")
+            return 0.0
+
+        return float(wait)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """A throttle that lets each client make requests at the rate of
+    its scope, with bursts up to the number of requests of the rate.
+    Checking a request takes a single operation on the bucket store.
+
+    The rate of each scope is set in the `THROTTLE_RATES` setting. When
+    a request is throttled, the client is told when to retry with the
+    `Retry-After` header.
+    """
+
+    scope: str
+
+    def __init__(self) -> None:
+        self.wait_time = 0.0
+
+    def get_ident_key(self, request: Request) -> str | None:
+        """Return the key that identifies the client of the request, or
+        `None` if the request should not be throttled.
+        """
+        raise NotImplementedError
+
+    def get_cost(self, request: Request, view: Any) -> int:
+        """Return the number of tokens taken by the request."""
+        return 1
+
+    def allow_request(self, request: Request, view: Any) -> bool:
+        ident = self.get_ident_key(request)
+
+        if ident is None:
+            return True
+
+        rate, capacity = parse_rate(settings.THROTTLE_RATES[self.scope])
+
+        self.wait_time = bucket_store.consume(
+            f"{self.scope}:{ident}",
+            rate,
+            capacity,
+            self.get_cost(request, view),
+        )
+
+        if self.wait_time > 0:
+            throttled_requests.labels(scope=self.scope).inc()
+            return False
+
+        return True
+
+    def wait(self) -> float:
+        return self.wait_time
+
+
+class UserThrottle(TokenBucketThrottle):
+    """Throttle the requests of each authenticated user. Anonymous
+    requests are left to the other throttles of the view.
+    """
+
+    scope = "user"
+
+    def get_ident_key(self, request: Request) -> str | None:
+        if not request.user or not request.user.is_authenticated:
+            return None
+
+        return str(request.user.pk)
+
+
+class MessagesThrottle(UserThrottle):
+    """Throttle the messages sent by each user, on top of the other
+    requests.
+    """
+
+    scope = "messages"
+
+
+class BulkMessagesThrottle(MessagesThrottle):
+    """Throttle the messages sent at once by each user, which take as
+    many tokens from the bucket of :class:`MessagesThrottle` as there
+    are messages in the request.
+    """
+
+    def get_cost(self, request: Request, view: Any) -> int:
+        data = request.data
+        messages = data.get("messages") if isinstance(data, dict) else None
+
+        return max(1, len(messages)) if isinstance(messages, list) else 1
+
+
+class ExportThrottle(UserThrottle):
+    """Throttle the exports of the messages of each user, which read
+    their whole history.
+    """
+
+    scope = "export"
+
+
+class IPThrottle(TokenBucketThrottle):
+    """Throttle the requests of each IP address, for the views that
+    don't require to be authenticated. The address is read from
+    `X-Forwarded-For` when `NUM_PROXIES` is set in the settings of
+    Django REST Framework.
+    """
+
+    def get_ident_key(self, request: Request) -> str | None:
+        ident: str = self.get_ident(request)
+        return ident
+
+
+class LoginThrottle(IPThrottle):
+    """Throttle the login attempts of each IP address."""
+
+    scope = "login"
+
+
+class SignupThrottle(IPThrottle):
+    """Throttle the signups of each IP address."""
+
+    scope = "signup"
+
+
+bucket_store: BaseBucketStore = import_string(settings.THROTTLE_STORE)()
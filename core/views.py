@@ -0,0 +1,137 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from __future__ import annotations
+
+from inspect import isawaitable
+from ipaddress import ip_address, ip_network
+from typing import TYPE_CHECKING, Any, Callable
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBase,
+    HttpResponseForbidden,
+)
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from rest_framework.views import APIView
+
+from core.metrics import get_registry
+
+if TYPE_CHECKING:
+    from rest_framework.views import AsView, GenericView
+
+
+class AsyncViewMixin(APIView):
+    """Let a Django REST Framework view define `async` handlers, which
+    Django REST Framework doesn't support on its own.
+
+    Under ASGI, the view runs on the event loop, so a request waiting
+    on the database or on a slow client doesn't hold an OS thread. The
+    blocking parts of the request cycle, like the authentication and
+    the permission checks, run in a worker thread instead. Handlers
+    must do the same with any blocking call, either through the async
+    methods of the ORM or with `sync_to_async`.
+
+    Handlers can still be synchronous, like the `OPTIONS` handler of
+    Django REST Framework, and under WSGI Django runs the whole view in
+    its own event loop.
+
+    This mixin must come before the Django REST Framework classes in
+    the bases of a view.
+    """
+
+    @classmethod
+    def as_view(  # type: ignore[misc]
+        cls, *args: Any, **kwargs: Any
+    ) -> AsView[GenericView]:
+        view = super().as_view(*args, **kwargs)
+        # Django only awaits the views that look like coroutine
+        # functions, but the views of Django REST Framework are plain
+        # functions that return the result of `dispatch`.
+        return markcoroutinefunction(view)
+
+    async def dispatch(  # type: ignore[override]
+        self, request: HttpRequest, *args: Any, **kwargs: Any
+    ) -> HttpResponseBase:
+        self.args = args
+        self.kwargs = kwargs
+
+        drf_request = self.initialize_request(request, *args, **kwargs)
+        self.request = drf_request
+        self.headers = self.default_response_headers
+
+        try:
+            # Authenticating the request may hit the database.
+            await sync_to_async(self.initial)(drf_request, *args, **kwargs)
+
+            response = self.get_handler(drf_request)(
+                drf_request, *args, **kwargs
+            )
+
+            if isawaitable(response):
+                response = await response
+        except Exception as exc:
+            # The exception handler rolls back the atomic requests, so
+            # it must run where the connections of the request live.
+            # Touching them from the event loop would also open a new
+            # connection object in every event loop thread.
+            response = await sync_to_async(self.handle_exception)(exc)
+
+        self.response = self.finalize_response(
+            drf_request, response, *args, **kwargs
+        )
+        return self.response
+
+    def get_handler(self, request: HttpRequest) -> Callable[..., Any]:
+        """Return the handler of the given request, like the `dispatch`
+        method of Django REST Framework does.
+        """
+        method = (request.method or "").lower()
+
+        if method not in self.http_method_names:
+            return self.http_method_not_allowed
+
+        return getattr(self, method, self.http_method_not_allowed)
+
+
+def metrics(request: HttpRequest) -> HttpResponse:
+    """Expose the metrics of the application in the Prometheus text
+    format, see :mod:`core.metrics`. Only the allowed clients can read
+    them, see :func:`is_metrics_client`.
+    """
+    if not is_metrics_client(request):
+        return HttpResponseForbidden()
+
+    content = generate_latest(get_registry())
+    return HttpResponse(content, content_type=CONTENT_TYPE_LATEST)
+
+
+def is_metrics_client(request: HttpRequest) -> bool:
+    """Return whether the given request may read the metrics, either
+    because it sends the `METRICS_TOKEN` as a bearer token, or because
+    it comes from one of the `METRICS_ALLOWED_NETWORKS`.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+
+    if token and constant_time_compare(authorization, f"Bearer {token}"):
+        return True
+
+    try:
+        address = ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+
+    return any(
+        address in ip_network(network)
+        for network in settings.METRICS_ALLOWED_NETWORKS
+    )
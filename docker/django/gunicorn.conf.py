@@ -0,0 +1,67 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+# Gunicorn configuration used in production. Gunicorn only manages the
+# worker processes, each of them runs an Uvicorn event loop that serves
+# the ASGI application, so a worker can hold many slow connections at
+# once without a thread per request.
+# https://docs.gunicorn.org/en/stable/settings.html
+# https://www.uvicorn.org/deployment/#gunicorn
+
+from multiprocessing import cpu_count
+from os import environ
+from pathlib import Path
+from typing import Any
+
+bind = environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Since the workers don't block on I/O, one worker per core is enough.
+workers = int(environ.get("GUNICORN_WORKERS", cpu_count()))
+
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Restart the workers from time to time, with some jitter so that they
+# don't restart all at once, to bound the effect of memory leaks.
+max_requests = int(environ.get("GUNICORN_MAX_REQUESTS", 10_000))
+max_requests_jitter = int(environ.get("GUNICORN_MAX_REQUESTS_JITTER", 1_000))
+
+timeout = int(environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(environ.get("GUNICORN_KEEPALIVE", 5))
+
+accesslog = "-"
+errorlog = "-"
+
+
+# The workers write their metrics to `PROMETHEUS_MULTIPROC_DIR`, so
+# that the metrics endpoint shows those of every worker, see
+# `core.metrics`. The files of the previous run are removed when
+# Gunicorn starts, and those of the workers that exit are marked as
+# dead.
+# https://prometheus.github.io/client_python/multiprocess/
+
+
+def on_starting(server: Any) -> None:
+    directory = environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+    if directory is None:
+        return
+
+    Path(directory).mkdir(parents=True, exist_ok=True)
+
+    for path in Path(directory).glob("*.db"):
+        path.unlink()
+
+
+def child_exit(server: Any, worker: Any) -> None:
+    if "PROMETHEUS_MULTIPROC_DIR" not in environ:
+        return
+
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)  # type: ignore[no-untyped-call]
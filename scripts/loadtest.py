@@ -0,0 +1,620 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from collections import Counter
+from pathlib import Path
+from random import Random
+from statistics import fmean
+from time import perf_counter
+from typing import Any, Callable
+from urllib.parse import urlsplit
+from uuid import uuid4
+
+# Load generator for a running instance of the API. It only uses the
+# standard library, so it runs from any checkout, without installing the
+# dependencies of the application.
+#
+# Accounts are first created through the API, then requests are sent
+# to the public endpoints at a fixed rate, following a mix of endpoints.
+# Traffic is open-loop: requests are sent when they are scheduled, even
+# if earlier ones haven't completed yet, and their latency is measured
+# from that moment. A saturated server shows up as growing latencies
+# instead of a load generator that slows down with it.
+#
+# The report is written as JSON, with the commit it ran on, so that runs
+# from two commits can be compared:
+#
+#   $ python scripts/loadtest.py run --rate 200 --output base.json
+#   $ python scripts/loadtest.py compare base.json head.json
+
+# The password of every account created by the load generator.
+PASSWORD = "loadtest-password"
+
+# The default mix of endpoints, by weight. Most traffic reads profiles
+# and sends messages, while signups and logins are rarer.
+DEFAULT_MIX = "profile=60,message=30,login=8,signup=2"
+
+# The endpoints that can be part of a mix, see `Traffic`.
+ENDPOINTS = ("signup", "login", "profile", "message")
+
+# The metrics shown when comparing two reports.
+COMPARED_METRICS = ("throughput_rps", "error_rate", "p50_ms", "p99_ms")
+
+# A request to send: its method, path, JSON body and token.
+Request = tuple[str, str, dict[str, Any] | None, str | None]
+
+
+class Connection:
+    """A keep-alive HTTP/1.1 connection to the server, which is opened
+    on its first request and opened again after an error.
+    """
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+
+    async def request(
+        self, method: str, path: str, body: bytes, headers: dict[str, str]
+    ) -> tuple[int, bytes]:
+        """Send a request and return the status and the body of its
+        response.
+        """
+        if self.reader is None or self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+
+        try:
+            self.writer.write(self.encode(method, path, body, headers))
+            return await self.read_response(self.reader)
+        except BaseException:
+            self.close()
+            raise
+
+    def encode(
+        self, method: str, path: str, body: bytes, headers: dict[str, str]
+    ) -> bytes:
+        """Encode the head and the body of a request."""
+        headers = {
+            "Host": f"{self.host}:{self.port}",
+            "Content-Length": str(len(body)),
+            **headers,
+        }
+        lines = [f"{method} {path} HTTP/1.1"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+
+        return "\r\n".join(lines).encode("latin1") + b"\r\n\r\n" + body
+
+    async def read_response(
+        self, reader: asyncio.StreamReader
+    ) -> tuple[int, bytes]:
+        """Read the status, the headers and the body of a response."""
+        status_line = await reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        headers = {}
+
+        while (line := await reader.readuntil(b"\r\n")) != b"\r\n":
+            name, _sep, value = line.decode("latin1").partition(":")
+            headers[name.strip().lower()] = value.strip().lower()
+
+        if headers.get("transfer-encoding") == "chunked":
+            body = await self.read_chunks(reader)
+        else:
+            length = int(headers.get("content-length", 0))
+            body = await reader.readexactly(length)
+
+        if headers.get("connection") == "close":
+            self.close()
+
+        return status, body
+
+    async def read_chunks(self, reader: asyncio.StreamReader) -> bytes:
+        """Read a body sent with the chunked transfer encoding."""
+        chunks = []
+
+        while size := int(
+            (await reader.readuntil(b"\r\n")).split(b";")[0], 16
+        ):
+            chunks.append(await reader.readexactly(size))
+            await reader.readuntil(b"\r\n")
+
+        # The last chunk is followed by the trailers, if any.
+        while await reader.readuntil(b"\r\n") != b"\r\n":
+            pass
+
+        return b"".join(chunks)
+
+    def close(self) -> None:
+        """Close the connection, which is opened again when needed."""
+        if self.writer is not None:
+            self.writer.close()
+
+        self.reader = self.writer = None
+
+
+class Client:
+    """Sends JSON requests to the server over a bounded pool of
+    connections. Requests wait for a free connection, and that time is
+    part of their latency.
+
+    Parameters
+    ----------
+    url: :class:`str`
+        The URL of the server, like `http://localhost:8000`.
+    connections: :class:`int`
+        The maximum number of connections to the server.
+    timeout: :class:`float`
+        The number of seconds after which a request fails.
+    """
+
+    def __init__(self, url: str, connections: int, timeout: float) -> None:
+        parts = urlsplit(url)
+        self.timeout = timeout
+        self.pool: asyncio.Queue[Connection] = asyncio.Queue()
+
+        for _index in range(connections):
+            self.pool.put_nowait(
+                Connection(parts.hostname or "localhost", parts.port or 80)
+            )
+
+    async def send(self, request: Request) -> tuple[int, bytes]:
+        """Send a request and return the status and the body of its
+        response.
+        """
+        method, path, data, token = request
+        body = json.dumps(data).encode() if data is not None else b""
+        headers = {"Content-Type": "application/json"}
+
+        if token is not None:
+            headers["Authorization"] = f"Token {token}"
+
+        connection = await self.pool.get()
+
+        try:
+            status, content = await asyncio.wait_for(
+                connection.request(method, path, body, headers),
+                self.timeout,
+            )
+        finally:
+            self.pool.put_nowait(connection)
+
+        return status, content
+
+    def close(self) -> None:
+        """Close every connection of the pool."""
+        while not self.pool.empty():
+            self.pool.get_nowait().close()
+
+
+class Account:
+    """An account created by the load generator."""
+
+    def __init__(self, user_id: int, email: str, token: str) -> None:
+        self.id = user_id
+        self.email = email
+        self.token = token
+
+
+class Traffic:
+    """Builds the requests of each endpoint, for the given accounts.
+
+    Parameters
+    ----------
+    accounts: list[:class:`Account`]
+        The accounts that send the requests, at least two of them.
+    random: :class:`Random`
+        The random generator, which makes a run reproducible.
+    """
+
+    def __init__(self, accounts: list[Account], random: Random) -> None:
+        self.accounts = accounts
+        self.random = random
+        self.run_id = uuid4().hex[:8]
+        self.signups = 0
+
+        self.endpoints: dict[str, Callable[[], Request]] = {
+            "signup": self.signup,
+            "login": self.login,
+            "profile": self.profile,
+            "message": self.message,
+        }
+
+    def signup(self) -> Request:
+        """`POST /users`, with a new account."""
+        self.signups += 1
+        username = f"lt{self.run_id}{self.signups}"
+        data = {
+            "username": username,
+            "email": f"{username}@loadtest.invalid",
+            "password": PASSWORD,
+        }
+
+        return "POST", "/users", data, None
+
+    def login(self) -> Request:
+        """`POST /auth/login`, with an existing account."""
+        account = self.random.choice(self.accounts)
+        data = {"email": account.email, "password": PASSWORD}
+
+        return "POST", "/auth/login", data, None
+
+    def profile(self) -> Request:
+        """`GET /users/<id>`, for the profile of another account."""
+        account, other = self.random.sample(self.accounts, 2)
+
+        return "GET", f"/users/{other.id}", None, account.token
+
+    def message(self) -> Request:
+        """`POST /channels/<id>/messages`, to another account."""
+        account, other = self.random.sample(self.accounts, 2)
+        data = {"content": f"Hello from {account.id}!"}
+
+        return "POST", f"/channels/{other.id}/messages", data, account.token
+
+
+class EndpointStats:
+    """The outcomes and the latencies of the requests to an endpoint."""
+
+    def __init__(self) -> None:
+        self.latencies: list[float] = []
+        self.outcomes: Counter[str] = Counter()
+
+    def record(self, outcome: str, latency: float) -> None:
+        """Record a request, whose outcome is either its status code or
+        the reason it failed.
+        """
+        self.outcomes[outcome] += 1
+
+        if outcome.isdigit():
+            self.latencies.append(latency * 1000)
+
+    @property
+    def errors(self) -> int:
+        """The number of requests that didn't succeed."""
+        return sum(
+            count
+            for outcome, count in self.outcomes.items()
+            if not outcome.startswith("2")
+        )
+
+    def summary(self, duration: float) -> dict[str, Any]:
+        """Return the throughput, error rate and latency percentiles of
+        the endpoint, in milliseconds, over a run of the given number of
+        seconds.
+        """
+        requests = sum(self.outcomes.values())
+        latencies = self.latencies or [0.0]
+
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "error_rate": round(self.errors / requests, 4) if requests else 0,
+            "throughput_rps": round((requests - self.errors) / duration, 2),
+            "outcomes": dict(sorted(self.outcomes.items())),
+            "mean_ms": round(fmean(latencies), 3),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p90_ms": round(percentile(latencies, 90), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "max_ms": round(max(latencies), 3),
+        }
+
+
+def percentile(values: list[float], rank: float) -> float:
+    """Return the given percentile of the values using the nearest-rank
+    method, like the benchmarks of `core.benchmarks` do.
+    """
+    ordered = sorted(values)
+    index = max(0, round(rank / 100 * len(ordered)) - 1)
+
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    """Parse a mix of endpoints like `profile=60,message=30`."""
+    weights = {}
+
+    for item in mix.split(","):
+        name, _sep, weight = item.partition("=")
+        weights[name.strip()] = float(weight)
+
+    return weights
+
+
+def parse_users(value: str) -> int:
+    """Parse the number of accounts to seed. Messages and profile reads
+    pick two different accounts, so there must be at least two.
+    """
+    users = int(value)
+
+    if users < 2:
+        raise ArgumentTypeError("must be at least 2")
+
+    return users
+
+
+async def measure(
+    client: Client, request: Request, stats: EndpointStats, start: float
+) -> None:
+    """Send a request and record its outcome, with its latency since
+    the given start, which is when it was scheduled.
+    """
+    try:
+        status, _body = await client.send(request)
+        outcome = str(status)
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+    except (OSError, asyncio.IncompleteReadError, ValueError):
+        outcome = "connection_error"
+
+    stats.record(outcome, perf_counter() - start)
+
+
+async def seed(client: Client, count: int) -> list[Account]:
+    """Create the given number of accounts through the API."""
+    traffic = Traffic([], Random())
+    requests = [traffic.signup() for _index in range(count)]
+
+    return list(
+        await asyncio.gather(*(create_account(client, r) for r in requests))
+    )
+
+
+async def create_account(client: Client, request: Request) -> Account:
+    """Create an account and fetch its ID, which the signup doesn't
+    return.
+    """
+    data = request[2] or {}
+    status, content = await client.send(request)
+
+    if status != 201:
+        raise SystemExit(
+            f"Can't create an account ({status}: {content!r}). Signups "
+            "may be throttled, raise THROTTLE_RATE_SIGNUP on the server."
+        )
+
+    token = json.loads(content)["token"]
+    _status, content = await client.send(("GET", "/users/me", None, token))
+
+    return Account(json.loads(content)["id"], data["email"], token)
+
+
+async def generate(
+    client: Client, traffic: Traffic, args: Namespace
+) -> dict[str, EndpointStats]:
+    """Send requests at the given rate for the duration of the run,
+    spread over the endpoints of the mix, with exponential gaps between
+    them like independent clients would.
+    """
+    mix = parse_mix(args.mix)
+    stats = {name: EndpointStats() for name in mix}
+    names, weights = list(mix), list(mix.values())
+    tasks = []
+
+    start = perf_counter()
+    scheduled = start
+
+    while (scheduled := scheduled + traffic.random.expovariate(args.rate)) < (
+        start + args.duration
+    ):
+        await asyncio.sleep(max(0, scheduled - perf_counter()))
+
+        name = traffic.random.choices(names, weights)[0]
+        request = traffic.endpoints[name]()
+        tasks.append(
+            asyncio.create_task(
+                measure(client, request, stats[name], scheduled)
+            )
+        )
+
+    await asyncio.gather(*tasks)
+    return stats
+
+
+def environment(url: str) -> dict[str, Any]:
+    """Describe where the load test ran, so that reports from different
+    commits and machines can be told apart when comparing them.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "url": url,
+    }
+
+
+async def run(args: Namespace) -> dict[str, Any]:
+    """Seed the accounts, generate the traffic and return the report."""
+    if unknown := set(parse_mix(args.mix)) - set(ENDPOINTS):
+        raise SystemExit(f"Unknown endpoints in the mix: {sorted(unknown)}")
+
+    client = Client(args.url, args.connections, args.timeout)
+
+    try:
+        accounts = await seed(client, args.users)
+        traffic = Traffic(accounts, Random(args.seed))
+
+        start = perf_counter()
+        stats = await generate(client, traffic, args)
+        duration = perf_counter() - start
+    finally:
+        client.close()
+
+    total = EndpointStats()
+
+    for endpoint in stats.values():
+        total.latencies += endpoint.latencies
+        total.outcomes += endpoint.outcomes
+
+    return {
+        "environment": environment(args.url),
+        "config": {
+            key: getattr(args, key)
+            for key in ("users", "rate", "duration", "connections", "mix")
+        },
+        "duration_s": round(duration, 3),
+        "endpoints": {
+            name: endpoint.summary(duration)
+            for name, endpoint in stats.items()
+        },
+        "total": total.summary(duration),
+    }
+
+
+def print_summary(report: dict[str, Any]) -> None:
+    """Print a table of the results of each endpoint to stderr."""
+    rows = {**report["endpoints"], "total": report["total"]}
+    columns = (
+        "requests",
+        "throughput_rps",
+        "error_rate",
+        "p50_ms",
+        "p90_ms",
+        "p99_ms",
+        "max_ms",
+    )
+
+    print(
+        f"{'endpoint':<10}" + "".join(f"{c:>16}" for c in columns),
+        file=sys.stderr,
+    )
+
+    for name, row in rows.items():
+        values = "".join(f"{row[column]:>16}" for column in columns)
+        print(f"{name:<10}{values}", file=sys.stderr)
+
+
+def compare(base: dict[str, Any], head: dict[str, Any]) -> list[str]:
+    """Return the lines of a table that compares the metrics of each
+    endpoint between two reports, with the relative change.
+    """
+    lines = [
+        f"base: {base['environment']['commit']}",
+        f"head: {head['environment']['commit']}",
+        f"{'endpoint':<10}{'metric':<16}"
+        f"{'base':>12}{'head':>12}{'change':>10}",
+    ]
+    endpoints = {**base["endpoints"], "total": base["total"]}
+
+    if base["config"] != head["config"]:
+        lines.insert(2, "warning: the runs have different configurations")
+
+    for name in endpoints:
+        before = endpoints[name]
+        after = (
+            head["total"] if name == "total" else head["endpoints"].get(name)
+        )
+
+        for metric in COMPARED_METRICS if after else ():
+            change = relative_change(before[metric], after[metric])
+            lines.append(
+                f"{name:<10}{metric:<16}{before[metric]:>12}"
+                f"{after[metric]:>12}{change:>10}"
+            )
+
+    return lines
+
+
+def relative_change(before: float, after: float) -> str:
+    """Format the relative change between two values."""
+    if before == 0:
+        return "-" if after == 0 else "new"
+
+    return f"{(after - before) / before:+.1%}"
+
+
+def get_parser() -> ArgumentParser:
+    """Return the parser of the command line."""
+    parser = ArgumentParser(
+        description="Load test a running instance of the API."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    runner = commands.add_parser("run", help="Run a load test.")
+    runner.add_argument("--url", default="http://localhost:8000")
+    runner.add_argument(
+        "--users",
+        type=parse_users,
+        default=50,
+        help="Number of accounts to seed, at least 2.",
+    )
+    runner.add_argument(
+        "--rate", type=float, default=100, help="Requests per second."
+    )
+    runner.add_argument(
+        "--duration", type=float, default=30, help="Duration in seconds."
+    )
+    runner.add_argument(
+        "--connections",
+        type=int,
+        default=50,
+        help="Maximum number of connections to the server.",
+    )
+    runner.add_argument(
+        "--mix",
+        default=DEFAULT_MIX,
+        help="Weights of the endpoints, among signup, login, profile and "
+        f"message (default: {DEFAULT_MIX}).",
+    )
+    runner.add_argument(
+        "--timeout", type=float, default=10, help="Timeout of a request."
+    )
+    runner.add_argument(
+        "--seed", type=int, help="Seed of the traffic, to replay a run."
+    )
+    runner.add_argument("--output", help="Write the report to this file.")
+
+    comparer = commands.add_parser("compare", help="Compare two reports.")
+    comparer.add_argument("base", type=Path)
+    comparer.add_argument("head", type=Path)
+
+    return parser
+
+
+def main() -> None:
+    args = get_parser().parse_args()
+
+    if args.command == "compare":
+        base, head = (
+            json.loads(path.read_text()) for path in (args.base, args.head)
+        )
+        print("\n".join(compare(base, head)))
+        return
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    print_summary(report)
+
+    if args.output is None:
+        print(output)
+    else:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
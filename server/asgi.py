@@ -7,9 +7,27 @@ Siege. All rights reserved
 """
 
 import os
+from typing import Any
 
-from django.core.asgi import get_asgi_application
+from core.handlers import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "server.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Streaming responses, like the export of the messages, may query the
+# database while they are sent, see `core.handlers`. The gateway loads
+# models, so it can only be imported once Django is set up.
+from apps.messages.logic.gateway import Receive, Send, gateway  # noqa: E402
+
+
+async def application(
+    scope: dict[str, Any], receive: Receive, send: Send
+) -> None:
+    """Route the WebSocket connections to the gateway and everything
+    else to Django.
+    """
+    if scope["type"] == "websocket":
+        await gateway(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
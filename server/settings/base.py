@@ -8,7 +8,12 @@ Siege. All rights reserved
 
 from os.path import join
 
-from server.settings import BASE_DIR, config
+from decouple import Csv
+
+# `BASE_DIR` is re-exported explicitly, so that the settings module that
+# mypy loads knows about it.
+from server.settings import BASE_DIR as BASE_DIR
+from server.settings import config
 
 # Here's a list of settings available in Django core and their default
 # values.
@@ -16,6 +21,14 @@ from server.settings import BASE_DIR, config
 
 SECRET_KEY = config("DJANGO_SECRET_KEY")
 
+# Previous secret keys, from the most recent to the oldest one. Tokens
+# signed with them are still accepted, which allows rotating the secret
+# key without logging every user out.
+
+SECRET_KEY_FALLBACKS = config(
+    "DJANGO_SECRET_KEY_FALLBACKS", cast=Csv(), default=""
+)
+
 # We don't want to append a slash to the end of URLs, so we disable it.
 # This is because we want to use the same URLs schema for both the API
 # and the front-end.
@@ -30,12 +43,30 @@ INSTALLED_APPS = [
     "rest_framework",
     "guardian",
     # Local apps:
-    "apps.users",
-    "apps.authentication",
-    "apps.messages",
+    "apps.users.UsersConfig",
+    "apps.authentication.AuthenticationConfig",
+    "apps.messages.MessagesConfig",
 ]
 
-MIDDLEWARE = [
+# Middleware profiles
+# The API only authenticates with tokens, see `REST_FRAMEWORK` below,
+# and never renders HTML, so the `api` profile leaves out the sessions,
+# CSRF, authentication, messages and clickjacking middlewares, which
+# only serve cookie-based clients and HTML pages. The `full` profile is
+# the default stack of Django, for when something like the admin is
+# enabled. Compare them with `python manage.py benchmark_middleware`.
+
+API_MIDDLEWARE = [
+    # This must stay first, so that it measures the whole stack.
+    "core.middleware.InstrumentationMiddleware",
+    "core.middleware.MetricsMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "django.middleware.common.CommonMiddleware",
+]
+
+FULL_MIDDLEWARE = [
+    "core.middleware.InstrumentationMiddleware",
+    "core.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -45,6 +76,10 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+MIDDLEWARE_PROFILES = {"api": API_MIDDLEWARE, "full": FULL_MIDDLEWARE}
+
+MIDDLEWARE = MIDDLEWARE_PROFILES[config("MIDDLEWARE_PROFILE", default="api")]
+
 AUTHENTICATION_BACKENDS = [
     "django.contrib.auth.backends.ModelBackend",
     "guardian.backends.ObjectPermissionBackend",
@@ -74,6 +109,51 @@ DATABASES = {
     },
 }
 
+# Connection pooling settings
+# Set `DJANGO_DATABASE_POOLING` when Django connects to PostgreSQL
+# through a pooler in transaction mode, like PgBouncer with
+# `pool_mode = transaction`. Each transaction may then run on another
+# server connection, so Django must not rely on anything that outlives
+# a transaction:
+#
+# - Server-side cursors, used by `QuerySet.iterator`, are disabled.
+# - The statement timeout can't be sent when connecting, since the
+#   pooler rejects unknown startup parameters. Set it on the role
+#   instead: `ALTER ROLE siege SET statement_timeout = '15s'`.
+# https://docs.djangoproject.com/en/4.1/ref/databases/#transaction-pooling-server-side-cursors
+
+DATABASE_POOLING = config("DJANGO_DATABASE_POOLING", cast=bool, default=False)
+
+if DATABASE_POOLING:
+    DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+    DATABASES["default"]["OPTIONS"] = {"connect_timeout": 10}
+
+# Read replica settings
+# When `DJANGO_DATABASE_REPLICA_HOST` is set, the read-only paths that
+# can tolerate the replication lag, like profile reads and the history
+# of messages, query the replica instead of the primary database. See
+# `core.routers.ReplicaRouter`.
+
+DATABASE_REPLICA_HOST = config("DJANGO_DATABASE_REPLICA_HOST", default="")
+
+DATABASE_REPLICA = "replica" if DATABASE_REPLICA_HOST else None
+
+if DATABASE_REPLICA:
+    DATABASES[DATABASE_REPLICA] = {
+        **DATABASES["default"],
+        "HOST": DATABASE_REPLICA_HOST,
+        "PORT": config(
+            "DJANGO_DATABASE_REPLICA_PORT",
+            cast=int,
+            default=DATABASES["default"]["PORT"],
+        ),
+        # Tests don't have a replica, its reads go to the test
+        # database.
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+
 # The list of validators that are used to check the strength of user's
 # passwords. See Password validation for more details.
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -123,6 +203,200 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "apps.authentication.logic.backend.TokenAuthentication",
     ],
+    # The views that don't require to be authenticated throttle the
+    # requests by IP address instead, see `THROTTLE_RATES` below.
+    "DEFAULT_THROTTLE_CLASSES": [
+        "core.throttling.UserThrottle",
+    ],
+    # Datetimes are kept as objects by the serializers and formatted by
+    # the renderer, see `JSON_RENDERER_BACKEND` below.
+    "DATETIME_FORMAT": None,
+}
+
+# The library used to encode JSON responses, either `orjson` or `json`.
+# `orjson` is only used when it is installed (`poetry install --extras
+# speedups`), otherwise we fall back to the standard library.
+
+JSON_RENDERER_BACKEND = config("JSON_RENDERER_BACKEND", default="orjson")
+
+# Throttling settings
+# Each client gets a token bucket per scope, which holds as many tokens
+# as the number of requests of the rate of the scope, and is refilled
+# evenly over its period. Authenticated requests are throttled by user
+# and the others by IP address. The buckets are kept in the memory of
+# each process unless `THROTTLE_STORE` is the Redis store, which must
+# be used when running more than one process. See
+# `core.throttling.TokenBucketThrottle`.
+
+THROTTLE_STORE = config(
+    "THROTTLE_STORE", default="core.throttling.LocalBucketStore"
+)
+
+THROTTLE_RATES = {
+    # Every request of an authenticated user.
+    "user": config("THROTTLE_RATE_USER", default="300/min"),
+    # Sending messages, on top of the rate of the user.
+    "messages": config("THROTTLE_RATE_MESSAGES", default="60/min"),
+    # Exporting every message of the user.
+    "export": config("THROTTLE_RATE_EXPORT", default="10/hour"),
+    # Logging in and signing up, by IP address.
+    "login": config("THROTTLE_RATE_LOGIN", default="10/min"),
+    "signup": config("THROTTLE_RATE_SIGNUP", default="5/min"),
+}
+
+# Maximum number of buckets kept by the local store of each process.
+
+THROTTLE_LOCAL_MAX_SIZE = config(
+    "THROTTLE_LOCAL_MAX_SIZE", cast=int, default=100_000
+)
+
+# Token cache settings
+# The users of the most recently used tokens are kept in memory, so that
+# authenticated requests don't need to query the database to resolve
+# them. See `apps.authentication.logic.cache.TokenCache`.
+
+TOKEN_CACHE_MAX_SIZE = config("TOKEN_CACHE_MAX_SIZE", cast=int, default=10_000)
+
+TOKEN_CACHE_TTL = config("TOKEN_CACHE_TTL", cast=float, default=60)
+
+# User cache settings
+# The representations of the users are cached, so that reading a
+# profile doesn't query the database, see
+# `apps.users.logic.cache.UserCache`. They are kept in the memory of
+# each process unless `USERS_CACHE_URL` points to a Redis database
+# shared by every process. Any other backend of Django can be used by
+# changing the `users` cache below.
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+USERS_CACHE_ALIAS = "users"
+
+USERS_CACHE_URL = config("USERS_CACHE_URL", default="")
+
+USERS_CACHE_TTL = config("USERS_CACHE_TTL", cast=int, default=300)
+
+USERS_CACHE_MAX_SIZE = config("USERS_CACHE_MAX_SIZE", cast=int, default=10_000)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    USERS_CACHE_ALIAS: {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "users",
+        "TIMEOUT": USERS_CACHE_TTL,
+        "OPTIONS": {"MAX_ENTRIES": USERS_CACHE_MAX_SIZE},
+    },
+}
+
+if USERS_CACHE_URL:
+    CACHES[USERS_CACHE_ALIAS] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": USERS_CACHE_URL,
+        "TIMEOUT": USERS_CACHE_TTL,
+        "KEY_PREFIX": "siege",
+    }
+
+# Maximum number of users that can be fetched in a single request to
+# the users endpoint (`GET /users?ids=1,2,3`). All of them are fetched
+# in one query.
+
+USERS_LOOKUP_MAX_SIZE = config("USERS_LOOKUP_MAX_SIZE", cast=int, default=250)
+
+# Hashing pool settings
+# Passwords are hashed on a dedicated pool of threads, so that a burst
+# of logins or signups can't starve the other requests. When more than
+# `HASHING_POOL_QUEUE_SIZE` hashes are waiting for a thread, requests
+# that need one are rejected with a 503 response. These limits apply to
+# each process. See `core.hashing.HashingPool`.
+
+HASHING_POOL_WORKERS = config("HASHING_POOL_WORKERS", cast=int, default=2)
+
+HASHING_POOL_QUEUE_SIZE = config(
+    "HASHING_POOL_QUEUE_SIZE", cast=int, default=16
+)
+
+# Messages hub settings
+# New messages are pushed to the WebSocket connections of their
+# recipients through a hub, see `apps.messages.logic.hub`. The local
+# backend only reaches the connections of the current process, so the
+# Redis backend must be used when running more than one process.
+
+MESSAGES_HUB_BACKEND = config(
+    "MESSAGES_HUB_BACKEND", default="apps.messages.logic.hub.LocalBackend"
+)
+
+# Maximum number of events waiting to be sent to a connection. Slower
+# connections are closed.
+
+MESSAGES_HUB_QUEUE_SIZE = config(
+    "MESSAGES_HUB_QUEUE_SIZE", cast=int, default=100
+)
+
+REDIS_URL = config("REDIS_URL", default="redis://localhost:6379/0")
+
+# Maximum number of messages that can be sent in a single request to
+# the bulk messages endpoint. All of them are inserted in one query.
+
+MESSAGES_BULK_MAX_SIZE = config(
+    "MESSAGES_BULK_MAX_SIZE", cast=int, default=100
+)
+
+# Backend of the search of the messages, from
+# `apps.messages.logic.search`. The PostgreSQL backend uses its
+# full-text search, while the simple one works with any database, but
+# scans every message of the user.
+
+MESSAGES_SEARCH_BACKEND = config(
+    "MESSAGES_SEARCH_BACKEND",
+    default="apps.messages.logic.search.PostgresSearch",
+)
+
+# Number of messages fetched at once by the export of the messages of a
+# user, which streams them from a server-side cursor. This bounds the
+# memory used by an export, whatever the size of the history.
+
+MESSAGES_EXPORT_CHUNK_SIZE = config(
+    "MESSAGES_EXPORT_CHUNK_SIZE", cast=int, default=2000
+)
+
+# Instrumentation settings
+# When enabled, every request reports its number of queries and where
+# its time went in the `Server-Timing` header and in the logs, see
+# `core.middleware.InstrumentationMiddleware`. Requests slower than
+# `INSTRUMENTATION_SLOW_REQUEST_MS` also log each of their queries.
+
+INSTRUMENTATION_ENABLED = config(
+    "INSTRUMENTATION_ENABLED", cast=bool, default=False
+)
+
+INSTRUMENTATION_SLOW_REQUEST_MS = config(
+    "INSTRUMENTATION_SLOW_REQUEST_MS", cast=float, default=500
+)
+
+# Metrics settings
+# The `/metrics` endpoint, see `core.views.metrics`, only answers the
+# clients from `METRICS_ALLOWED_NETWORKS`, or the ones that send the
+# `METRICS_TOKEN` as a bearer token. Behind a proxy, every client has
+# the address of the proxy, so the token should be used instead.
+
+METRICS_ALLOWED_NETWORKS = config(
+    "METRICS_ALLOWED_NETWORKS", cast=Csv(), default="127.0.0.1/32,::1/128"
+)
+
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+# Logging settings
+# https://docs.djangoproject.com/en/4.1/topics/logging/
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "core.instrumentation": {"handlers": ["console"], "level": "INFO"},
+    },
 }
 
 # Guardian settings
@@ -19,3 +19,22 @@ from server.settings.development import *
 DATABASES["default"] = {
     "ENGINE": "django.db.backends.sqlite3",
 }
+
+# A second database stands in for the read replica in the tests of the
+# database router. It is a separate database rather than a mirror of
+# the default one, so that the tests can tell where a query went. It is
+# only used by the tests that enable it with `DATABASE_REPLICA`.
+
+DATABASES["replica"] = {
+    "ENGINE": "django.db.backends.sqlite3",
+}
+
+# SQLite has no full-text search, so messages are searched with a plain
+# `LIKE` instead.
+
+MESSAGES_SEARCH_BACKEND = "apps.messages.logic.search.SimpleSearch"
+
+# The tests send many requests from the same client, so they are barely
+# throttled. The tests of the throttles set their own rates.
+
+THROTTLE_RATES = {scope: "10000/s" for scope in THROTTLE_RATES}
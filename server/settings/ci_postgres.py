@@ -0,0 +1,37 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from server.settings import config
+from server.settings.ci import *
+
+# The same settings as `server.settings.ci`, but on PostgreSQL, like in
+# production. What SQLite doesn't have, like the partitions of the
+# messages table and the full-text search, is only tested with these
+# settings. The database server is read from the same variables as in
+# development.
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": config("POSTGRES_DB"),
+        "USER": config("POSTGRES_USER"),
+        "PASSWORD": config("POSTGRES_PASSWORD"),
+        "HOST": config("DJANGO_DATABASE_HOST"),
+        "PORT": config("DJANGO_DATABASE_PORT", cast=int),
+    },
+}
+
+# The read replica of the tests of the database router is a second
+# database on the same server, for the same reason as with SQLite.
+
+DATABASES["replica"] = {
+    **DATABASES["default"],
+    "TEST": {"NAME": f"test_{DATABASES['default']['NAME']}_replica"},
+}
+
+MESSAGES_SEARCH_BACKEND = "apps.messages.logic.search.PostgresSearch"
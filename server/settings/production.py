@@ -0,0 +1,41 @@
+"""
+Siege. All rights reserved
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2022-present Siege Team
+:author: Siege Team
+"""
+
+from decouple import Csv
+
+from server.settings import config
+from server.settings.base import *
+
+# Here's a list of settings available in Django core and their default
+# values.
+# https://docs.djangoproject.com/en/4.1/ref/settings/#core-settings
+
+DEBUG = False
+
+# Comma-separated list of the host names that this application can
+# serve.
+# https://docs.djangoproject.com/en/4.1/ref/settings/#allowed-hosts
+
+ALLOWED_HOSTS = config("DJANGO_ALLOWED_HOSTS", cast=Csv())
+
+# In production, the application is served by Uvicorn workers managed
+# by Gunicorn, see `docker/django/gunicorn.conf.py`.
+# https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
+
+ASGI_APPLICATION = "server.asgi.application"
+
+# Under ASGI, each request runs its database queries in its own thread,
+# and connections are per thread, so persistent connections would pile
+# up instead of being reused. Connections should be pooled outside of
+# Django instead, with PgBouncer for example, see `DATABASE_POOLING`.
+# This applies to the replica as well, which copies the settings of the
+# default database.
+# https://docs.djangoproject.com/en/4.1/ref/databases/#persistent-connections
+
+for database in DATABASES.values():
+    database["CONN_MAX_AGE"] = 0
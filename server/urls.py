@@ -8,9 +8,13 @@ Siege. All rights reserved
 
 from django.urls import include, path
 
+from core.views import metrics
+
 urlpatterns = (
     # apps:
     path("", include("apps.users.urls", namespace="users")),
     path("", include("apps.authentication.urls", namespace="authentication")),
     path("", include("apps.messages.urls", namespace="messages")),
+    # monitoring:
+    path("metrics", metrics, name="metrics"),
 )
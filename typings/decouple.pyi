@@ -4,3 +4,13 @@ from typing import Any
 class AutoConfig:
     def __init__(self, search_path: str | Path | None = ...) -> None: ...
     def __call__(self, *args: Any, **kwds: Any) -> Any: ...
+
+class Csv:
+    def __init__(
+        self,
+        cast: Any = ...,
+        delimiter: str = ...,
+        strip: str = ...,
+        post_process: Any = ...,
+    ) -> None: ...
+    def __call__(self, value: str | None) -> list[Any]: ...